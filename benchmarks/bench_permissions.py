@@ -0,0 +1,64 @@
+"""
+Per-request cost of the route permission check.
+
+    python benchmarks/bench_permissions.py
+
+Times the bare mask test, session_mask() with a cached mask and the full
+@requires wrapper around a no-op view, all inside one request context so
+only the authorization work is measured.
+"""
+import os
+import sys
+import timeit
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from permissions import PERMISSION_BITS, has_permission, requires, role_mask, session_mask  # noqa: E402
+
+N = 1_000_000
+
+
+def _per_call(fn, number=N):
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return best / number * 1e9  # ns
+
+
+def main():
+    app = Flask(__name__)
+    app.secret_key = "bench"
+
+    @requires("add_qc_data")
+    def view():
+        return None
+
+    def baseline():
+        return None
+
+    bit = PERMISSION_BITS["add_qc_data"]
+    mask = role_mask("QC", "Senior Officer")
+
+    with app.test_request_context("/qc_dashboard", method="POST"):
+        from flask import session
+        session["user_id"] = "bench"
+        session["designation"] = "QC"
+        session["position"] = "Senior Officer"
+        session_mask()  # compile and cache once, as login does
+
+        rows = [
+            ("mask & bit", _per_call(lambda: mask & bit == bit)),
+            ("has_permission(role, action)", _per_call(lambda: has_permission("Senior Officer", "add_qc_data"))),
+            ("session_mask() (cached)", _per_call(session_mask)),
+            ("no-op view", _per_call(baseline)),
+            ("@requires no-op view", _per_call(view)),
+        ]
+
+    for name, ns in rows:
+        print(f"{name:32s} {ns:8.1f} ns")
+    overhead = rows[-1][1] - rows[-2][1]
+    print(f"{'decorator overhead':32s} {overhead:8.1f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+End-to-end load test of the department routes.
+
+    python benchmarks/bench_routes.py --lots 5000 --requests 300 --concurrency 8
+    python benchmarks/bench_routes.py --compare benchmarks/results/<older>.json
+
+Builds a throwaway SQLite database (or migrates the one at --database-url),
+seeds `--lots` QC lots with the project's random data generator plus
+warehouse stock, then drives the real Flask routes through test clients
+on a thread pool. For every scenario it reports throughput, p50/p95/p99
+latency and SQL queries per request, and writes the numbers to a JSON
+file so two commits can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BENCH_USER = ("bench01", "bench-password")
+
+# routes whose query count must not grow with the data (see qc_material_detail)
+QUERY_BUDGETS = {
+    "qc_material_detail": 4,
+}
+
+
+# ------------------ Scenarios ------------------
+# each takes (client, rng, data) and returns the response
+
+def login(client, rng, data):
+    return client.post("/", data={"user_id": BENCH_USER[0], "password": BENCH_USER[1]})
+
+
+def qc_dashboard(client, rng, data):
+    if rng.random() < 0.5:
+        return client.get("/qc_dashboard")
+    return client.get("/qc_dashboard", query_string={"material_code": rng.choice(data["material_codes"])})
+
+
+def qc_material_detail(client, rng, data):
+    return client.get(f"/qc/material/{rng.choice(data['material_ids'])}")
+
+
+def qc_add_result(client, rng, data):
+    return client.post(f"/qc/sample/{rng.choice(data['sample_ids'])}/result/add", data={
+        "parameter": "pH", "unit": "pH units", "result_value": f"{rng.uniform(4.5, 8.5):.2f}",
+    })
+
+
+def qc_generate_coa(client, rng, data):
+    return client.post(f"/qc/sample/{rng.choice(data['sample_ids'])}/generate_coa")
+
+
+def warehouse_dashboard(client, rng, data):
+    return client.get("/warehouse")
+
+
+def warehouse_issue(client, rng, data):
+    return client.post("/warehouse/issue", data={
+        "material_id": rng.choice(data["warehouse_ids"]), "issued_quantity": "0.5",
+        "issued_to": "Production", "remarks": "bench",
+    })
+
+
+def warehouse_dispatch(client, rng, data):
+    return client.post("/warehouse/dispatch", data={
+        "product_name": "Paracetamol 500mg", "batch_no": f"B{rng.randint(1000, 9999)}",
+        "quantity_dispatched": "1", "customer_name": "Bench Pharma", "remarks": "bench",
+    })
+
+
+def warehouse_allocate(client, rng, data):
+    return client.post("/api/v1/warehouse/allocations", json={
+        "material_code": rng.choice(data["allocation_codes"]), "quantity": rng.randint(5, 60),
+        "issued_to": "Production", "batch_no": f"B{rng.randint(1000, 9999)}", "remarks": "bench",
+    })
+
+
+def reports(client, rng, data):
+    return client.get("/reports")
+
+
+SCENARIOS = {f.__name__: f for f in (
+    login, qc_dashboard, qc_material_detail, qc_add_result, qc_generate_coa,
+    warehouse_dashboard, warehouse_issue, warehouse_allocate, warehouse_dispatch, reports,
+)}
+
+
+# ------------------ Harness ------------------
+
+class QueryCounter:
+    """Counts SQL statements per thread, so concurrent requests don't mix."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._local = threading.local()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.n = getattr(self._local, "n", 0) + 1
+
+    def reset(self):
+        self._local.n = 0
+
+    @property
+    def value(self):
+        return getattr(self._local, "n", 0)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def setup_database(app, db, lots, seed, fresh):
+    from flask_migrate import stamp, upgrade
+    from werkzeug.security import generate_password_hash
+
+    from models import QCSample, RawMaterial, User
+    from utils.random_data_generator import generate_bulk_raw_materials
+
+    with app.app_context():
+        migrations = os.path.join(ROOT, "migrations")
+        if fresh:
+            # the oldest migrations expect the original hand-made tables; build
+            # the current schema directly and mark it as migrated
+            db.create_all()
+            stamp(directory=migrations)
+        else:
+            upgrade(directory=migrations)
+        started = time.perf_counter()
+        print(generate_bulk_raw_materials(lots, seed=seed))
+        seed_seconds = time.perf_counter() - started
+        if not User.query.filter_by(user_id=BENCH_USER[0]).first():
+            db.session.add(User(user_id=BENCH_USER[0], designation="Admin", position="Admin",
+                                role="admin", password_hash=generate_password_hash(BENCH_USER[1])))
+            db.session.commit()
+        data = {
+            "material_ids": [i for (i,) in db.session.query(RawMaterial.id)],
+            "material_codes": sorted({c for (c,) in db.session.query(RawMaterial.material_code)}),
+            "sample_ids": [i for (i,) in db.session.query(QCSample.id)],
+        }
+
+    client = admin_client(app)
+    for i in range(max(10, min(200, lots // 25))):
+        client.post("/warehouse/add_material", data={
+            "material_name": f"Bench material {i}", "material_code": f"BM{i:04d}",
+            "supplier_name": "Bench Supplier", "quantity_received": "1000000", "unit": "kg",
+        })
+    # released lots with staggered expiry dates, for FEFO allocation
+    today = datetime.utcnow().date()
+    data["allocation_codes"] = [f"BL{i:03d}" for i in range(10)]
+    for code in data["allocation_codes"]:
+        for lot in range(5):
+            client.post("/warehouse/add_material", data={
+                "material_name": f"Bench lot material {code}", "material_code": code, "lot_no": f"{code}-L{lot}",
+                "supplier_name": "Bench Supplier", "quantity_received": "500", "unit": "kg",
+                "expiry_date": (today + timedelta(days=30 * (5 - lot))).isoformat(),
+            })
+    with app.app_context():
+        from models import WarehouseMaterial
+        from utils import stock_ledger
+        for m in WarehouseMaterial.query:  # only released lots are issued
+            stock_ledger.dispose(m, True, user=BENCH_USER[0])
+        db.session.commit()
+        data["warehouse_ids"] = [i for (i,) in db.session.query(WarehouseMaterial.id)]
+    return data, seed_seconds
+
+
+def admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"] = BENCH_USER[0]
+        s["designation"] = "Admin"
+        s["position"] = "Admin"
+    return client
+
+
+def run_scenario(app, counter, name, data, requests, concurrency, seed):
+    fn = SCENARIOS[name]
+    local = threading.local()
+    thread_seq = iter(range(concurrency * 2))
+    seq_lock = threading.Lock()
+
+    def one(_):
+        if not hasattr(local, "client"):
+            with seq_lock:
+                local.rng = random.Random(f"{seed}-{name}-{next(thread_seq)}")
+            local.client = admin_client(app)
+        counter.reset()
+        t0 = time.perf_counter()
+        resp = fn(local.client, local.rng, data)
+        elapsed = time.perf_counter() - t0
+        return elapsed, counter.value, resp.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(s[0] * 1000 for s in samples)
+    queries = [s[1] for s in samples]
+    errors = sum(1 for s in samples if s[2] >= 400)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / wall, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2),
+        },
+        "queries_per_request": {
+            "mean": round(statistics.mean(queries), 2),
+            "max": max(queries),
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path) as fh:
+        previous = json.load(fh)
+    print(f"\nvs {previous_path} ({previous['meta'].get('commit')})")
+    for name, now in current["scenarios"].items():
+        before = previous["scenarios"].get(name)
+        if not before:
+            continue
+        p95_then, p95_now = before["latency_ms"]["p95"], now["latency_ms"]["p95"]
+        change = (p95_now - p95_then) / p95_then * 100 if p95_then else 0.0
+        print(f"  {name:22s} p95 {p95_then:8.2f} -> {p95_now:8.2f} ms ({change:+6.1f}%)  "
+              f"queries {before['queries_per_request']['mean']:.1f} -> {now['queries_per_request']['mean']:.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lots", type=int, default=5000, help="QC lots to seed")
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only these scenarios (repeatable)")
+    parser.add_argument("--database-url", help="benchmark an existing database instead of a temporary SQLite one")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare p95 and query counts against")
+    args = parser.parse_args(argv)
+
+    tmpdir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="pharma-bench-")
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmpdir, "bench.db")
+
+    from app import create_app  # after DATABASE_URL is set
+    from database import db
+    from utils import audit_logger
+
+    app = create_app({"TESTING": True, "DB_MIGRATIONS": True})
+    data, seed_seconds = setup_database(app, db, args.lots, args.seed, fresh=tmpdir is not None)
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+
+    names = args.scenario or list(SCENARIOS)
+    results = {}
+    for name in names:
+        results[name] = r = run_scenario(app, counter, name, data, args.requests, args.concurrency, args.seed)
+        lat = r["latency_ms"]
+        print(f"{name:22s} {r['throughput_rps']:8.1f} req/s  p50 {lat['p50']:7.2f}  p95 {lat['p95']:7.2f}  "
+              f"p99 {lat['p99']:7.2f} ms  {r['queries_per_request']['mean']:5.1f} q/req"
+              + (f"  {r['errors']} errors" if r["errors"] else ""))
+    with app.app_context():
+        audit_logger.flush()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+            "lots": args.lots,
+            "seed_seconds": round(seed_seconds, 2),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{report['meta']['commit'] or 'unknown'}-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nresults written to {output}")
+    if args.compare:
+        compare(report, args.compare)
+
+    over = [(name, results[name]["queries_per_request"]["max"], budget)
+            for name, budget in QUERY_BUDGETS.items()
+            if name in results and results[name]["queries_per_request"]["max"] > budget]
+    for name, got, budget in over:
+        print(f"❌ {name}: {got} queries per request, budget is {budget}")
+    failed = over or any(r["errors"] for r in results.values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Cold start of the app: what a gunicorn worker without preload, or any
+`flask <command>`, pays before it can do anything.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --root /path/to/older/checkout   # compare
+
+Each run is a fresh interpreter that imports the app module and builds the
+app (create_app() where the tree has one). Reports the median and best
+time over --runs, the slowest top-level imports from `python -X importtime`,
+and fails if one of the heavy optional dependencies is imported on the way.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# only the features that need them may import these
+HEAVY_MODULES = ("faker", "numpy", "pandas", "reportlab", "openpyxl")
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import app as module
+app = module.create_app() if hasattr(module, "create_app") else module.app
+elapsed = time.perf_counter() - t
+print(json.dumps({"seconds": elapsed, "modules": len(sys.modules),
+                  "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _env(root):
+    return dict(os.environ, PYTHONPATH=root)  # building the app does not connect to the database
+
+
+def probe(root):
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=root, env=_env(root),
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(root, top):
+    """(cumulative µs, module) of the slowest imports directly under the app module."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=root, env=_env(root),
+                         capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1 and cumulative.strip().isdigit():  # children of the app module
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=ROOT, help="project checkout to measure (default: this one)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args(argv)
+    root = os.path.abspath(args.root)
+
+    probe(root)  # warm the bytecode cache, like a deployed worker's
+    runs = [probe(root) for _ in range(args.runs)]
+    times = [r["seconds"] * 1000 for r in runs]
+    print(f"import + create_app: median {statistics.median(times):7.1f} ms  best {min(times):7.1f} ms"
+          f"  ({runs[-1]['modules']} modules, {args.runs} runs, {root})")
+
+    print("\nslowest imports under app:")
+    for micros, name in slowest_imports(root, args.top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    heavy = runs[-1]["heavy"]
+    if heavy:
+        print(f"\n❌ imported at startup: {', '.join(heavy)}")
+        return 1
+    print(f"\n✅ none of {', '.join(HEAVY_MODULES)} imported at startup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
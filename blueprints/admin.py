@@ -0,0 +1,86 @@
+# admin.py
+"""User administration, plus the create-admin and audit-verify CLI commands."""
+from flask import Blueprint, flash, redirect, render_template, request, session, url_for
+from werkzeug.security import generate_password_hash
+
+from database import db
+from models import User
+from permissions import requires
+from utils.audit_logger import log_action, verify_chain
+from utils.response_cache import cached_response
+
+bp = Blueprint("admin", __name__, cli_group=None)
+
+# ------------------- ADMIN -------------------
+@bp.route("/admin")
+@requires("admin")
+@cached_response(User)
+def admin_panel():
+    users = User.query.all()
+    return render_template("admin_panel.html", users=users)
+
+@bp.route("/admin/add_user", methods=["POST"])
+@requires("admin")
+def add_user():
+    user_id = request.form.get("user_id")
+    designation = request.form.get("designation")
+    position = request.form.get("position")
+    role = request.form.get("role")
+    password = request.form.get("password")
+
+    if User.query.filter_by(user_id=user_id).first():
+        flash("⚠️ User ID already exists!", "error")
+        return redirect(url_for("admin.admin_panel"))
+
+    hashed_pw = generate_password_hash(password)
+    new_user = User(
+        user_id=user_id,
+        designation=designation,
+        position=position,
+        role=role,
+        password_hash=hashed_pw
+    )
+    db.session.add(new_user)
+    db.session.commit()
+    log_action(session.get("user_id"), f"Added user {user_id} ({designation}/{position}/{role})")
+    flash("✅ User added successfully!", "success")
+    return redirect(url_for("admin.admin_panel"))
+
+@bp.route("/admin/delete_user/<int:user_id>")
+@requires("admin")
+def delete_user(user_id):
+    user = User.query.get(user_id)
+    if user:
+        db.session.delete(user)
+        db.session.commit()
+        log_action(session.get("user_id"), f"Deleted user {user.user_id}")
+        flash("🗑 User deleted successfully!", "success")
+    return redirect(url_for("admin.admin_panel"))
+
+# ------------------- CLI COMMAND -------------------
+@bp.cli.command("create-admin")
+def create_admin():
+    if not User.query.filter_by(user_id="admin01").first():
+        hashed_pw = generate_password_hash("admin123")
+        admin_user = User(
+            user_id="admin01",
+            designation="Admin",
+            position="Admin",
+            role="admin",
+            password_hash=hashed_pw
+        )
+        db.session.add(admin_user)
+        db.session.commit()
+        print("✅ Admin user created: admin01 / admin123")
+    else:
+        print("⚠️ Admin already exists.")
+
+@bp.cli.command("audit-verify")
+def audit_verify():
+    """Check the audit trail hash chain for tampering."""
+    checked, bad_id = verify_chain()
+    if bad_id is None:
+        print(f"✅ Audit trail intact ({checked} entries).")
+    else:
+        print(f"❌ Audit trail broken at entry id {bad_id} (after {checked - 1} valid entries).")
+        raise SystemExit(1)
@@ -0,0 +1,220 @@
+# main.py
+"""
+Pages shared by every department: login/logout, reports, search, exports,
+background jobs and the Prometheus endpoint, with their CLI commands.
+"""
+import hmac
+import os
+from datetime import datetime
+
+import click
+from flask import (Blueprint, current_app, flash, redirect, render_template, request, send_from_directory,
+                   session, stream_with_context, url_for)
+from werkzeug.security import check_password_hash
+
+from database import db
+from models import Job, User
+from permissions import can, requires, requires_any, store_session_mask
+from utils import metrics
+from utils.audit_logger import log_action
+from utils.exporter import EXPORT_TABLES, XLSX_INLINE_MAX_ROWS, csv_chunks, row_count, write_xlsx, xlsx_chunks
+from utils.jobs import JOB_KINDS, JOB_PROCESSES, enqueue, export_dir, job_status, run_worker, visible_kinds
+from utils.reports import REPORTS, parse_filters, rebuild_rollups
+from utils.search import KINDS as SEARCH_KINDS, search as run_search
+
+bp = Blueprint("main", __name__, cli_group=None)
+
+# ------------------- LOGIN -------------------
+@bp.route("/", methods=["GET", "POST"])
+def login():
+    if request.method == "POST":
+        user_id = request.form["user_id"]
+        password = request.form["password"]
+
+        user = User.query.filter_by(user_id=user_id).first()
+
+        if user and check_password_hash(user.password_hash, password):
+            session["user_id"] = user.user_id
+            session["designation"] = user.designation
+            session["position"] = user.position
+            session["role"] = user.role
+            store_session_mask(user)
+            log_action(user.user_id, "Login")
+
+            if user.designation == "Admin":
+                return redirect(url_for("admin.admin_panel"))
+            elif user.designation == "QC":
+                return redirect(url_for("qc.qc_dashboard"))
+            elif user.designation == "Warehouse":
+                return redirect(url_for("warehouse.warehouse_dashboard"))
+            elif user.designation == "Production":
+                return redirect(url_for("production.production_dashboard"))
+            elif user.designation == "QA":
+                return redirect(url_for("qa.qa_dashboard"))
+            else:
+                return "No dashboard assigned for your designation."
+        else:
+            log_action(user_id, "Failed login")
+            flash("❌ Invalid credentials!", "error")
+
+    return render_template("login.html")
+
+# ------------------- Reports -------------------
+
+@bp.route("/reports")
+@requires("view_reports")
+def reports():
+    filters = parse_filters(request.args)
+    data = {name: fn(**filters) for name, fn in REPORTS.items()}
+    return render_template("reports.html", filters=filters, **data)
+
+@bp.route("/reports/<name>.json")
+@requires("view_reports", api=True)
+def report_json(name):
+    if name not in REPORTS:
+        return {"error": f"unknown report {name!r}"}, 404
+    return {"report": name, "rows": REPORTS[name](**parse_filters(request.args))}
+
+# ------------------- Search -------------------
+
+def _search_hits():
+    q = request.args.get("q", "").strip()
+    kinds = [k for k, (_, _, _, perm) in SEARCH_KINDS.items() if can(perm)]
+    hits = run_search(q, kinds) if q else []
+    for h in hits:
+        if h.kind == "material":
+            h.url = url_for("qc.qc_material_detail", material_id=h.id)
+        elif h.kind == "sample":
+            h.url = url_for("qc.qc_material_detail", material_id=h.obj.material_id)
+        else:
+            h.url = url_for("warehouse.warehouse_dashboard")
+    return q, hits
+
+@bp.route("/search")
+@requires_any("view_qc", "view_warehouse")
+def search_page():
+    q, hits = _search_hits()
+    return render_template("search.html", q=q, hits=hits)
+
+@bp.route("/api/search")
+@requires_any("view_qc", "view_warehouse", api=True)
+def search_api():
+    q, hits = _search_hits()
+    return {"q": q, "results": [dict(h.as_dict(), url=h.url) for h in hits]}
+
+# ------------------- Exports -------------------
+
+@bp.route("/export/<table>.<fmt>")
+@requires("view_reports")
+def export_table(table, fmt):
+    if table not in EXPORT_TABLES or fmt not in ("csv", "xlsx"):
+        return f"Unknown export {table}.{fmt}", 404
+    t = EXPORT_TABLES[table]
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    if fmt == "csv":
+        body, mimetype = csv_chunks(t), "text/csv"
+    else:
+        # the first XLSX byte only goes out once the whole workbook is written
+        if row_count(t) > XLSX_INLINE_MAX_ROWS:
+            flash(f"⚠️ {table} has more than {XLSX_INLINE_MAX_ROWS:,} rows: export it as XLSX in the background.", "error")
+            return redirect(url_for("main.reports"))
+        body, mimetype = xlsx_chunks(t), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    resp = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{table}-{stamp}.{fmt}"'
+    return resp
+
+@bp.route("/export/<table>.<fmt>/job", methods=["POST"])
+@requires("view_reports")
+def export_table_job(table, fmt):
+    if table not in EXPORT_TABLES or fmt not in ("csv", "xlsx"):
+        return f"Unknown export {table}.{fmt}", 404
+    job_id = enqueue("export", {"table": table, "fmt": fmt}, user=session.get("user_id"))
+    flash(f"⏳ Exporting {table} as {fmt.upper()} in the background (job #{job_id}).", "success")
+    return redirect(url_for("main.jobs_page"))
+
+# ------------------- Background jobs -------------------
+
+JOBS_PAGE_SIZE = 50
+
+def _visible_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.kind not in visible_kinds(can):
+        return None
+    return job
+
+@bp.route("/jobs")
+@requires_any(*{k.permission for k in JOB_KINDS.values()})
+def jobs_page():
+    jobs = (Job.query.filter(Job.kind.in_(visible_kinds(can)))
+            .order_by(Job.id.desc()).limit(JOBS_PAGE_SIZE).all())
+    return render_template("jobs.html", jobs=[job_status(j) for j in jobs],
+                           active=any(j.status in ("queued", "running") for j in jobs))
+
+@bp.route("/api/v1/jobs/<int:job_id>")
+@requires_any(*{k.permission for k in JOB_KINDS.values()}, api=True)
+def job_status_api(job_id):
+    job = _visible_job(job_id)
+    if job is None:
+        return {"error": "no such job"}, 404
+    return job_status(job)
+
+@bp.route("/jobs/<int:job_id>/download")
+@requires("view_reports")
+def job_download(job_id):
+    job = _visible_job(job_id)
+    if job is None or job.status != "succeeded" or job.kind != "export":
+        return "No such export", 404
+    return send_from_directory(export_dir(), job_status(job)["result"]["file"], as_attachment=True)
+
+# ------------------- LOGOUT -------------------
+@bp.route("/logout")
+def logout():
+    if session.get("user_id"):
+        log_action(session.get("user_id"), "Logout")
+    session.clear()
+    return redirect(url_for("main.login"))
+
+# ------------------- METRICS -------------------
+@bp.route("/metrics")
+def prometheus_metrics():
+    # scraped by Prometheus with the METRICS_TOKEN bearer token; an admin can
+    # look in a browser. Route names and slow SQL are not for anyone else.
+    token = os.environ.get("METRICS_TOKEN")
+    scraper = token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not scraper and not can("admin"):
+        return "unauthorized", 401
+    return current_app.response_class(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+# ------------------- CLI COMMAND -------------------
+@bp.cli.command("reports-rebuild")
+def reports_rebuild():
+    """Recompute the QC report rollups from the base tables."""
+    rebuild_rollups()
+    print("✅ Report rollups rebuilt.")
+
+@bp.cli.command("jobs-worker")
+@click.option("--processes", default=JOB_PROCESSES, show_default=True, help="Jobs run in parallel.")
+@click.option("--once", is_flag=True, help="Exit when the queue is empty.")
+def jobs_worker(processes, once):
+    """Run queued background jobs (random data, purges, exports, COA rendering)."""
+    print(f"⚙️ Job worker started with {processes} process(es).")
+    try:
+        run_worker(processes=processes, once=once)
+    except KeyboardInterrupt:
+        print("\n⏹ Job worker stopped; running jobs are retried after their heartbeat goes stale.")
+
+@bp.cli.command("export")
+@click.argument("table", type=click.Choice(sorted(EXPORT_TABLES)))
+@click.option("--format", "fmt", type=click.Choice(["csv", "xlsx"]), default="csv", show_default=True)
+@click.option("--output", "-o", type=click.Path(dir_okay=False), required=True)
+def export_cli(table, fmt, output):
+    """Export a QC or warehouse table with bounded memory."""
+    t = EXPORT_TABLES[table]
+    if fmt == "csv":
+        with open(output, "w", newline="", encoding="utf-8") as fh:
+            for chunk in csv_chunks(t):
+                fh.write(chunk)
+    else:
+        with open(output, "wb") as fh:
+            write_xlsx(t, fh)
+    print(f"✅ {table} exported to {output}")
@@ -0,0 +1,36 @@
+# production.py
+"""Production department dashboard."""
+from flask import Blueprint, render_template, request, session
+
+from database import db
+from models import ProductionRecord
+from permissions import requires
+from utils import genealogy
+from utils.audit_logger import log_action
+from utils.response_cache import cached_response
+
+bp = Blueprint("production", __name__)
+
+# ------------------- Production -------------------
+@bp.route("/production", methods=["GET", "POST"])
+@requires("view_production", post="add_production_data")
+@cached_response(ProductionRecord)
+def production_dashboard():
+    if request.method == "POST":
+        batch_no = request.form["batch_no"].strip()
+        status = request.form["status"]
+        # intermediate batches this one is made from (granulate -> tablets -> coated tablets)
+        inputs = [b.strip() for b in request.form.get("input_batches", "").split(",") if b.strip()]
+        new_record = ProductionRecord(batch_no=batch_no, status=status)
+        db.session.add(new_record)
+        db.session.flush()
+        try:
+            genealogy.record_batch(batch_no, inputs, user=session.get("user_id"))
+        except genealogy.GenealogyCycle as e:
+            db.session.rollback()
+            return f"❌ {e}", 400
+        db.session.commit()
+        if inputs:
+            log_action(session.get("user_id"), f"Batch {batch_no} made from batch(es) {', '.join(inputs)}")
+    records = ProductionRecord.query.all()
+    return render_template("production_dashboard.html", records=records)
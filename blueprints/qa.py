@@ -0,0 +1,74 @@
+# qa.py
+"""QA department: dashboard and batch genealogy (recall traces)."""
+from flask import Blueprint, redirect, render_template, request, session, url_for
+
+from database import db
+from models import QARecord, WarehouseMaterial
+from permissions import requires, requires_any
+from utils import stock_ledger
+from utils.audit_logger import log_action
+from utils.genealogy import DIRECTIONS, KINDS as GENEALOGY_KINDS, rebuild_genealogy, trace
+from utils.response_cache import cached_response
+
+bp = Blueprint("qa", __name__, cli_group=None)
+
+# ------------------- QA -------------------
+@bp.route("/qa", methods=["GET", "POST"])
+@requires("view_qa", post="add_qa_data")
+@cached_response(QARecord)
+def qa_dashboard():
+    if request.method == "POST":
+        audit_name = request.form["audit_name"]
+        status = request.form["status"]
+        new_record = QARecord(audit_name=audit_name, status=status)
+        db.session.add(new_record)
+        db.session.commit()
+    records = QARecord.query.all()
+    return render_template("qa_dashboard.html", records=records)
+
+# Release or reject a received lot by hand (lots with a QC lot are released by its COA)
+@bp.route("/qa/release", methods=["POST"])
+@requires("approve_qa_data")
+def qa_release_material():
+    material = WarehouseMaterial.query.get_or_404(int(request.form["material_id"]))
+    released = request.form.get("decision") == "release"
+    remarks = request.form.get("remarks")
+    if stock_ledger.dispose(material, released, remarks=remarks, user=session.get("user_id")) is None:
+        return f"⚠️ Lot {material.id} is already {material.status}.", 400
+    db.session.commit()
+    log_action(session.get("user_id"), f"{material.status} lot {material.id} ({material.material_code} {material.lot_no or '-'})"
+                                       + (f": {remarks}" if remarks else ""))
+    return redirect(url_for("qa.qa_dashboard"))
+
+# ------------------- Batch genealogy -------------------
+
+@bp.route("/genealogy")
+@requires_any("view_qa", "view_warehouse", "view_production")
+def genealogy_page():
+    kind = request.args.get("kind", "batch")
+    ref = request.args.get("ref", "").strip()
+    traces = {}
+    if ref and kind in GENEALOGY_KINDS:
+        traces = {d: trace(kind, ref, d) for d in DIRECTIONS}
+    return render_template("genealogy.html", kinds=GENEALOGY_KINDS, kind=kind, ref=ref, **traces)
+
+@bp.route("/api/v1/genealogy/<kind>/<path:ref>")
+@requires_any("view_qa", "view_warehouse", "view_production", api=True)
+def genealogy_api(kind, ref):
+    if kind not in GENEALOGY_KINDS:
+        return {"error": f"kind must be one of: {', '.join(GENEALOGY_KINDS)}"}, 404
+    direction = request.args.get("direction", "forward")
+    if direction not in DIRECTIONS:
+        return {"error": f"direction must be one of: {', '.join(DIRECTIONS)}"}, 400
+    result = trace(kind, ref, direction)
+    if result is None:
+        return {"error": f"no genealogy recorded for {kind} {ref!r}"}, 404
+    return result
+
+# ------------------- CLI COMMAND -------------------
+@bp.cli.command("genealogy-rebuild")
+def genealogy_rebuild():
+    """Record issues and dispatches made before the genealogy existed and recompute its closure table."""
+    issues, dispatches, closure_rows = rebuild_genealogy(user="cli")
+    log_action("cli", f"Rebuilt genealogy: {issues} issue(s) and {dispatches} dispatch(es) recorded")
+    print(f"✅ {issues} issue(s) and {dispatches} dispatch(es) recorded, {closure_rows} closure rows.")
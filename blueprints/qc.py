@@ -0,0 +1,421 @@
+# qc.py
+"""QC department: lots, sampling, specifications, results, COAs, SPC trends, and the QC CLI commands."""
+from datetime import datetime
+
+import click
+from flask import Blueprint, current_app, flash, redirect, render_template, request, session, url_for
+from sqlalchemy.orm import joinedload, selectinload
+
+from database import db
+from models import COA, QCSample, RawMaterial, SPCAlert, Specification, TestResult, WarehouseMaterial
+from permissions import requires
+from utils import stock_ledger
+from utils.ar_allocator import allocator as ar_allocator
+from utils.audit_logger import log_action
+from utils.coa import coa_fingerprint, invalidate_coa, invalidate_material_coas, overall_verdict, rendered_coa
+from utils.ingest import ingest_request
+from utils.jobs import enqueue
+from utils.pagination import keyset_paginate
+from utils.purge import PURGE_CHUNK_SIZE, purge_raw_materials
+from utils.random_data_generator import DEFAULT_BATCH_SIZE, generate_bulk_raw_materials
+from utils.reports import RollupDelta
+from utils.response_cache import cached_response
+from utils.result_import import IMPORT_CHUNK_SIZE, import_results_csv
+from utils.spc import RULES as SPC_RULES, SPCBatch, chart as spc_chart, rebuild_spc, series_keys as spc_series_keys
+from utils.spec_engine import reevaluate_materials, spec_index
+
+bp = Blueprint("qc", __name__, cli_group=None)  # CLI commands stay top-level: `flask qc-purge`
+
+# ------------------- QC -------------------
+
+
+# ------------------ Helpers ------------------
+
+def next_ar_no():
+    # AR-YYYYMMDD-#### per day sequence
+    return ar_allocator.next_ar_no()
+
+# ------------------ QC: Dashboard ------------------
+
+QC_DASHBOARD_PAGE_SIZE = 50
+
+@bp.route("/qc_dashboard")
+@requires("view_qc")
+@cached_response(RawMaterial)
+def qc_dashboard():
+    filters = {
+        "status": request.args.get("status", "").strip(),
+        "material_code": request.args.get("material_code", "").strip(),
+        "vendor": request.args.get("vendor", "").strip(),
+        "lot_no": request.args.get("lot_no", "").strip(),
+    }
+    per_page = min(max(request.args.get("per_page", QC_DASHBOARD_PAGE_SIZE, type=int), 1), 500)
+
+    # equality filters line up with the (col, received_date, id) indexes;
+    # vendor is a prefix match expressed as a range so it can still use one
+    q = RawMaterial.query
+    if filters["status"]:
+        q = q.filter(RawMaterial.status == filters["status"])
+    if filters["material_code"]:
+        q = q.filter(RawMaterial.material_code == filters["material_code"])
+    if filters["lot_no"]:
+        q = q.filter(RawMaterial.lot_no == filters["lot_no"])
+    if filters["vendor"]:
+        q = q.filter(RawMaterial.vendor >= filters["vendor"],
+                     RawMaterial.vendor < filters["vendor"] + "\U0010ffff")
+
+    page = keyset_paginate(
+        q, [RawMaterial.received_date, RawMaterial.id], per_page,
+        after=request.args.get("after"), before=request.args.get("before"),
+    )
+    args = {k: v for k, v in filters.items() if v}
+    if per_page != QC_DASHBOARD_PAGE_SIZE:
+        args["per_page"] = per_page
+    return render_template("qc_dashboard.html", materials=page.items, page=page,
+                           filters=filters, filter_args=args)
+
+# ------------------ QC: Create / Receive Material (for demo) ------------------
+# In real life this comes from Warehouse. Here we give QC a quick way to seed materials.
+
+@bp.route("/qc/material/new", methods=["GET", "POST"])
+@requires("add_qc_data")
+def qc_new_material():
+    if request.method == "POST":
+        rm = RawMaterial(
+            material_code=request.form["material_code"],
+            material_name=request.form["material_name"],
+            lot_no=request.form["lot_no"],
+            vendor=request.form.get("vendor"),
+            received_qty=float(request.form.get("received_qty", 0) or 0),
+            unit=request.form.get("unit"),
+            status="Pending Sampling",
+            received_date=datetime.utcnow()
+        )
+        db.session.add(rm)
+        delta = RollupDelta()
+        delta.lot_received(rm.received_date, rm.material_code, rm.vendor)
+        delta.apply()
+        db.session.commit()
+        log_action(session.get("user_id"), f"Received material {rm.material_code} lot {rm.lot_no} (id {rm.id})")
+        flash("✅ Material added.", "success")
+        return redirect(url_for("qc.qc_dashboard"))
+    return render_template("qc_new_material.html")
+
+# ------------------ QC: Material detail ------------------
+
+@bp.route("/qc/material/<int:material_id>")
+@requires("view_qc")
+def qc_material_detail(material_id):
+    # fixed query count however many samples the lot has:
+    # material + specs, latest sample + COA, its results
+    m = RawMaterial.query.options(selectinload(RawMaterial.specs)).get_or_404(material_id)
+    sample = m.latest_sample(joinedload(QCSample.coa), selectinload(QCSample.results))
+    specs = m.specs
+    results = sample.results if sample else []
+    return render_template("qc_material_detail.html", m=m, sample=sample, specs=specs, results=results)
+
+# ------------------ QC: Sampling / AR generation ------------------
+
+@bp.route("/qc/material/<int:material_id>/sample", methods=["POST"])
+@requires("add_qc_data")
+def qc_take_sample(material_id):
+    m = RawMaterial.query.get_or_404(material_id)
+    ar = next_ar_no()
+    s = QCSample(
+        ar_no=ar,
+        sampler=session.get("user_id"),
+        remarks=request.form.get("remarks"),
+        material=m
+    )
+    m.status = "Sampled"
+    db.session.add(s)
+    db.session.commit()
+    log_action(session.get("user_id"), f"Sampled material {m.id}, AR {ar}")
+    flash(f"✅ Sample taken. AR No: {ar}", "success")
+    return redirect(url_for("qc.qc_material_detail", material_id=material_id))
+
+# ------------------ QC: Specification CRUD (minimal add) ------------------
+
+@bp.route("/qc/material/<int:material_id>/spec/add", methods=["POST"])
+@requires("edit_qc_data")
+def qc_add_spec(material_id):
+    m = RawMaterial.query.get_or_404(material_id)
+
+    lower = request.form.get("lower_limit")
+    upper = request.form.get("upper_limit")
+    spec = Specification(
+        material=m,
+        parameter=request.form["parameter"],
+        method=request.form.get("method"),
+        unit=request.form.get("unit"),
+        lower_limit=float(lower) if lower else None,
+        upper_limit=float(upper) if upper else None,
+        textual_limit=request.form.get("textual_limit")
+    )
+    db.session.add(spec)
+    m.spec_version = (m.spec_version or 0) + 1  # invalidates compiled specs in every worker
+    db.session.commit()
+    spec_index.invalidate(m.id)
+    invalidate_material_coas(m.id)
+    log_action(session.get("user_id"), f"Added spec {spec.parameter} to material {m.id}")
+    flash("✅ Specification added.", "success")
+    return redirect(url_for("qc.qc_material_detail", material_id=material_id))
+
+# ------------------ QC: Enter Test Result ------------------
+
+@bp.route("/qc/sample/<int:sample_id>/result/add", methods=["POST"])
+@requires("add_qc_data")
+def qc_add_result(sample_id):
+    s = QCSample.query.get_or_404(sample_id)
+    m = s.material
+
+    parameter = request.form["parameter"]
+    unit = request.form.get("unit")
+    val_num = request.form.get("result_value")
+    val_text = request.form.get("result_text")
+
+    value_num = float(val_num) if val_num not in (None, "",) else None
+    verdict = spec_index.for_material(m).judge(parameter, value_num, val_text)
+
+    tr = TestResult(
+        sample=s,
+        parameter=parameter,
+        result_value=value_num,
+        result_text=val_text,
+        unit=unit,
+        verdict=verdict,
+        tested_by=session.get("user_id"),
+        tested_at=datetime.utcnow()
+    )
+    m.status = "Testing"
+    db.session.add(tr)
+    db.session.flush()  # the SPC point needs the result id
+    delta = RollupDelta()
+    delta.result(tr.tested_at, m.material_code, m.vendor, parameter, verdict, value_num)
+    delta.apply()
+    spc = SPCBatch()
+    spc.result(tr.id, tr.tested_at, m.material_code, parameter, value_num, verdict)
+    alerts = spc.apply()
+    db.session.commit()
+    invalidate_coa(s.id)
+    log_action(session.get("user_id"), f"Result {parameter}={value_num if value_num is not None else val_text} on AR {s.ar_no}: {verdict}")
+    flash(f"🧪 Result saved ({parameter}: {verdict}).", "success")
+    if alerts:
+        flash(f"📈 {parameter} is out of trend for {m.material_code}: "
+              + "; ".join(SPC_RULES[a['rule']] for a in alerts), "warning")
+    return redirect(url_for("qc.qc_material_detail", material_id=m.id))
+
+# ------------------ QC: Bulk result import (instrument CSV) ------------------
+
+@bp.route("/qc/results/import", methods=["POST"])
+@requires("add_qc_data")
+def qc_import_results():
+    files = [f for f in request.files.getlist("file") if f and f.filename]
+    if not files:
+        flash("⚠️ Choose at least one CSV file to import.", "error")
+        return redirect(url_for("qc.qc_dashboard"))
+    reports = [import_results_csv(f.stream, session.get("user_id"), filename=f.filename) for f in files]
+    for r in reports:
+        log_action(session.get("user_id"), f"Imported results {r.summary()}")
+    return render_template("qc_import_report.html", reports=reports)
+
+# ------------------ QC: Batch receiving API (ERP goods receipts) ------------------
+
+@bp.route("/api/v1/qc/materials", methods=["POST"])
+@requires("add_qc_data", api=True)
+def qc_api_receive():
+    return ingest_request("raw_materials")
+
+# ------------------ QC: Generate COA (also sets overall status) ------------------
+
+@bp.route("/qc/sample/<int:sample_id>/generate_coa", methods=["POST"])
+@requires("approve_qc_data")
+def qc_generate_coa(sample_id):
+    s = QCSample.query.get_or_404(sample_id)
+    m = s.material
+    overall = overall_verdict(sample_id)
+    if overall is None:
+        flash("⚠️ No results found to generate COA.", "error")
+        return redirect(url_for("qc.qc_material_detail", material_id=m.id))
+
+    now = datetime.utcnow()
+    delta = RollupDelta()
+    if s.coa:
+        delta.coa(s.coa.generated_at, m.material_code, m.vendor, s.coa.overall_verdict, sign=-1)
+        s.coa.overall_verdict = overall
+        s.coa.generated_at = now
+    else:
+        db.session.add(COA(sample=s, overall_verdict=overall, generated_at=now))
+    delta.coa(now, m.material_code, m.vendor, overall)
+    delta.apply()
+
+    m.status = overall
+    # the warehouse lots of this QC lot become issuable (or are blocked) with it
+    for lot in WarehouseMaterial.query.filter_by(material_code=m.material_code, lot_no=m.lot_no):
+        stock_ledger.dispose(lot, overall == "Pass", remarks=f"COA {s.ar_no}", user=session.get("user_id"))
+    db.session.commit()
+    invalidate_coa(sample_id)
+    enqueue("render_coas", {"sample_ids": [sample_id]}, user=session.get("user_id"))
+    log_action(session.get("user_id"), f"Generated COA for AR {s.ar_no}: {overall}")
+    flash(f"📄 COA generated. Overall: {overall}", "success")
+    return redirect(url_for("qc.qc_view_coa", sample_id=sample_id))
+
+def _serve_coa(sample_id, fmt):
+    s = QCSample.query.get_or_404(sample_id)
+    if not s.coa:
+        flash("⚠️ No COA generated for this sample yet.", "error")
+        return redirect(url_for("qc.qc_material_detail", material_id=s.material_id))
+
+    etag = coa_fingerprint(s)
+    if request.if_none_match.contains(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = current_app.response_class(
+            rendered_coa(s, fmt, etag),
+            mimetype="application/pdf" if fmt == "pdf" else "text/html",
+        )
+        if fmt == "pdf":
+            resp.headers["Content-Disposition"] = f'inline; filename="COA-{s.ar_no}.pdf"'
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"  # always revalidate; 304 is cheap
+    return resp
+
+@bp.route("/qc/coa/<int:sample_id>")
+@requires("view_qc")
+def qc_view_coa(sample_id):
+    return _serve_coa(sample_id, "html")
+
+@bp.route("/qc/coa/<int:sample_id>.pdf")
+@requires("view_qc")
+def qc_view_coa_pdf(sample_id):
+    return _serve_coa(sample_id, "pdf")
+
+MAX_RANDOM_LOTS = 100000  # per request; generation runs as a background job
+
+@bp.route("/qc/generate-random", methods=["POST"])
+@requires("add_qc_data")
+def qc_generate_random():
+    n = min(max(int(request.form.get("count", 10)), 1), MAX_RANDOM_LOTS)  # default 10
+    seed = request.form.get("seed", type=int)
+    job_id = enqueue("generate_random", {"count": n, "seed": seed}, user=session.get("user_id"))
+    log_action(session.get("user_id"), f"Queued random data generation of {n} lots (job {job_id})")
+    flash(f"⏳ Generating {n} random lots in the background (job #{job_id}).", "success")
+    return redirect(url_for("main.jobs_page"))
+    
+@bp.route("/qc/clear-all", methods=["POST"])
+@requires("delete_qc_data")
+def qc_clear_all():
+    # optional filters: only lots received before a date and/or in one status
+    before = request.form.get("received_before", "").strip()
+    status = request.form.get("status", "").strip() or None
+    try:
+        received_before = datetime.strptime(before, "%Y-%m-%d") if before else None
+    except ValueError:
+        flash(f"⚠️ Invalid date {before!r}; use YYYY-MM-DD.", "error")
+        return redirect("/qc_dashboard")
+    job_id = enqueue("purge_raw_materials",
+                     {"received_before": received_before.isoformat() if received_before else None, "status": status},
+                     user=session.get("user_id"))
+    log_action(session.get("user_id"), f"Queued purge of raw material data (before={before or '-'}, status={status or '-'}, job {job_id})")
+    flash(f"⏳ Deleting QC data in the background (job #{job_id}).", "success")
+    return redirect(url_for("main.jobs_page"))
+
+# ------------------ QC: SPC trends ------------------
+
+@bp.route("/qc/spc")
+@requires("view_qc")
+def qc_spc():
+    material_code = request.args.get("material_code", "").strip()
+    parameter = request.args.get("parameter", "").strip()
+    alerts = SPCAlert.query.filter(SPCAlert.acknowledged_at.is_(None))
+    if material_code:
+        alerts = alerts.filter(SPCAlert.material_code == material_code)
+    alerts = alerts.order_by(SPCAlert.created_at.desc(), SPCAlert.id.desc()).limit(100).all()
+    chart = spc_chart(material_code, parameter) if material_code and parameter else None
+    return render_template("qc_spc.html", alerts=alerts, rules=SPC_RULES, chart=chart,
+                           series=spc_series_keys(material_code or None),
+                           material_code=material_code, parameter=parameter)
+
+@bp.route("/qc/spc/chart.json")
+@requires("view_qc", api=True)
+def qc_spc_chart():
+    chart = spc_chart(request.args.get("material_code", ""), request.args.get("parameter", ""))
+    if chart is None:
+        return {"error": "unknown series"}, 404
+    return chart
+
+@bp.route("/qc/spc/alert/<int:alert_id>/ack", methods=["POST"])
+@requires("approve_qc_data")
+def qc_spc_ack(alert_id):
+    a = SPCAlert.query.get_or_404(alert_id)
+    if a.acknowledged_at is None:
+        a.acknowledged_by = session.get("user_id")
+        a.acknowledged_at = datetime.utcnow()
+        db.session.commit()
+        log_action(session.get("user_id"), f"Acknowledged SPC alert {a.id} ({a.rule}) on {a.material_code} {a.parameter}")
+    flash("✅ Alert acknowledged.", "success")
+    return redirect(url_for("qc.qc_spc", material_code=request.form.get("material_code") or None))
+
+# ------------------- CLI COMMAND -------------------
+@bp.cli.command("seed-random")
+@click.option("--count", default=1000, show_default=True, help="Number of lots to generate.")
+@click.option("--seed", type=int, default=None, help="Seed for reproducible data.")
+@click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True, help="Lots per transaction.")
+def seed_random(count, seed, batch_size):
+    """Bulk-load random QC lots for load testing."""
+    print(generate_bulk_raw_materials(count, seed=seed, batch_size=batch_size))
+
+@bp.cli.command("qc-reevaluate")
+@click.option("--material-id", type=int, default=None, help="Only this material (default: all).")
+@click.option("--chunk-size", default=500, show_default=True, help="Materials per transaction.")
+def qc_reevaluate(material_id, chunk_size):
+    """Re-judge stored test results against the current specifications."""
+    q = db.session.query(RawMaterial.id).order_by(RawMaterial.id)
+    if material_id is not None:
+        q = q.filter(RawMaterial.id == material_id)
+    ids = [mid for (mid,) in q]
+    checked = changed = 0
+    for i in range(0, len(ids), chunk_size):
+        c, by_material = reevaluate_materials(ids[i:i + chunk_size])
+        db.session.commit()  # keep write transactions short
+        for mid in by_material:
+            invalidate_material_coas(mid)
+        checked += c
+        changed += sum(by_material.values())
+    print(f"✅ {checked} results re-evaluated, {changed} verdicts changed.")
+
+@bp.cli.command("qc-purge")
+@click.option("--before", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Only lots received before this date.")
+@click.option("--status", default=None, help="Only lots in this status.")
+@click.option("--chunk-size", default=PURGE_CHUNK_SIZE, show_default=True, help="Lots per transaction.")
+@click.option("--yes", is_flag=True, help="Do not ask for confirmation.")
+def qc_purge(before, status, chunk_size, yes):
+    """Delete raw material lots with their samples, specs, results and COAs."""
+    if not yes:
+        click.confirm(f"Purge lots (before={before or '-'}, status={status or '-'})?", abort=True)
+
+    def progress(done, total):
+        print(f"  {done}/{total} lots purged", end="\r", flush=True)
+
+    report = purge_raw_materials(received_before=before, status=status, chunk_size=chunk_size, progress=progress)
+    log_action("cli", f"Purged raw material data (before={before or '-'}, status={status or '-'}): {report.summary()}")
+    print(f"\n✅ {report.summary()}")
+
+@bp.cli.command("spc-rebuild")
+def spc_rebuild():
+    """Recompute the SPC series from the stored test results."""
+    n = rebuild_spc()
+    print(f"✅ {n} SPC series rebuilt.")
+
+@bp.cli.command("qc-import-results")
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--tested-by", default="import", show_default=True, help="Analyst recorded when the file has no tested_by column.")
+@click.option("--chunk-size", default=IMPORT_CHUNK_SIZE, show_default=True, help="Rows per transaction.")
+def qc_import_results_cli(files, tested_by, chunk_size):
+    """Import instrument CSV exports as test results."""
+    for path in files:
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            report = import_results_csv(fh, tested_by, filename=path, chunk_size=chunk_size)
+        print(report.summary())
+        for line_no, reason in report.rejected:
+            print(f"  line {line_no}: {reason}")
@@ -0,0 +1,257 @@
+# warehouse.py
+"""Warehouse department: receiving, issues, adjustments, dispatches and the v1 JSON API."""
+from datetime import datetime
+
+from flask import Blueprint, flash, redirect, render_template, request, session, url_for
+from sqlalchemy.orm import joinedload
+
+from database import db
+from models import StockBalance, WarehouseDispatch, WarehouseIssue, WarehouseMaterial
+from permissions import requires
+from utils import genealogy, stock_ledger
+from utils.audit_logger import log_action
+from utils.ingest import ingest_request
+from utils.lot_allocation import FEFO, issue_allocated
+from utils.response_cache import cached_response
+from utils.warehouse_api import RESOURCES as WAREHOUSE_RESOURCES, APIError, get_row, list_rows
+
+bp = Blueprint("warehouse", __name__)
+
+# ------------------- Warehouse -------------------
+WAREHOUSE_LIST_LIMIT = 100  # most recent rows shown per table on the dashboard
+
+@bp.route("/warehouse")
+@requires("view_warehouse")
+@cached_response(WarehouseMaterial, StockBalance, WarehouseIssue, WarehouseDispatch)
+def warehouse_dashboard():
+    # receipts go through /warehouse/add; the full lists are paged through /api/v1/warehouse/<resource>
+    materials = WarehouseMaterial.query.options(joinedload(WarehouseMaterial.stock)) \
+                                       .order_by(WarehouseMaterial.id.desc()).limit(WAREHOUSE_LIST_LIMIT).all()
+    issues = WarehouseIssue.query.order_by(WarehouseIssue.id.desc()).limit(WAREHOUSE_LIST_LIMIT).all()
+    dispatches = WarehouseDispatch.query.order_by(WarehouseDispatch.id.desc()).limit(WAREHOUSE_LIST_LIMIT).all()
+    return render_template("warehouse_dashboard.html", materials=materials,
+                           issues=issues, dispatches=dispatches)
+    
+    
+# -------------------
+# Warehouse Dashboard
+# -------------------
+# Add material (Receiving)
+@bp.route("/warehouse/add_material", methods=["POST"])
+@bp.route('/warehouse/add', methods=['POST'])
+@requires("add_warehouse_data")
+def add_material():
+    material_code = request.form['material_code']
+    lot_no = (request.form.get('lot_no') or '').strip() or None
+    existing = WarehouseMaterial.query.filter_by(material_code=material_code, lot_no=lot_no).first()
+    if existing:
+        if lot_no:
+            return "⚠️ This lot of the material was already received.", 400
+        return "⚠️ Material code already exists. Use a different code.", 400
+    try:
+        expiry_date = datetime.fromisoformat(request.form['expiry_date']) if request.form.get('expiry_date') else None
+    except ValueError:
+        return "⚠️ Expiry date must be YYYY-MM-DD.", 400
+
+    new_material = WarehouseMaterial(
+        material_name=request.form['material_name'],
+        material_code=material_code,
+        supplier_name=request.form['supplier_name'],
+        quantity_received=float(request.form['quantity_received']),
+        unit=request.form['unit'],
+        lot_no=lot_no,
+        expiry_date=expiry_date
+    )
+    db.session.add(new_material)
+    db.session.flush()  # need the id for the ledger
+    stock_ledger.receive(new_material, user=session.get("user_id"))
+    db.session.commit()
+    log_action(session.get("user_id"), f"Received {new_material.quantity_received} {new_material.unit} of {material_code} (id {new_material.id})")
+    return redirect('/warehouse')
+
+
+
+# Issue material: from a lot picked by hand, or allocated FEFO/FIFO across released lots by material code
+@bp.route("/warehouse/issue", methods=["POST"])
+@requires("add_warehouse_data")
+def issue_material():
+    issued_quantity = float(request.form.get("issued_quantity"))
+    issued_to = request.form.get("issued_to")
+    remarks = request.form.get("remarks")
+    batch_no = (request.form.get("batch_no") or "").strip() or None
+    if not request.form.get("material_id"):
+        return _issue_allocated(request.form.get("material_code", "").strip(), issued_quantity, issued_to,
+                                request.form.get("policy", FEFO), batch_no, remarks,
+                                (request.form.get("unit") or "").strip() or None)
+
+    material_id = int(request.form.get("material_id"))
+    material = WarehouseMaterial.query.get_or_404(material_id)
+    if material.status != stock_ledger.RELEASED:
+        flash(f"❌ Lot {material_id} is {material.status or 'not released'}; only QA-released lots can be issued.", "error")
+        return redirect(url_for("warehouse.warehouse_dashboard"))
+    new_issue = WarehouseIssue(
+        material_id=material_id,
+        issued_quantity=issued_quantity,
+        unit=material.unit,
+        issued_to=issued_to,
+        remarks=remarks,
+        batch_no=batch_no
+    )
+    db.session.add(new_issue)
+    db.session.flush()
+
+    # Update stock: one conditional UPDATE, safe against concurrent issues
+    try:
+        stock_ledger.issue(material_id, issued_quantity, unit=material.unit,
+                           reference=f"issue:{new_issue.id}", remarks=issued_to,
+                           user=session.get("user_id"))
+    except (stock_ledger.InsufficientStock, ValueError) as e:
+        db.session.rollback()
+        flash(f"❌ {e}", "error")
+        return redirect(url_for("warehouse.warehouse_dashboard"))
+    genealogy.record_issue(new_issue, material, user=session.get("user_id"))
+    db.session.commit()
+    log_action(session.get("user_id"), f"Issued {issued_quantity} {material.unit} of material {material_id} to {issued_to}"
+                                       + (f" for batch {batch_no}" if batch_no else ""))
+
+    flash("📦 Material issued successfully!", "success")
+    return redirect(url_for("warehouse.warehouse_dashboard"))
+
+def _lots_used(issues):
+    return ", ".join(f"{i.material_id} ({i.issued_quantity:g} {i.unit})" for i in issues)
+
+def _issue_allocated(material_code, quantity, issued_to, policy, batch_no, remarks, unit):
+    try:
+        issues = issue_allocated(material_code, quantity, issued_to, policy=policy, batch_no=batch_no,
+                                 remarks=remarks, user=session.get("user_id"), unit=unit)
+    except (stock_ledger.InsufficientStock, ValueError) as e:
+        db.session.rollback()
+        flash(f"❌ {e}", "error")
+        return redirect(url_for("warehouse.warehouse_dashboard"))
+    db.session.commit()
+    log_action(session.get("user_id"), f"Issued {quantity:g} {issues[0].unit} of {material_code} to {issued_to} ({policy}) "
+                                       f"from lot(s) {_lots_used(issues)}" + (f" for batch {batch_no}" if batch_no else ""))
+    flash(f"📦 Issued from {len(issues)} lot(s) by {policy}.", "success")
+    return redirect(url_for("warehouse.warehouse_dashboard"))
+
+# Stock adjustment (count corrections, damages, ...)
+@bp.route("/warehouse/adjust", methods=["POST"])
+@requires("approve_warehouse_data")
+def adjust_stock():
+    material_id = int(request.form.get("material_id"))
+    delta = float(request.form.get("quantity"))
+    material = WarehouseMaterial.query.get_or_404(material_id)
+    try:
+        stock_ledger.adjust(material_id, delta, unit=material.unit,
+                            remarks=request.form.get("remarks"), user=session.get("user_id"))
+    except (stock_ledger.InsufficientStock, ValueError) as e:
+        db.session.rollback()
+        flash(f"❌ {e}", "error")
+        return redirect(url_for("warehouse.warehouse_dashboard"))
+    db.session.commit()
+    log_action(session.get("user_id"), f"Adjusted material {material_id} by {delta:+g} {material.unit}")
+
+    flash("⚖️ Stock adjusted.", "success")
+    return redirect(url_for("warehouse.warehouse_dashboard"))
+
+# Dispatch finished goods
+@bp.route("/warehouse/dispatch", methods=["POST"])
+@requires("add_warehouse_data")
+def dispatch_goods():
+    product_name = request.form.get("product_name")
+    batch_no = request.form.get("batch_no")
+    quantity_dispatched = float(request.form.get("quantity_dispatched"))
+    customer_name = request.form.get("customer_name")
+    remarks = request.form.get("remarks")
+
+    new_dispatch = WarehouseDispatch(
+        product_name=product_name,
+        batch_no=batch_no,
+        quantity_dispatched=quantity_dispatched,
+        customer_name=customer_name,
+        remarks=remarks
+    )
+    db.session.add(new_dispatch)
+    db.session.flush()
+    stock_ledger.dispatch(new_dispatch, user=session.get("user_id"))
+    genealogy.record_dispatch(new_dispatch, user=session.get("user_id"))
+    db.session.commit()
+    log_action(session.get("user_id"), f"Dispatched {quantity_dispatched} of batch {batch_no} to {customer_name}")
+
+    flash("🚚 Goods dispatched successfully!", "success")
+    return redirect(url_for("warehouse.warehouse_dashboard"))
+
+
+# ------------------- Warehouse API (v1) -------------------
+
+def _api_page_link(resource, cursor_name, cursor):
+    if not cursor:
+        return None
+    args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+    return url_for("warehouse.warehouse_api_list", resource=resource, **{cursor_name: cursor}, **args)
+
+@bp.route("/api/v1/warehouse/<resource>")
+@requires("view_warehouse", api=True)
+def warehouse_api_list(resource):
+    if resource not in WAREHOUSE_RESOURCES:
+        return {"error": f"unknown resource {resource!r}"}, 404
+    try:
+        page = list_rows(resource, request.args)
+    except APIError as e:
+        return {"error": str(e)}, 400
+    page["next"] = _api_page_link(resource, "after", page["next_cursor"])
+    page["prev"] = _api_page_link(resource, "before", page["prev_cursor"])
+    return page
+
+@bp.route("/api/v1/warehouse/materials", methods=["POST"])
+@requires("add_warehouse_data", api=True)
+def warehouse_api_receive():
+    return ingest_request("warehouse_materials")
+
+@bp.route("/api/v1/warehouse/allocations", methods=["POST"])
+@requires("add_warehouse_data", api=True)
+def warehouse_api_allocate():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return {"error": "expected a JSON object"}, 400
+    material_code, issued_to = body.get("material_code"), body.get("issued_to")
+    if not isinstance(material_code, str) or not material_code.strip() or not isinstance(issued_to, str) or not issued_to.strip():
+        return {"error": "material_code and issued_to are required"}, 400
+    quantity = body.get("quantity")
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)):
+        return {"error": "quantity must be a number"}, 400
+    policy = body.get("policy", FEFO)
+    unit = body.get("unit")
+    if unit is not None and not isinstance(unit, str):
+        return {"error": "unit must be a string"}, 400
+    try:
+        issues = issue_allocated(material_code.strip(), float(quantity), issued_to.strip(), policy=policy,
+                                 batch_no=body.get("batch_no") or None, remarks=body.get("remarks"),
+                                 user=session.get("user_id"), unit=(unit or "").strip() or None)
+    except ValueError as e:
+        db.session.rollback()
+        return {"error": str(e)}, 400
+    except stock_ledger.InsufficientStock as e:
+        db.session.rollback()
+        return {"error": str(e)}, 409
+    db.session.commit()
+    log_action(session.get("user_id"), f"Issued {quantity:g} {issues[0].unit} of {material_code} to {issued_to} ({policy}) "
+                                       f"from lot(s) {_lots_used(issues)}")
+    return {
+        "material_code": material_code, "quantity": quantity, "unit": issues[0].unit, "policy": policy,
+        "issues": [{"id": i.id, "material_id": i.material_id, "issued_quantity": i.issued_quantity, "unit": i.unit}
+                   for i in issues],
+    }, 201
+
+@bp.route("/api/v1/warehouse/<resource>/<int:row_id>")
+@requires("view_warehouse", api=True)
+def warehouse_api_get(resource, row_id):
+    if resource not in WAREHOUSE_RESOURCES:
+        return {"error": f"unknown resource {resource!r}"}, 404
+    try:
+        row = get_row(resource, row_id, request.args)
+    except APIError as e:
+        return {"error": str(e)}, 400
+    if row is None:
+        return {"error": f"{resource} {row_id} not found"}, 404
+    return row
@@ -0,0 +1,92 @@
+# config.py
+"""
+Database engine settings, read from the environment.
+
+DATABASE_URL picks the database (default: SQLite in the instance folder).
+SQLite connections get WAL and the pragmas below on every connect, so
+readers no longer block behind a writer under several gunicorn workers.
+PostgreSQL (needs psycopg2) uses a QueuePool sized per worker and a
+server-side statement timeout.
+"""
+import os
+
+from sqlalchemy import event
+
+DEFAULT_DATABASE_URL = "sqlite:///pharma_data.db"
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _bool(name, default):
+    return os.environ.get(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# SQLite
+SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL
+SQLITE_BUSY_TIMEOUT_MS = _int("SQLITE_BUSY_TIMEOUT_MS", 10000)
+SQLITE_MMAP_SIZE = _int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_CACHE_SIZE_KB = _int("SQLITE_CACHE_SIZE_KB", 64 * 1024)
+
+# PostgreSQL
+DB_POOL_SIZE = _int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _int("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = _bool("DB_POOL_PRE_PING", True)
+DB_STATEMENT_TIMEOUT_MS = _int("DB_STATEMENT_TIMEOUT_MS", 30000)
+# migrations rewrite whole tables; 0 = no limit
+MIGRATION_STATEMENT_TIMEOUT_MS = _int("MIGRATION_STATEMENT_TIMEOUT_MS", 0)
+
+
+def database_url():
+    url = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
+    if url.startswith("postgres://"):  # Heroku-style URLs; SQLAlchemy wants the full name
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for `url`."""
+    if url.startswith("sqlite"):
+        # the driver-level timeout is the busy timeout for the initial connect
+        return {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    if url.startswith("postgresql"):
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "connect_args": {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+        }
+    return {"pool_pre_ping": DB_POOL_PRE_PING}
+
+
+def sqlite_pragmas():
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",  # negative = KiB
+    ]
+
+
+def configure_engine(engine):
+    """Attach per-connection setup to `engine`; call once per engine."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
@@ -1,8 +1,9 @@
-from app import app, db
+from app import create_app
+from database import db
 from models import User
 from werkzeug.security import generate_password_hash
 
-with app.app_context():
+with create_app().app_context():
     db.create_all()  # Create all tables
 
     if not User.query.filter_by(user_id='admin01').first():
@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+"""
+gunicorn settings, picked up from the working directory:
+
+    gunicorn 'app:create_app()'
+
+With preload_app the master imports and builds the app once and every
+worker is forked from it, so a worker boot (or a --max-requests recycle)
+costs a fork instead of a fresh import of the whole project. Set
+GUNICORN_PRELOAD=0 to import in each worker instead, e.g. so --reload can
+pick up code changes. WEB_CONCURRENCY and PORT are read by gunicorn itself.
+"""
+import os
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+
+def post_fork(server, worker):
+    # pooled connections opened in the master must not be shared with the
+    # workers; drop them (without closing the parent's sockets) so each
+    # worker opens its own. The audit writer and metrics are fork-aware.
+    if not preload_app:
+        return
+    from database import db
+
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+import config as db_config
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -51,6 +53,17 @@ def get_metadata():
     return target_db.metadata
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # the full-text search index (migration 71c4d0e8a5f3) is raw SQL, not a
+    # model: SQLite's FTS5 table and its shadow tables, PostgreSQL's GIN
+    # expression indexes. Without this autogenerate would drop them.
+    if type_ == "table" and (name == "search_index" or name.startswith("search_index_")):
+        return False
+    if type_ == "index" and reflected and compare_to is None and name.endswith("_search"):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +78,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,10 +107,17 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
+    # the app's engine, so DATABASE_URL, pool options and the SQLite pragmas
+    # from config.py apply to migrations as well
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # table rewrites can outlast the request statement timeout
+            connection.exec_driver_sql(
+                f"SET statement_timeout = {db_config.MIGRATION_STATEMENT_TIMEOUT_MS}")
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
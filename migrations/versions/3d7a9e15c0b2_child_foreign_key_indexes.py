@@ -0,0 +1,32 @@
+"""Indexes on specification.material_id and test_result.sample_id
+
+Revision ID: 3d7a9e15c0b2
+Revises: 9b3f6c2d41a7
+Create Date: 2026-10-18 16:48:12.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d7a9e15c0b2'
+down_revision = '9b3f6c2d41a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('specification', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_specification_material_id'), ['material_id'], unique=False)
+
+    with op.batch_alter_table('test_result', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_test_result_sample_id'), ['sample_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('test_result', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_test_result_sample_id'))
+
+    with op.batch_alter_table('specification', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_specification_material_id'))
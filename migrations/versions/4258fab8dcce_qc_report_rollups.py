@@ -0,0 +1,50 @@
+"""QC report rollups
+
+Revision ID: 4258fab8dcce
+Revises: eaf59184039d
+Create Date: 2026-10-18 13:05:27.640391
+
+Populate the new tables from existing data with `flask reports-rebuild`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4258fab8dcce'
+down_revision = 'eaf59184039d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('qc_result_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('material_code', sa.String(length=50), nullable=False),
+    sa.Column('vendor', sa.String(length=200), nullable=False),
+    sa.Column('parameter', sa.String(length=120), nullable=False),
+    sa.Column('n_results', sa.Integer(), nullable=False),
+    sa.Column('n_pass', sa.Integer(), nullable=False),
+    sa.Column('n_numeric', sa.Integer(), nullable=False),
+    sa.Column('sum_value', sa.Float(), nullable=False),
+    sa.Column('sum_sq_value', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'material_code', 'vendor', 'parameter', name='uq_qc_result_rollup_key')
+    )
+    op.create_table('qc_lot_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('material_code', sa.String(length=50), nullable=False),
+    sa.Column('vendor', sa.String(length=200), nullable=False),
+    sa.Column('n_received', sa.Integer(), nullable=False),
+    sa.Column('n_coa', sa.Integer(), nullable=False),
+    sa.Column('n_coa_pass', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'material_code', 'vendor', name='uq_qc_lot_rollup_key')
+    )
+
+
+def downgrade():
+    op.drop_table('qc_lot_rollup')
+    op.drop_table('qc_result_rollup')
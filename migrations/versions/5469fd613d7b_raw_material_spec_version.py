@@ -0,0 +1,26 @@
+"""RawMaterial spec_version
+
+Revision ID: 5469fd613d7b
+Revises: c1e04e2ced0a
+Create Date: 2026-10-18 10:48:15.302117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5469fd613d7b'
+down_revision = 'c1e04e2ced0a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('raw_material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('spec_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('raw_material', schema=None) as batch_op:
+        batch_op.drop_column('spec_version')
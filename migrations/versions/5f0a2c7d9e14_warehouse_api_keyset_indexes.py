@@ -0,0 +1,50 @@
+"""Warehouse API keyset indexes
+
+Revision ID: 5f0a2c7d9e14
+Revises: b6e2f84a1c93
+Create Date: 2026-10-18 20:03:41.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0a2c7d9e14'
+down_revision = 'b6e2f84a1c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('warehouse_material', schema=None) as batch_op:
+        batch_op.create_index('ix_warehouse_material_received', ['received_date', 'id'], unique=False)
+        batch_op.create_index('ix_warehouse_material_code_received', ['material_code', 'received_date', 'id'], unique=False)
+        batch_op.create_index('ix_warehouse_material_supplier_received', ['supplier_name', 'received_date', 'id'], unique=False)
+        batch_op.create_index('ix_warehouse_material_status_received', ['status', 'received_date', 'id'], unique=False)
+
+    with op.batch_alter_table('warehouse_issue', schema=None) as batch_op:
+        batch_op.create_index('ix_warehouse_issue_issued', ['issued_date', 'id'], unique=False)
+        batch_op.create_index('ix_warehouse_issue_material_issued', ['material_id', 'issued_date', 'id'], unique=False)
+
+    with op.batch_alter_table('warehouse_dispatch', schema=None) as batch_op:
+        batch_op.create_index('ix_warehouse_dispatch_dispatched', ['dispatch_date', 'id'], unique=False)
+        batch_op.create_index('ix_warehouse_dispatch_batch_dispatched', ['batch_no', 'dispatch_date', 'id'], unique=False)
+        batch_op.create_index('ix_warehouse_dispatch_customer_dispatched', ['customer_name', 'dispatch_date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('warehouse_dispatch', schema=None) as batch_op:
+        batch_op.drop_index('ix_warehouse_dispatch_customer_dispatched')
+        batch_op.drop_index('ix_warehouse_dispatch_batch_dispatched')
+        batch_op.drop_index('ix_warehouse_dispatch_dispatched')
+
+    with op.batch_alter_table('warehouse_issue', schema=None) as batch_op:
+        batch_op.drop_index('ix_warehouse_issue_material_issued')
+        batch_op.drop_index('ix_warehouse_issue_issued')
+
+    with op.batch_alter_table('warehouse_material', schema=None) as batch_op:
+        batch_op.drop_index('ix_warehouse_material_status_received')
+        batch_op.drop_index('ix_warehouse_material_supplier_received')
+        batch_op.drop_index('ix_warehouse_material_code_received')
+        batch_op.drop_index('ix_warehouse_material_received')
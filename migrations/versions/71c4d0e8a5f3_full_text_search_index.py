@@ -0,0 +1,89 @@
+"""Full-text search index
+
+Revision ID: 71c4d0e8a5f3
+Revises: 3d7a9e15c0b2
+Create Date: 2026-10-18 17:35:04.112870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '71c4d0e8a5f3'
+down_revision = '3d7a9e15c0b2'
+branch_labels = None
+depends_on = None
+
+# kind -> (table, title columns, body columns); kept in step with utils/search.py KINDS
+SOURCES = {
+    1: ('raw_material', ('material_code', 'material_name'), ('lot_no', 'vendor')),
+    2: ('qc_sample', ('ar_no',), ('remarks', 'sampler')),
+    3: ('warehouse_material', ('material_code', 'material_name'), ('supplier_name',)),
+    4: ('warehouse_dispatch', ('batch_no', 'product_name'), ('customer_name', 'remarks')),
+}
+KIND_BITS = 8
+
+
+def _concat(prefix, cols):
+    return " || ' ' || ".join(f"coalesce({prefix}{c}, '')" for c in cols)
+
+
+def _sqlite_upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    for kind, (table, title, body) in SOURCES.items():
+        rowid = f"{{row}}.id * {KIND_BITS} + {kind}"
+        insert = (f"INSERT INTO search_index(rowid, title, body) VALUES "
+                  f"({rowid.format(row='new')}, {_concat('new.', title)}, {_concat('new.', body)});")
+        delete = f"DELETE FROM search_index WHERE rowid = {rowid.format(row='old')};"
+        columns = ", ".join(title + body)
+        op.execute(f"CREATE TRIGGER search_{table}_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        op.execute(f"CREATE TRIGGER search_{table}_ad AFTER DELETE ON {table} BEGIN {delete} END")
+        # only the indexed columns, so status updates don't churn the index
+        op.execute(f"CREATE TRIGGER search_{table}_au AFTER UPDATE OF {columns} ON {table} "
+                   f"BEGIN {delete} {insert} END")
+        op.execute(
+            f"INSERT INTO search_index(rowid, title, body) "
+            f"SELECT id * {KIND_BITS} + {kind}, {_concat('', title)}, {_concat('', body)} FROM {table}"
+        )
+    op.execute("INSERT INTO search_index(search_index) VALUES ('optimize')")
+
+
+def _sqlite_downgrade():
+    for table in [t for t, _, _ in SOURCES.values()]:
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS search_{table}_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_index")
+
+
+def _pg_upgrade():
+    for table, title, body in SOURCES.values():
+        # same expression as utils/search.py _pg_vector (which qualifies the
+        # columns; that parses to the same tree), or the planner won't use it
+        vector = "to_tsvector('simple', {})".format(_concat("", title + body))
+        op.execute(f"CREATE INDEX ix_{table}_search ON {table} USING gin (({vector}))")
+
+
+def _pg_downgrade():
+    for table, _, _ in SOURCES.values():
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _sqlite_upgrade()
+    elif dialect == 'postgresql':
+        _pg_upgrade()
+    # other databases fall back to LIKE queries and need nothing here
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _sqlite_downgrade()
+    elif dialect == 'postgresql':
+        _pg_downgrade()
@@ -0,0 +1,28 @@
+"""Response cache table versions
+
+Revision ID: 9b3f6c2d41a7
+Revises: c115ee3e104b
+Create Date: 2026-10-18 16:02:37.518903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3f6c2d41a7'
+down_revision = 'c115ee3e104b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_version',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
@@ -0,0 +1,66 @@
+"""SPC series state and out-of-trend alerts
+
+Revision ID: b6e2f84a1c93
+Revises: 71c4d0e8a5f3
+Create Date: 2026-10-18 19:12:05.361870
+
+Fold existing results into the new series with `flask spc-rebuild`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2f84a1c93'
+down_revision = '71c4d0e8a5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('spc_series',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('material_code', sa.String(length=50), nullable=False),
+    sa.Column('parameter', sa.String(length=120), nullable=False),
+    sa.Column('n', sa.Integer(), nullable=False),
+    sa.Column('mean', sa.Float(), nullable=False),
+    sa.Column('m2', sa.Float(), nullable=False),
+    sa.Column('ewma', sa.Float(), nullable=True),
+    sa.Column('cusum_hi', sa.Float(), nullable=False),
+    sa.Column('cusum_lo', sa.Float(), nullable=False),
+    sa.Column('recent', sa.Text(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('material_code', 'parameter', name='uq_spc_series_key')
+    )
+    op.create_table('spc_alert',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('series_id', sa.Integer(), nullable=False),
+    sa.Column('result_id', sa.Integer(), nullable=True),
+    sa.Column('material_code', sa.String(length=50), nullable=False),
+    sa.Column('parameter', sa.String(length=120), nullable=False),
+    sa.Column('rule', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.Float(), nullable=True),
+    sa.Column('z', sa.Float(), nullable=True),
+    sa.Column('verdict', sa.String(length=10), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('acknowledged_by', sa.String(length=100), nullable=True),
+    sa.Column('acknowledged_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['series_id'], ['spc_series.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('spc_alert', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_spc_alert_series_id'), ['series_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_spc_alert_result_id'), ['result_id'], unique=False)
+        batch_op.create_index('ix_spc_alert_open', ['acknowledged_at', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('spc_alert', schema=None) as batch_op:
+        batch_op.drop_index('ix_spc_alert_open')
+        batch_op.drop_index(batch_op.f('ix_spc_alert_result_id'))
+        batch_op.drop_index(batch_op.f('ix_spc_alert_series_id'))
+
+    op.drop_table('spc_alert')
+    op.drop_table('spc_series')
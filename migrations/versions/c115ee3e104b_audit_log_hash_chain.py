@@ -0,0 +1,33 @@
+"""Audit log with hash chain
+
+Revision ID: c115ee3e104b
+Revises: 4258fab8dcce
+Create Date: 2026-10-18 14:11:50.226471
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c115ee3e104b'
+down_revision = '4258fab8dcce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('audit_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.String(length=50), nullable=True),
+    sa.Column('action', sa.String(length=255), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('prev_hash', sa.String(length=64), nullable=False),
+    sa.Column('entry_hash', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('entry_hash')
+    )
+
+
+def downgrade():
+    op.drop_table('audit_log')
@@ -0,0 +1,28 @@
+"""AR sequence table
+
+Revision ID: c1e04e2ced0a
+Revises: e9e05c25479c
+Create Date: 2026-10-18 10:02:41.771904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1e04e2ced0a'
+down_revision = 'e9e05c25479c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ar_sequence',
+    sa.Column('prefix', sa.String(length=30), nullable=False),
+    sa.Column('last_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('prefix')
+    )
+
+
+def downgrade():
+    op.drop_table('ar_sequence')
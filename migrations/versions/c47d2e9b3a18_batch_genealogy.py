@@ -0,0 +1,72 @@
+"""Batch genealogy
+
+Revision ID: c47d2e9b3a18
+Revises: a8c3e5f17d20
+Create Date: 2026-10-18 23:58:12.406731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47d2e9b3a18'
+down_revision = 'a8c3e5f17d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('genealogy_node',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('ref', sa.String(length=100), nullable=False),
+    sa.Column('label', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'ref', name='uq_genealogy_node_key')
+    )
+    op.create_table('genealogy_edge',
+    sa.Column('parent_id', sa.Integer(), nullable=False),
+    sa.Column('child_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=True),
+    sa.Column('unit', sa.String(length=50), nullable=True),
+    sa.Column('created_by', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['child_id'], ['genealogy_node.id'], ),
+    sa.ForeignKeyConstraint(['parent_id'], ['genealogy_node.id'], ),
+    sa.PrimaryKeyConstraint('parent_id', 'child_id')
+    )
+    with op.batch_alter_table('genealogy_edge', schema=None) as batch_op:
+        batch_op.create_index('ix_genealogy_edge_child', ['child_id', 'parent_id'], unique=False)
+
+    op.create_table('genealogy_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['genealogy_node.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['genealogy_node.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    with op.batch_alter_table('genealogy_closure', schema=None) as batch_op:
+        batch_op.create_index('ix_genealogy_closure_descendant', ['descendant_id', 'ancestor_id'], unique=False)
+
+    with op.batch_alter_table('warehouse_issue', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('batch_no', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_warehouse_issue_batch_issued', ['batch_no', 'issued_date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('warehouse_issue', schema=None) as batch_op:
+        batch_op.drop_index('ix_warehouse_issue_batch_issued')
+        batch_op.drop_column('batch_no')
+
+    with op.batch_alter_table('genealogy_closure', schema=None) as batch_op:
+        batch_op.drop_index('ix_genealogy_closure_descendant')
+
+    op.drop_table('genealogy_closure')
+    with op.batch_alter_table('genealogy_edge', schema=None) as batch_op:
+        batch_op.drop_index('ix_genealogy_edge_child')
+
+    op.drop_table('genealogy_edge')
+    op.drop_table('genealogy_node')
@@ -0,0 +1,59 @@
+"""Warehouse lot number and expiry date
+
+Revision ID: e2b9d0f64c51
+Revises: c47d2e9b3a18
+Create Date: 2026-10-19 00:21:46.930518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b9d0f64c51'
+down_revision = 'c47d2e9b3a18'
+branch_labels = None
+depends_on = None
+
+# 32592e3bd2ea dropped unique=True from the model but never the constraint itself;
+# a code is now received in many lots. It was created unnamed, so name it to drop it.
+NAMING = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+
+
+def _code_unique():
+    for uq in sa.inspect(op.get_bind()).get_unique_constraints('warehouse_material'):
+        if uq['column_names'] == ['material_code']:
+            return uq['name'] or 'uq_warehouse_material_material_code'
+    return None
+
+
+def _triggers():
+    # SQLite drops a table's triggers (the search index's) when batch mode copies it
+    if op.get_bind().dialect.name != 'sqlite':
+        return []
+    return [sql for (sql,) in op.get_bind().execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'warehouse_material'"))]
+
+
+def upgrade():
+    code_unique = _code_unique()
+    if code_unique:
+        triggers = _triggers()
+        with op.batch_alter_table('warehouse_material', schema=None, naming_convention=NAMING) as batch_op:
+            batch_op.drop_constraint(code_unique, type_='unique')
+        for sql in triggers:
+            op.execute(sql)
+
+    with op.batch_alter_table('warehouse_material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('lot_no', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('expiry_date', sa.DateTime(), nullable=True))
+
+    # lots already in stock were issuable before release existed; keep them so,
+    # or FEFO/FIFO allocation could never use them
+    op.execute("UPDATE warehouse_material SET status = 'Released' WHERE status = 'Received' OR status IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('warehouse_material', schema=None) as batch_op:
+        batch_op.drop_column('expiry_date')
+        batch_op.drop_column('lot_no')
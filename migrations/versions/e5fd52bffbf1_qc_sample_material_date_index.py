@@ -0,0 +1,26 @@
+"""QCSample (material_id, sample_date) index
+
+Revision ID: e5fd52bffbf1
+Revises: 5469fd613d7b
+Create Date: 2026-10-18 11:36:52.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5fd52bffbf1'
+down_revision = '5469fd613d7b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('qc_sample', schema=None) as batch_op:
+        batch_op.create_index('ix_qc_sample_material_date', ['material_id', 'sample_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('qc_sample', schema=None) as batch_op:
+        batch_op.drop_index('ix_qc_sample_material_date')
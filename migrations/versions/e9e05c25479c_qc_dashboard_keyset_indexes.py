@@ -0,0 +1,32 @@
+"""QC dashboard keyset indexes
+
+Revision ID: e9e05c25479c
+Revises: 32592e3bd2ea
+Create Date: 2026-10-18 09:12:03.418220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9e05c25479c'
+down_revision = '32592e3bd2ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('raw_material', schema=None) as batch_op:
+        batch_op.create_index('ix_raw_material_received', ['received_date', 'id'], unique=False)
+        batch_op.create_index('ix_raw_material_status_received', ['status', 'received_date', 'id'], unique=False)
+        batch_op.create_index('ix_raw_material_code_received', ['material_code', 'received_date', 'id'], unique=False)
+        batch_op.create_index('ix_raw_material_vendor_received', ['vendor', 'received_date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('raw_material', schema=None) as batch_op:
+        batch_op.drop_index('ix_raw_material_vendor_received')
+        batch_op.drop_index('ix_raw_material_code_received')
+        batch_op.drop_index('ix_raw_material_status_received')
+        batch_op.drop_index('ix_raw_material_received')
@@ -0,0 +1,62 @@
+"""Stock ledger
+
+Revision ID: eaf59184039d
+Revises: e5fd52bffbf1
+Create Date: 2026-10-18 12:20:09.118456
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eaf59184039d'
+down_revision = 'e5fd52bffbf1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_movement',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=True),
+    sa.Column('movement_type', sa.String(length=20), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('unit', sa.String(length=50), nullable=True),
+    sa.Column('reference', sa.String(length=100), nullable=True),
+    sa.Column('remarks', sa.String(length=300), nullable=True),
+    sa.Column('created_by', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['material_id'], ['warehouse_material.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_movement', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_movement_material_id'), ['material_id'], unique=False)
+
+    op.create_table('stock_balance',
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['material_id'], ['warehouse_material.id'], ),
+    sa.PrimaryKeyConstraint('material_id')
+    )
+
+    # Open the ledger with what is on hand today. quantity_received has been
+    # decremented by past issues, so it is the current stock, not the receipt.
+    op.execute(
+        "INSERT INTO stock_movement (material_id, movement_type, quantity, unit, reference, remarks, created_by, created_at) "
+        "SELECT id, 'Receipt', quantity_received, unit, 'opening-balance', 'Opening balance', 'migration', "
+        "COALESCE(received_date, CURRENT_TIMESTAMP) FROM warehouse_material"
+    )
+    op.execute(
+        "INSERT INTO stock_balance (material_id, quantity, updated_at) "
+        "SELECT id, quantity_received, CURRENT_TIMESTAMP FROM warehouse_material"
+    )
+
+
+def downgrade():
+    op.drop_table('stock_balance')
+    with op.batch_alter_table('stock_movement', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_movement_material_id'))
+
+    op.drop_table('stock_movement')
@@ -41,6 +41,17 @@ class QARecord(db.Model):
 from datetime import datetime
 from database import db
 
+# 21 CFR Part 11 audit trail; rows are written by utils/audit_logger.py and
+# chained with SHA-256 hashes so any edit or deletion is detectable
+class AuditLog(db.Model):
+    __tablename__ = "audit_log"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(50))
+    action = db.Column(db.String(255))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    prev_hash = db.Column(db.String(64), nullable=False)
+    entry_hash = db.Column(db.String(64), nullable=False, unique=True)
+
 # --- Raw material master & QC artifacts ---
 
 class RawMaterial(db.Model):
@@ -54,14 +65,26 @@ class RawMaterial(db.Model):
     unit = db.Column(db.String(20))
     received_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(30), default="Pending Sampling")  # Pending Sampling | Sampled | Testing | Pass | Fail
+    spec_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")  # bumped on every spec change
+
+    # composite indexes backing keyset pagination on the QC dashboard
+    __table_args__ = (
+        db.Index("ix_raw_material_received", "received_date", "id"),
+        db.Index("ix_raw_material_status_received", "status", "received_date", "id"),
+        db.Index("ix_raw_material_code_received", "material_code", "received_date", "id"),
+        db.Index("ix_raw_material_vendor_received", "vendor", "received_date", "id"),
+    )
 
     # relationships
     samples = db.relationship("QCSample", backref="material", lazy=True, cascade="all, delete-orphan")
     specs = db.relationship("Specification", backref="material", lazy=True, cascade="all, delete-orphan")
 
     # convenience
-    def latest_sample(self):
-        return sorted(self.samples, key=lambda s: s.sample_date or datetime.min, reverse=True)[0] if self.samples else None
+    def latest_sample(self, *options):
+        # one indexed ORDER BY ... LIMIT 1 on (material_id, sample_date) instead of loading every sample
+        return QCSample.query.filter_by(material_id=self.id) \
+                             .order_by(QCSample.sample_date.desc(), QCSample.id.desc()) \
+                             .options(*options).first()
 
 
 class QCSample(db.Model):
@@ -74,15 +97,25 @@ class QCSample(db.Model):
 
     material_id = db.Column(db.Integer, db.ForeignKey("raw_material.id"), nullable=False)
 
+    __table_args__ = (
+        db.Index("ix_qc_sample_material_date", "material_id", "sample_date"),
+    )
+
     # relationships
     results = db.relationship("TestResult", backref="sample", lazy=True, cascade="all, delete-orphan")
     coa = db.relationship("COA", uselist=False, backref="sample", cascade="all, delete-orphan")
 
 
+class ARSequence(db.Model):
+    __tablename__ = "ar_sequence"
+    prefix = db.Column(db.String(30), primary_key=True)          # e.g., "AR-20250812-"
+    last_value = db.Column(db.Integer, nullable=False, default=0)  # last number handed out
+
+
 class Specification(db.Model):
     __tablename__ = "specification"
     id = db.Column(db.Integer, primary_key=True)
-    material_id = db.Column(db.Integer, db.ForeignKey("raw_material.id"), nullable=False)
+    material_id = db.Column(db.Integer, db.ForeignKey("raw_material.id"), nullable=False, index=True)
 
     parameter = db.Column(db.String(120), nullable=False)     # e.g., "pH", "Assay"
     method = db.Column(db.String(120))                        # e.g., "USP <791>"
@@ -97,7 +130,7 @@ class Specification(db.Model):
 class TestResult(db.Model):
     __tablename__ = "test_result"
     id = db.Column(db.Integer, primary_key=True)
-    sample_id = db.Column(db.Integer, db.ForeignKey("qc_sample.id"), nullable=False)
+    sample_id = db.Column(db.Integer, db.ForeignKey("qc_sample.id"), nullable=False, index=True)
 
     parameter = db.Column(db.String(120), nullable=False)
     result_value = db.Column(db.Float)          # numeric result (nullable)
@@ -126,7 +159,20 @@ class WarehouseMaterial(db.Model):
     quantity_received = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(20), nullable=False)
     received_date = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='Received')
+    status = db.Column(db.String(20), default='Received')  # Received | Released | Rejected; only Released lots are allocated
+    lot_no = db.Column(db.String(100))       # supplier lot; matched to the QC lot of the same code to release it
+    expiry_date = db.Column(db.DateTime)     # drives first-expiry-first-out allocation
+
+    # keyset indexes behind the warehouse API's filters and date order
+    __table_args__ = (
+        db.Index("ix_warehouse_material_received", "received_date", "id"),
+        db.Index("ix_warehouse_material_code_received", "material_code", "received_date", "id"),
+        db.Index("ix_warehouse_material_supplier_received", "supplier_name", "received_date", "id"),
+        db.Index("ix_warehouse_material_status_received", "status", "received_date", "id"),
+    )
+
+    # current stock lives in StockBalance; quantity_received is never changed after receipt
+    stock = db.relationship("StockBalance", uselist=False, lazy=True)
 
 # Material issued to production
 class WarehouseIssue(db.Model):
@@ -137,6 +183,13 @@ class WarehouseIssue(db.Model):
     issued_to = db.Column(db.String(200), nullable=False)  # Production / QA / QC
     issued_date = db.Column(db.DateTime, default=datetime.utcnow)
     remarks = db.Column(db.String(300))
+    batch_no = db.Column(db.String(100))  # production batch the material went into, if any
+
+    __table_args__ = (
+        db.Index("ix_warehouse_issue_issued", "issued_date", "id"),
+        db.Index("ix_warehouse_issue_material_issued", "material_id", "issued_date", "id"),  # also the FK lookup
+        db.Index("ix_warehouse_issue_batch_issued", "batch_no", "issued_date", "id"),
+    )
 
 # Finished goods dispatch
 class WarehouseDispatch(db.Model):
@@ -148,3 +201,187 @@ class WarehouseDispatch(db.Model):
     customer_name = db.Column(db.String(200), nullable=False)
     dispatch_date = db.Column(db.DateTime, default=datetime.utcnow)
     remarks = db.Column(db.String(300))
+
+    __table_args__ = (
+        db.Index("ix_warehouse_dispatch_dispatched", "dispatch_date", "id"),
+        db.Index("ix_warehouse_dispatch_batch_dispatched", "batch_no", "dispatch_date", "id"),
+        db.Index("ix_warehouse_dispatch_customer_dispatched", "customer_name", "dispatch_date", "id"),
+    )
+
+# Append-only stock ledger: every receipt / issue / dispatch / adjustment is one row
+class StockMovement(db.Model):
+    __tablename__ = "stock_movement"
+    id = db.Column(db.Integer, primary_key=True)
+    material_id = db.Column(db.Integer, db.ForeignKey("warehouse_material.id"), index=True)  # null for finished-goods dispatches
+    movement_type = db.Column(db.String(20), nullable=False)   # Receipt | Issue | Dispatch | Adjustment | Release | Reject
+    quantity = db.Column(db.Float, nullable=False)             # signed: + into stock, - out of stock
+    unit = db.Column(db.String(50))
+    reference = db.Column(db.String(100))                      # e.g. "issue:12", "dispatch:3"
+    remarks = db.Column(db.String(300))
+    created_by = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Materialised running balance per material, kept in step with StockMovement
+class StockBalance(db.Model):
+    __tablename__ = "stock_balance"
+    material_id = db.Column(db.Integer, db.ForeignKey("warehouse_material.id"), primary_key=True)
+    quantity = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# --- Pre-aggregated QC reporting rollups (maintained by utils/reports.py) ---
+
+class QCResultRollup(db.Model):
+    __tablename__ = "qc_result_rollup"
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    material_code = db.Column(db.String(50), nullable=False)
+    vendor = db.Column(db.String(200), nullable=False, default="")   # "" instead of NULL so the unique key holds
+    parameter = db.Column(db.String(120), nullable=False)
+
+    n_results = db.Column(db.Integer, nullable=False, default=0)
+    n_pass = db.Column(db.Integer, nullable=False, default=0)
+    n_numeric = db.Column(db.Integer, nullable=False, default=0)    # results with a result_value
+    sum_value = db.Column(db.Float, nullable=False, default=0.0)
+    sum_sq_value = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint("day", "material_code", "vendor", "parameter", name="uq_qc_result_rollup_key"),
+    )
+
+
+class QCLotRollup(db.Model):
+    __tablename__ = "qc_lot_rollup"
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    material_code = db.Column(db.String(50), nullable=False)
+    vendor = db.Column(db.String(200), nullable=False, default="")
+
+    n_received = db.Column(db.Integer, nullable=False, default=0)   # lots received that day
+    n_coa = db.Column(db.Integer, nullable=False, default=0)        # COAs whose current verdict dates from that day
+    n_coa_pass = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint("day", "material_code", "vendor", name="uq_qc_lot_rollup_key"),
+    )
+
+
+# --- Statistical process control per material_code x parameter (maintained by utils/spc.py) ---
+
+class SPCSeries(db.Model):
+    __tablename__ = "spc_series"
+    id = db.Column(db.Integer, primary_key=True)
+    material_code = db.Column(db.String(50), nullable=False)
+    parameter = db.Column(db.String(120), nullable=False)
+
+    n = db.Column(db.Integer, nullable=False, default=0)          # numeric results folded in
+    mean = db.Column(db.Float, nullable=False, default=0.0)       # Welford running mean
+    m2 = db.Column(db.Float, nullable=False, default=0.0)         # Welford sum of squared deviations
+    ewma = db.Column(db.Float)
+    cusum_hi = db.Column(db.Float, nullable=False, default=0.0)   # tabular CUSUM, in sigmas
+    cusum_lo = db.Column(db.Float, nullable=False, default=0.0)
+    recent = db.Column(db.Text, nullable=False, default="[]")     # JSON ring of the latest points
+    version = db.Column(db.Integer, nullable=False, default=0)    # optimistic concurrency
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("material_code", "parameter", name="uq_spc_series_key"),
+    )
+
+
+class SPCAlert(db.Model):
+    __tablename__ = "spc_alert"
+    id = db.Column(db.Integer, primary_key=True)
+    series_id = db.Column(db.Integer, db.ForeignKey("spc_series.id"), nullable=False, index=True)
+    result_id = db.Column(db.Integer, index=True)   # the result that raised it; purge deletes both
+    material_code = db.Column(db.String(50), nullable=False)
+    parameter = db.Column(db.String(120), nullable=False)
+    rule = db.Column(db.String(20), nullable=False)   # WE1..WE4 | EWMA | CUSUM+ | CUSUM-
+    value = db.Column(db.Float)
+    z = db.Column(db.Float)
+    verdict = db.Column(db.String(10))                # spec verdict of the result: Pass = out of trend, in spec
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    acknowledged_by = db.Column(db.String(100))
+    acknowledged_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_spc_alert_open", "acknowledged_at", "created_at"),
+    )
+
+
+# --- Batch genealogy: lot -> issue -> batch -> dispatch (maintained by utils/genealogy.py) ---
+
+class GenealogyNode(db.Model):
+    __tablename__ = "genealogy_node"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)    # lot | issue | batch | dispatch
+    ref = db.Column(db.String(100), nullable=False)    # warehouse_material / warehouse_issue / warehouse_dispatch id, or batch_no
+    label = db.Column(db.String(200))                  # shown in traces: material, issued to, product, customer
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("kind", "ref", name="uq_genealogy_node_key"),
+    )
+
+
+class GenealogyEdge(db.Model):
+    __tablename__ = "genealogy_edge"
+    parent_id = db.Column(db.Integer, db.ForeignKey("genealogy_node.id"), primary_key=True)
+    child_id = db.Column(db.Integer, db.ForeignKey("genealogy_node.id"), primary_key=True)
+    quantity = db.Column(db.Float)   # how much of the parent went into the child, when known
+    unit = db.Column(db.String(50))
+    created_by = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_genealogy_edge_child", "child_id", "parent_id"),
+    )
+
+
+# One row per (ancestor, descendant) pair, itself included at depth 0
+class GenealogyClosure(db.Model):
+    __tablename__ = "genealogy_closure"
+    ancestor_id = db.Column(db.Integer, db.ForeignKey("genealogy_node.id"), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey("genealogy_node.id"), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)   # edges on the shortest path between them
+
+    __table_args__ = (
+        db.Index("ix_genealogy_closure_descendant", "descendant_id", "ancestor_id"),
+    )
+
+
+
+# --- Background jobs (queued by the web app, run by `flask jobs-worker`; see utils/jobs.py) ---
+
+class Job(db.Model):
+    __tablename__ = "job"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)               # a key of utils.jobs.JOB_KINDS
+    params = db.Column(db.Text, nullable=False, default="{}")     # JSON keyword arguments
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued | running | succeeded | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=1)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # retry backoff
+    progress_done = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer)
+    message = db.Column(db.String(255))
+    result = db.Column(db.Text)                                   # JSON, set on success
+    error = db.Column(db.Text)                                    # last failure, kept across retries
+    worker = db.Column(db.String(100))                            # host:pid of the worker running it
+    heartbeat_at = db.Column(db.DateTime)                         # refreshed by that worker while it runs
+    created_by = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_job_status_run_after", "status", "run_after", "id"),
+        db.Index("ix_job_created_by", "created_by", "id"),
+    )
+
+
+# Bumped in the same transaction as every write to a table that a cached
+# page depends on; see utils/response_cache.py
+class CacheVersion(db.Model):
+    __tablename__ = "cache_version"
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -1,3 +1,17 @@
+import zlib
+from functools import wraps
+
+from flask import redirect, request, session, url_for
+
+# What the QC rights open up (blueprints/qc.py):
+#   add_qc_data      materials, samples, results, imports, random seeding
+#   edit_qc_data     specifications
+#   approve_qc_data  COA generation, SPC alert acknowledgement
+#   delete_qc_data   clear-all
+# Before these checks any QC user could do all of it. An Officer (and a
+# position that matches nothing, which falls back to Officer) now records
+# data but can no longer add specs or generate COAs; that takes an
+# Executive / Senior Officer or above, as the ladder below says.
 PERMISSIONS = {
     "QC Officer": ["view_qc", "add_qc_data"],
     "Junior Officer": ["view_qc"],
@@ -17,8 +31,140 @@ PERMISSIONS = {
     "QA Manager": ["view_qa", "add_qa_data", "approve_qa_data"]
 }
 
+# granted to everyone in a department on top of their position's permissions
+DEPARTMENT_PERMISSIONS = {
+    "QC": ["view_reports"],
+    "QA": ["view_reports"],
+}
+
+# only the Admin designation holds these (it holds every bit)
+ADMIN_PERMISSIONS = ["admin"]
+
+# ------------------ Compiled once at import ------------------
+
+PERMISSION_BITS = {}
+for _perms in [*PERMISSIONS.values(), *DEPARTMENT_PERMISSIONS.values(), ADMIN_PERMISSIONS]:
+    for _p in _perms:
+        PERMISSION_BITS.setdefault(_p, 1 << len(PERMISSION_BITS))
+
+ALL_PERMISSIONS = (1 << len(PERMISSION_BITS)) - 1
+
+
+def _mask(perms):
+    mask = 0
+    for p in perms:
+        mask |= PERMISSION_BITS[p]
+    return mask
+
+
+ROLE_MASKS = {role: _mask(perms) for role, perms in PERMISSIONS.items()}
+DEPARTMENT_MASKS = {dept: _mask(perms) for dept, perms in DEPARTMENT_PERMISSIONS.items()}
+_ROLE_LOOKUP = {role.lower(): mask for role, mask in ROLE_MASKS.items()}
+
+# stored next to the mask in the session; a changed table recompiles old sessions' masks
+MASK_VERSION = zlib.crc32(repr((sorted(PERMISSION_BITS.items()), sorted(ROLE_MASKS.items()),
+                                sorted(DEPARTMENT_MASKS.items()))).encode())
+
+
+def role_mask(designation, position):
+    """
+    Permission bitmask for a user's designation (department) and position.
+
+    Positions are matched as "<designation> <position>" ("Warehouse Manager");
+    the unprefixed ladder in PERMISSIONS ("Senior Officer", "HOD", ...) is QC's.
+    A position that matches nothing gets the department's Officer permissions.
+    """
+    if designation == "Admin":
+        return ALL_PERMISSIONS
+    position = (position or "").strip().lower().replace("sr.", "senior").replace("sr ", "senior ")
+    candidates = [f"{designation} {position}".lower()]
+    if designation == "QC":
+        candidates.append(position)
+    candidates.append(f"{designation} officer".lower())
+    mask = 0
+    for name in candidates:
+        if name in _ROLE_LOOKUP:
+            mask = _ROLE_LOOKUP[name]
+            break
+    return mask | DEPARTMENT_MASKS.get(designation, 0)
+
+
 def has_permission(user_role, action):
     """
     Check if the given role has permission for a specific action.
     """
-    return action in PERMISSIONS.get(user_role, [])
+    return bool(ROLE_MASKS.get(user_role, 0) & PERMISSION_BITS.get(action, 0))
+
+
+# ------------------ Request-time checks ------------------
+
+def store_session_mask(user):
+    """Cache the user's compiled mask in the session at login."""
+    session["permissions"] = role_mask(user.designation, user.position)
+    session["permissions_version"] = MASK_VERSION
+
+
+def session_mask():
+    """The logged-in user's mask, or None when nobody is logged in."""
+    sess = session._get_current_object()  # each proxied access costs ~2 µs; resolve once
+    mask = sess.get("permissions")
+    if mask is None or sess.get("permissions_version") != MASK_VERSION:
+        if not sess.get("user_id"):
+            return None
+        mask = role_mask(sess.get("designation"), sess.get("position"))
+        sess["permissions"] = mask
+        sess["permissions_version"] = MASK_VERSION
+    return mask
+
+
+def can(permission):
+    mask = session_mask()
+    return mask is not None and bool(mask & PERMISSION_BITS[permission])
+
+
+def requires(permission, post=None, api=False):
+    """
+    Route decorator: the user must hold `permission` (and `post` as well for
+    POST requests). Anonymous users go to the login page, everyone else gets
+    a 403. With api=True both answers are JSON.
+    """
+    needed = PERMISSION_BITS[permission]  # a typo fails at import, not per request
+    needed_post = needed | PERMISSION_BITS[post] if post else needed
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            mask = session_mask()
+            bits = needed_post if needed_post != needed and request.method == "POST" else needed
+            if mask is not None and mask & bits == bits:
+                return view(*args, **kwargs)
+            return _deny(mask, api)
+        return wrapped
+    return decorator
+
+
+def requires_any(*permissions, api=False):
+    """Like @requires, but holding any one of `permissions` is enough."""
+    needed = 0
+    for p in permissions:
+        needed |= PERMISSION_BITS[p]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            mask = session_mask()
+            if mask is not None and mask & needed:
+                return view(*args, **kwargs)
+            return _deny(mask, api)
+        return wrapped
+    return decorator
+
+
+def _deny(mask, api):
+    if mask is None:
+        if api:
+            return {"error": "login required"}, 401
+        return redirect(url_for("main.login"))
+    if api:
+        return {"error": "permission denied"}, 403
+    return "⛔ You do not have permission to do that.", 403
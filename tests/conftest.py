@@ -0,0 +1,30 @@
+# conftest.py
+"""An app on a fresh SQLite database per test, and clients logged in as a given user."""
+import pytest
+
+from app import create_app
+from database import db
+from utils import response_cache
+from utils.cache import FileCache
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("METRICS_DIR", str(tmp_path / "metrics"))
+    # the page cache is keyed by table versions, which every fresh database starts at again
+    monkeypatch.setattr(response_cache, "_cache", FileCache(str(tmp_path / "pages")))
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}"})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def login(app):
+    def login(designation, position):
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s["user_id"], s["designation"], s["position"] = f"{designation} {position}".lower(), designation, position
+        return client
+    return login
@@ -0,0 +1,33 @@
+# test_exports.py
+"""Table exports: CSV always streams, XLSX streams only up to the inline limit."""
+import io
+
+from openpyxl import load_workbook
+
+from blueprints import main
+from database import db
+from models import RawMaterial
+
+
+def _materials(n):
+    db.session.add_all(RawMaterial(material_code=f"RM{i}", material_name=f"Material {i}", lot_no=f"L{i}", vendor="Acme")
+                       for i in range(n))
+    db.session.commit()
+
+
+def test_small_xlsx_export_streams(app, login):
+    _materials(3)
+    r = login("QC", "Officer").get("/export/raw_material.xlsx")
+    assert r.status_code == 200
+    ws = load_workbook(io.BytesIO(r.data), read_only=True)["raw_material"]
+    assert [row[1] for row in ws.iter_rows(min_row=2, values_only=True)] == ["RM0", "RM1", "RM2"]
+
+
+def test_large_xlsx_export_goes_to_the_background_job(app, login, monkeypatch):
+    monkeypatch.setattr(main, "XLSX_INLINE_MAX_ROWS", 2)
+    _materials(3)
+    client = login("QC", "Officer")
+    r = client.get("/export/raw_material.xlsx")
+    assert r.status_code == 302 and r.location.endswith("/reports")
+    assert "in the background" in client.get("/reports").get_data(as_text=True)
+    assert client.get("/export/raw_material.csv").data.count(b"\n") == 4
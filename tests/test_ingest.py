@@ -0,0 +1,52 @@
+# test_ingest.py
+"""Batch receiving: mixed optional fields in one chunk, and re-posted rows found as duplicates."""
+import json
+
+from database import db
+from models import RawMaterial, StockBalance, WarehouseMaterial
+
+
+def _post(client, url, rows):
+    body = "\n".join(json.dumps(r) for r in rows)
+    return client.post(url, data=body, content_type="application/x-ndjson")
+
+
+def test_raw_materials_mixed_optional_fields(login):
+    client = login("QC", "Officer")
+    rows = [
+        {"material_code": "RM9", "material_name": "X", "lot_no": "L1", "vendor": "V", "received_qty": 5, "unit": "kg"},
+        {"material_code": "RM9", "material_name": "X", "lot_no": "L2"},
+        {"material_code": "RM9", "material_name": "X", "lot_no": "L3", "unit": "g"},
+    ]
+    r = _post(client, "/api/v1/qc/materials", rows)
+    assert r.status_code == 200, r.data
+    assert r.json["inserted"] == 3
+    lots = {m.lot_no: m for m in RawMaterial.query.filter_by(material_code="RM9")}
+    assert (lots["L1"].vendor, lots["L1"].unit) == ("V", "kg")
+    assert (lots["L2"].vendor, lots["L2"].received_qty, lots["L2"].unit) == (None, None, None)
+    assert lots["L3"].unit == "g"
+
+    r = _post(client, "/api/v1/qc/materials", rows)
+    assert (r.json["inserted"], r.json["duplicates"]) == (0, 3)
+
+
+def test_warehouse_materials_mixed_optional_fields(login):
+    client = login("Warehouse", "Officer")
+    base = {"material_code": "WM9", "material_name": "X", "supplier_name": "S", "quantity_received": 10, "unit": "kg"}
+    rows = [
+        {**base, "lot_no": "A", "expiry_date": "2027-01-31"},
+        {**base, "lot_no": "B"},
+        {**base},  # no lot number
+    ]
+    r = _post(client, "/api/v1/warehouse/materials", rows)
+    assert r.status_code == 200, r.data
+    assert r.json["inserted"] == 3
+    lots = {m.lot_no: m for m in WarehouseMaterial.query.filter_by(material_code="WM9")}
+    assert lots["A"].expiry_date.date().isoformat() == "2027-01-31"
+    assert lots["B"].expiry_date is None and lots[None].expiry_date is None
+    assert all(db.session.get(StockBalance, m.id).quantity == 10 for m in lots.values())
+
+    # re-posting, the lot-less row included, receives nothing twice
+    r = _post(client, "/api/v1/warehouse/materials", rows)
+    assert (r.json["inserted"], r.json["duplicates"]) == (0, 3)
+    assert WarehouseMaterial.query.filter_by(material_code="WM9").count() == 3
@@ -0,0 +1,94 @@
+# test_lot_allocation.py
+"""FEFO/FIFO issues across released lots: order, splitting, units, shortages and hand-picked lots."""
+from datetime import date, timedelta
+
+import pytest
+
+from database import db
+from models import StockBalance, WarehouseMaterial
+from utils import lot_allocation
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    # one index per process; each test has a database of its own
+    monkeypatch.setattr(lot_allocation, "lot_index", lot_allocation.LotIndex())
+
+
+@pytest.fixture
+def warehouse(login):
+    return login("Warehouse", "Manager")
+
+
+@pytest.fixture
+def lots(warehouse, login):
+    """Receive lots of APIX as {lot_no: (days to expiry or None, quantity, unit, released)}; returns {lot_no: id}."""
+    qa = login("QA", "Manager")
+
+    def receive(spec):
+        for lot_no, (days, quantity, unit, released) in spec.items():
+            expiry = (date.today() + timedelta(days=days)).isoformat() if days is not None else ""
+            r = warehouse.post("/warehouse/add", data={
+                "material_name": "API X", "material_code": "APIX", "supplier_name": "Acme", "lot_no": lot_no,
+                "quantity_received": str(quantity), "unit": unit, "expiry_date": expiry})
+            assert r.status_code == 302, r.data
+        ids = {m.lot_no: m.id for m in WarehouseMaterial.query.filter_by(material_code="APIX")}
+        for lot_no, (*_, released) in spec.items():
+            if released:
+                assert qa.post("/qa/release", data={"material_id": ids[lot_no], "decision": "release"}).status_code == 302
+        return ids
+    return receive
+
+
+def _allocate(client, quantity, **extra):
+    return client.post("/api/v1/warehouse/allocations",
+                       json={"material_code": "APIX", "quantity": quantity, "issued_to": "Production", **extra})
+
+
+def _on_hand(lot_id):
+    return db.session.get(StockBalance, lot_id).quantity
+
+
+def test_fefo_splits_across_lots_and_skips_expired_and_held(warehouse, lots):
+    ids = lots({"LATE": (90, 100, "kg", True), "SOON": (10, 30, "kg", True), "EXPIRED": (-1, 100, "kg", True),
+                "MID": (40, 50, "kg", True), "HELD": (5, 100, "kg", False)})
+    r = _allocate(warehouse, 50, batch_no="B-1")
+    assert r.status_code == 201, r.data
+    assert [(i["material_id"], i["issued_quantity"]) for i in r.json["issues"]] == [(ids["SOON"], 30), (ids["MID"], 20)]
+    assert (_on_hand(ids["SOON"]), _on_hand(ids["MID"]), _on_hand(ids["EXPIRED"]), _on_hand(ids["HELD"])) == (0, 30, 100, 100)
+
+
+def test_fifo_takes_the_oldest_receipt(warehouse, lots):
+    ids = lots({"FIRST": (90, 100, "kg", True), "SECOND": (10, 100, "kg", True)})
+    r = _allocate(warehouse, 40, policy="FIFO")
+    assert [i["material_id"] for i in r.json["issues"]] == [ids["FIRST"]]
+
+
+def test_shortage_is_409_and_issues_nothing(warehouse, lots):
+    ids = lots({"A": (30, 10, "kg", True)})
+    r = _allocate(warehouse, 11)
+    assert r.status_code == 409
+    assert r.json["error"] == "Only 10 kg of APIX is released and in date; 11 kg requested."
+    assert _on_hand(ids["A"]) == 10
+
+
+def test_a_plan_never_mixes_units(warehouse, lots):
+    ids = lots({"KG": (10, 5, "kg", True), "G": (20, 3000, "g", True)})
+    assert _allocate(warehouse, 8).status_code == 409  # 5 kg + 3000 g is not 8 of anything
+    r = _allocate(warehouse, 8, unit="g")
+    assert r.status_code == 201
+    assert [(i["material_id"], i["unit"]) for i in r.json["issues"]] == [(ids["G"], "g")]
+    assert (_on_hand(ids["KG"]), _on_hand(ids["G"])) == (5, 2992)
+
+
+def test_index_follows_stock_changed_elsewhere(warehouse, lots):
+    ids = lots({"A": (10, 5, "kg", True), "B": (20, 50, "kg", True)})
+    assert _allocate(warehouse, 5).json["issues"][0]["material_id"] == ids["A"]
+    warehouse.post("/warehouse/adjust", data={"material_id": ids["A"], "quantity": "7", "remarks": "recount"})
+    assert _allocate(warehouse, 3).json["issues"][0]["material_id"] == ids["A"]
+
+
+def test_hand_picked_issue_needs_a_released_lot(warehouse, lots):
+    ids = lots({"HELD": (10, 5, "kg", False)})
+    warehouse.post("/warehouse/issue", data={"material_id": ids["HELD"], "issued_quantity": "2", "issued_to": "P"})
+    assert _on_hand(ids["HELD"]) == 5
@@ -0,0 +1,35 @@
+# test_permissions.py
+"""The QC ladder: Officers record data, specs and COAs need the positions the table grants them to."""
+import pytest
+
+from database import db
+from models import QCSample, RawMaterial, Specification
+from models import TestResult as Result  # a Test* name would be collected as a test class
+
+
+@pytest.fixture
+def sample(app):
+    m = RawMaterial(material_code="RM1", material_name="Material RM1", lot_no="RM1-LOT", vendor="Acme")
+    m.specs = [Specification(parameter="pH", lower_limit=0.0, upper_limit=10.0)]
+    s = QCSample(ar_no="AR-RM1-0001", material=m)
+    s.results = [Result(parameter="pH", result_value=5.0, verdict="Pass")]
+    db.session.add(m)
+    db.session.commit()
+    return s
+
+
+@pytest.mark.parametrize("position, allowed", [
+    ("Officer", False), ("Junior Officer", False), ("Unknown", False),
+    ("Sr. Officer", False), ("Executive", True), ("Sr. Executive", True), ("HOD", True)])
+def test_adding_specs_needs_edit_qc_data(sample, login, position, allowed):
+    r = login("QC", position).post(f"/qc/material/{sample.material_id}/spec/add",
+                                   data={"parameter": "Assay", "lower_limit": "98", "upper_limit": "102"})
+    assert r.status_code == (302 if allowed else 403), r.status_code
+
+
+@pytest.mark.parametrize("position, allowed", [
+    ("Officer", False), ("Junior Officer", False), ("Unknown", False),
+    ("Sr. Officer", True), ("Executive", False), ("Sr. Executive", True), ("HOD", True)])
+def test_generating_a_coa_needs_approve_qc_data(sample, login, position, allowed):
+    r = login("QC", position).post(f"/qc/sample/{sample.id}/generate_coa")
+    assert r.status_code == (302 if allowed else 403), r.status_code
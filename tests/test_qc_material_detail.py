@@ -0,0 +1,45 @@
+# test_qc_material_detail.py
+"""The QC material detail page runs a fixed number of statements however many samples the lot has."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from database import db
+from models import QCSample, RawMaterial, Specification
+from models import TestResult as Result  # a Test* name would be collected as a test class
+
+
+def _material(code, samples):
+    m = RawMaterial(material_code=code, material_name=f"Material {code}", lot_no=f"{code}-LOT", vendor="Acme")
+    m.specs = [Specification(parameter=p, lower_limit=0.0, upper_limit=10.0) for p in ("pH", "Assay", "LOD")]
+    start = datetime(2026, 1, 1)
+    for i in range(samples):
+        s = QCSample(ar_no=f"AR-{code}-{i:04d}", sample_date=start + timedelta(days=i), material=m)
+        s.results = [Result(parameter=p, result_value=5.0, verdict="Pass") for p in ("pH", "Assay", "LOD")]
+    db.session.add(m)
+    db.session.commit()
+    return m.id
+
+
+def _statements(app, client, url):
+    seen = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    return len(seen)
+
+
+def test_detail_query_count_is_constant(app, login):
+    one = _material("RM901", samples=1)
+    many = _material("RM902", samples=40)
+    client = login("QC", "Officer")
+
+    assert _statements(app, client, f"/qc/material/{one}") == _statements(app, client, f"/qc/material/{many}") == 4
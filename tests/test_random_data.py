@@ -0,0 +1,43 @@
+# test_random_data.py
+"""Bulk seeding: a seed reproduces the same lots, and a retried chunk keeps its AR numbers."""
+from sqlalchemy.exc import OperationalError
+
+from models import QCSample, RawMaterial, TestResult
+from utils import random_data_generator
+from utils.random_data_generator import generate_bulk_raw_materials
+
+
+def _lots(ids):
+    lots = RawMaterial.query.filter(RawMaterial.id.in_(ids)).order_by(RawMaterial.id).all()
+    return [(m.material_code, m.lot_no, m.vendor, m.received_qty, m.received_date, m.status,
+             sorted((r.parameter, r.result_value, r.result_text, r.verdict, r.tested_at)
+                    for s in m.samples for r in s.results))
+            for m in lots]
+
+
+def test_same_seed_same_data(app):
+    generate_bulk_raw_materials(20, seed=7, batch_size=8)
+    first = [i for (i,) in RawMaterial.query.with_entities(RawMaterial.id)]
+    generate_bulk_raw_materials(20, seed=7, batch_size=8)
+    second = [i for (i,) in RawMaterial.query.with_entities(RawMaterial.id) if i not in first]
+    assert len(second) == 20
+    assert _lots(first) == _lots(second)
+    assert TestResult.query.count() == 2 * 20 * 4
+
+
+def test_retried_chunk_keeps_its_ar_numbers(app, monkeypatch):
+    real, calls = random_data_generator._build_chunk, []
+
+    def locked_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return real(*args)
+
+    monkeypatch.setattr(random_data_generator, "_build_chunk", locked_once)  # inside the chunk's transaction
+    monkeypatch.setattr(random_data_generator.time, "sleep", lambda s: None)
+    generate_bulk_raw_materials(10, seed=3, batch_size=5)
+
+    assert len(calls) == 3  # two chunks, the first tried twice
+    numbers = sorted(int(ar.rsplit("-", 1)[1]) for (ar,) in QCSample.query.with_entities(QCSample.ar_no))
+    assert numbers == list(range(1, 11))  # a fresh database: no number lost to the failed attempt
@@ -0,0 +1,91 @@
+# test_stock_ledger.py
+"""Receipts, issues and adjustments keep the balance and the append-only ledger in step."""
+import pytest
+
+from database import db
+from models import StockMovement, WarehouseMaterial
+from utils import stock_ledger
+
+
+@pytest.fixture
+def material(app):
+    m = WarehouseMaterial(material_name="API X", material_code="APIX", supplier_name="Acme",
+                          quantity_received=100.0, unit="kg", lot_no="L1")
+    db.session.add(m)
+    db.session.flush()
+    stock_ledger.receive(m, user="tester")
+    db.session.commit()
+    return m
+
+
+def _movements(material_id):
+    return [(mv.movement_type, mv.quantity) for mv in
+            StockMovement.query.filter_by(material_id=material_id).order_by(StockMovement.id)]
+
+
+def test_receipt_opens_the_balance(material):
+    assert stock_ledger.on_hand(material.id) == 100
+    assert _movements(material.id) == [(stock_ledger.RECEIPT, 100)]
+
+
+def test_issue_and_adjust_move_the_balance(material):
+    stock_ledger.issue(material.id, 30, unit="kg", reference="batch:B-1")
+    stock_ledger.adjust(material.id, -5, unit="kg", remarks="spillage")
+    stock_ledger.adjust(material.id, 2.5, unit="kg", remarks="recount")
+    db.session.commit()
+    assert stock_ledger.on_hand(material.id) == 67.5
+    assert _movements(material.id) == [(stock_ledger.RECEIPT, 100), (stock_ledger.ISSUE, -30),
+                                       (stock_ledger.ADJUSTMENT, -5), (stock_ledger.ADJUSTMENT, 2.5)]
+
+
+def test_over_issue_is_refused_and_changes_nothing(material):
+    with pytest.raises(stock_ledger.InsufficientStock):
+        stock_ledger.issue(material.id, 100.01)
+    db.session.rollback()
+    with pytest.raises(stock_ledger.InsufficientStock):
+        stock_ledger.adjust(material.id, -101)
+    db.session.rollback()
+    assert stock_ledger.on_hand(material.id) == 100
+    assert _movements(material.id) == [(stock_ledger.RECEIPT, 100)]
+
+
+def test_zero_and_negative_quantities_are_rejected(material):
+    with pytest.raises(ValueError):
+        stock_ledger.issue(material.id, 0)
+    with pytest.raises(ValueError):
+        stock_ledger.issue(material.id, -1)
+    with pytest.raises(ValueError):
+        stock_ledger.adjust(material.id, 0)
+
+
+def test_movements_are_append_only(material):
+    movement = StockMovement.query.filter_by(material_id=material.id).one()
+    movement.quantity = 1
+    with pytest.raises(RuntimeError):
+        db.session.flush()
+    db.session.rollback()
+    db.session.delete(StockMovement.query.filter_by(material_id=material.id).one())
+    with pytest.raises(RuntimeError):
+        db.session.flush()
+
+
+def test_dispose_records_status_changes_once(material):
+    assert stock_ledger.dispose(material, released=True, user="qa") is not None
+    assert stock_ledger.dispose(material, released=True, user="qa") is None
+    assert stock_ledger.dispose(material, released=False, user="qa") is not None
+    db.session.commit()
+    assert material.status == stock_ledger.REJECTED
+    assert stock_ledger.on_hand(material.id) == 100
+    assert _movements(material.id) == [(stock_ledger.RECEIPT, 100), (stock_ledger.RELEASE, 0), (stock_ledger.REJECT, 0)]
+
+
+def test_adjusting_needs_approve_warehouse_data(material, login):
+    officer, manager = login("Warehouse", "Officer"), login("Warehouse", "Manager")
+    assert "Adjust Stock" not in officer.get("/warehouse").get_data(as_text=True)
+    assert "Adjust Stock" in manager.get("/warehouse").get_data(as_text=True)
+
+    form = {"material_id": material.id, "quantity": "-10", "remarks": "damaged"}
+    assert officer.post("/warehouse/adjust", data=form).status_code == 403
+    assert stock_ledger.on_hand(material.id) == 100
+    assert manager.post("/warehouse/adjust", data=form).status_code == 302
+    assert stock_ledger.on_hand(material.id) == 90
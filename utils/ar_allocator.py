@@ -0,0 +1,95 @@
+# ar_allocator.py
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import Integer, cast, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import ARSequence, QCSample
+
+_seq = ARSequence.__table__
+
+
+def ar_prefix(when=None):
+    """AR numbers run per day: AR-YYYYMMDD-####."""
+    return f"AR-{(when or datetime.utcnow()).strftime('%Y%m%d')}-"
+
+
+def format_ar_no(prefix, number):
+    return f"{prefix}{number:04d}"
+
+
+def _last_issued(conn, prefix):
+    """Highest suffix already used under `prefix`, for days that predate the sequence table."""
+    suffix = cast(func.substr(QCSample.ar_no, len(prefix) + 1), Integer)
+    return conn.execute(
+        select(func.max(suffix)).where(QCSample.ar_no.like(f"{prefix}%"))
+    ).scalar() or 0
+
+
+def reserve_ar_block(count, when=None):
+    """
+    Atomically reserve `count` consecutive AR numbers for the day of `when`.
+    Returns (prefix, first_number).
+
+    Runs in its own short transaction so the reservation is committed
+    independently of the caller: the increment is a single-row UPDATE, so
+    concurrent workers serialise on that row and can never receive the
+    same number. Numbers from a rolled-back caller are simply skipped.
+    """
+    prefix = ar_prefix(when)
+    with db.engine.begin() as conn:
+        bumped = conn.execute(
+            update(_seq).where(_seq.c.prefix == prefix)
+                        .values(last_value=_seq.c.last_value + count)
+        )
+        if bumped.rowcount == 0:
+            # first AR of the day: start after anything issued before this table existed
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(_seq).values(prefix=prefix,
+                                                     last_value=_last_issued(conn, prefix) + count))
+            except IntegrityError:
+                # another worker created the row first; increment theirs
+                conn.execute(
+                    update(_seq).where(_seq.c.prefix == prefix)
+                                .values(last_value=_seq.c.last_value + count)
+                )
+        last = conn.execute(select(_seq.c.last_value).where(_seq.c.prefix == prefix)).scalar()
+    return prefix, last - count + 1
+
+
+class ARAllocator:
+    """
+    Hands out AR numbers, optionally from an in-memory block per process.
+
+    With AR_BLOCK_SIZE = 1 (the default) every number is one database round
+    trip and numbers are handed out in order, but not gap-free: the
+    reservation commits on its own, so a caller that rolls back afterwards
+    burns its number. Larger blocks let a worker serve numbers from memory;
+    numbers left in a block when the worker exits are never used, and
+    numbers from different workers interleave.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}  # prefix -> [next_number, last_number]
+
+    def next_ar_no(self, when=None):
+        block_size = max(int(current_app.config.get("AR_BLOCK_SIZE", 1)), 1)
+        prefix = ar_prefix(when)
+        with self._lock:
+            block = self._blocks.get(prefix)
+            if block is None or block[0] > block[1]:
+                # drop blocks of previous days before reserving for today
+                self._blocks = {}
+                prefix, first = reserve_ar_block(block_size, when)
+                block = self._blocks[prefix] = [first, first + block_size - 1]
+            number = block[0]
+            block[0] += 1
+        return format_ar_no(prefix, number)
+
+
+allocator = ARAllocator()
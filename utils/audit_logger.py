@@ -1,7 +1,158 @@
-from models import AuditLog, db
+# audit_logger.py
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
 from datetime import datetime
 
+from flask import current_app
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import OperationalError
+
+from database import db
+from models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.2      # seconds a partial batch may wait
+WRITE_ATTEMPTS = 10
+GENESIS_HASH = "0" * 64
+PG_CHAIN_LOCK = 0x41554454  # advisory lock key serialising chain appends on PostgreSQL
+
+_audit = AuditLog.__table__
+
+
+def entry_hash(prev_hash, user_id, action, timestamp):
+    payload = "|".join([prev_hash, user_id or "", action or "", timestamp.isoformat()])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AuditWriter:
+    """
+    Background thread that group-commits audit rows.
+
+    Requests only put (user_id, action, timestamp) on a bounded queue; the
+    thread drains it in batches and writes each batch in one transaction,
+    reading the chain tail and appending inside that transaction so several
+    workers still build a single chain. If the queue is ever full the
+    entry is written synchronously rather than dropped.
+    """
+
+    def __init__(self, app, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE, interval=FLUSH_INTERVAL):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.pid = os.getpid()
+        self._stopping = threading.Event()
+        self._write_lock = threading.Lock()  # the thread and a full-queue fallback never interleave
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id, action, timestamp):
+        entry = (user_id, action, timestamp)
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self._write([entry])
+
+    def _run(self):
+        while not (self._stopping.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("audit writer lost %d entries", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch):
+        with self._write_lock, self.app.app_context():
+            engine = db.engine
+            for attempt in range(WRITE_ATTEMPTS):
+                try:
+                    with engine.begin() as conn:
+                        # take the write lock before reading the tail so appends serialise
+                        if engine.dialect.name == "sqlite":
+                            conn.exec_driver_sql("BEGIN IMMEDIATE")
+                        elif engine.dialect.name == "postgresql":
+                            conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PG_CHAIN_LOCK})
+                        prev = conn.execute(
+                            select(_audit.c.entry_hash).order_by(_audit.c.id.desc()).limit(1)
+                        ).scalar() or GENESIS_HASH
+                        rows = []
+                        for user_id, action, ts in batch:
+                            h = entry_hash(prev, user_id, action, ts)
+                            rows.append({"user_id": user_id, "action": action, "timestamp": ts,
+                                         "prev_hash": prev, "entry_hash": h})
+                            prev = h
+                        conn.execute(insert(_audit), rows)
+                    return
+                except OperationalError:
+                    # SQLite: another worker held the write lock too long ("database is locked")
+                    if attempt == WRITE_ATTEMPTS - 1:
+                        raise
+                    time.sleep(0.01 * (attempt + 1))
+
+    def flush(self):
+        """Block until everything queued so far is committed."""
+        self.queue.join()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    # a forked worker (gunicorn --preload) must not reuse the parent's thread
+    if _writer is None or _writer.pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = AuditWriter(current_app._get_current_object())
+                atexit.register(_writer.stop)
+    return _writer
+
+
 def log_action(user_id, action):
-    log = AuditLog(user_id=user_id, action=action, timestamp=datetime.utcnow())
-    db.session.add(log)
-    db.session.commit()
+    """Queue an audit entry; returns immediately, the row is committed in the background."""
+    get_writer().submit(user_id, action[:255], datetime.utcnow())
+
+
+def flush():
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.flush()
+
+
+def verify_chain(yield_per=5000):
+    """
+    Recompute the hash chain. Returns (entries_checked, first_bad_id); first_bad_id
+    is None when every row matches its hash and links to the one before it.
+    """
+    prev = GENESIS_HASH
+    checked = 0
+    stmt = select(_audit).order_by(_audit.c.id).execution_options(yield_per=yield_per)
+    for row in db.session.execute(stmt):
+        checked += 1
+        if row.prev_hash != prev or row.entry_hash != entry_hash(prev, row.user_id, row.action, row.timestamp):
+            return checked, row.id
+        prev = row.entry_hash
+    return checked, None
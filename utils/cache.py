@@ -0,0 +1,50 @@
+# cache.py
+import glob
+import os
+import tempfile
+
+
+class FileCache:
+    """
+    Tiny byte cache on the local filesystem.
+
+    Every gunicorn worker on the host sees the same directory, so an entry
+    written (or deleted) by one worker is immediately visible to the others.
+    Writes go through a temp file + os.replace so readers never see a
+    partial entry.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def delete_prefix(self, prefix, keep=None):
+        """Delete every entry whose key starts with `prefix`, except those starting with `keep`."""
+        for path in glob.glob(self._path(glob.escape(prefix)) + "*"):
+            if keep and os.path.basename(path).startswith(keep):
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
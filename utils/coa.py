@@ -0,0 +1,142 @@
+# coa.py
+import hashlib
+import io
+import os
+from xml.sax.saxutils import escape
+
+from flask import current_app, render_template
+from sqlalchemy import case, func
+
+from database import db
+from models import QCSample, Specification, TestResult
+from utils.cache import FileCache
+
+_cache = None
+
+
+def coa_cache():
+    global _cache
+    if _cache is None:
+        _cache = FileCache(os.path.join(current_app.instance_path, "cache", "coa"))
+    return _cache
+
+
+def result_summary(sample_id):
+    """(total, passed, last_result_id) for a sample's results in one aggregate query."""
+    total, passed, last_id = db.session.query(
+        func.count(TestResult.id),
+        func.coalesce(func.sum(case((TestResult.verdict == "Pass", 1), else_=0)), 0),
+        func.max(TestResult.id),
+    ).filter(TestResult.sample_id == sample_id).one()
+    return total, passed, last_id
+
+
+def overall_verdict(sample_id):
+    """"Pass" when every result passed, "Fail" otherwise; None without results."""
+    total, passed, _ = result_summary(sample_id)
+    if not total:
+        return None
+    return "Pass" if passed == total else "Fail"
+
+
+def coa_fingerprint(sample):
+    """
+    Content hash of everything a rendered COA depends on, computed without
+    loading the results: their count / pass count / last id, the material's
+    spec version and the COA row itself.
+    """
+    total, passed, last_id = result_summary(sample.id)
+    coa = sample.coa
+    m = sample.material
+    parts = (
+        sample.id, sample.ar_no, total, passed, last_id, m.id, m.spec_version,
+        coa.overall_verdict if coa else None, coa.generated_at.isoformat() if coa else None,
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def _context(sample):
+    m = sample.material
+    specs = Specification.query.filter_by(material_id=m.id).all()
+    results = TestResult.query.filter_by(sample_id=sample.id).all()
+    return dict(m=m, s=sample, specs=specs, results=results, coa=sample.coa)
+
+
+def _spec_text(specs, parameter):
+    parts = []
+    for sp in specs:
+        if sp.parameter != parameter:
+            continue
+        if sp.textual_limit:
+            parts.append(sp.textual_limit)
+        else:
+            lo = "" if sp.lower_limit is None else sp.lower_limit
+            hi = "" if sp.upper_limit is None else sp.upper_limit
+            parts.append(f"{lo} – {hi} {sp.unit or ''}".strip())
+    return "; ".join(parts)
+
+
+def _render_pdf(ctx):
+    # reportlab is only needed here, so keep it off the import path of the app
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    m, s, coa = ctx["m"], ctx["s"], ctx["coa"]
+    styles = getSampleStyleSheet()
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=A4, title=f"COA - {s.ar_no}")
+
+    rows = [["Parameter", "Specification", "Result", "Verdict"]]
+    for r in ctx["results"]:
+        result = r.result_text if r.result_text else f"{r.result_value} {r.unit or ''}".strip()
+        rows.append([r.parameter, _spec_text(ctx["specs"], r.parameter), result, r.verdict])
+    table = Table(rows, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ]))
+
+    story = [
+        Paragraph("Certificate of Analysis", styles["Title"]),
+        Paragraph(f"<b>AR No:</b> {escape(s.ar_no)}", styles["Normal"]),
+        Paragraph(f"<b>Material:</b> {escape(m.material_code)} - {escape(m.material_name)}", styles["Normal"]),
+        Paragraph(f"<b>Lot:</b> {escape(m.lot_no)} | <b>Vendor:</b> {escape(m.vendor or '')}", styles["Normal"]),
+        Paragraph(f"<b>Sampled on:</b> {s.sample_date.strftime('%Y-%m-%d %H:%M')}", styles["Normal"]),
+        Spacer(1, 12),
+        table,
+        Spacer(1, 12),
+        Paragraph(f"<b>Overall Verdict:</b> {coa.overall_verdict}", styles["Heading3"]),
+        Paragraph(f"Generated at: {coa.generated_at.strftime('%Y-%m-%d %H:%M')}", styles["Normal"]),
+    ]
+    doc.build(story)
+    return buf.getvalue()
+
+
+def rendered_coa(sample, fmt, fingerprint):
+    """Rendered COA bytes ("html" or "pdf"), served from the cache when the content is unchanged."""
+    key = f"{sample.id}-{fingerprint}.{fmt}"
+    cache = coa_cache()
+    data = cache.get(key)
+    if data is None:
+        ctx = _context(sample)
+        if fmt == "pdf":
+            data = _render_pdf(ctx)
+        else:
+            data = render_template("qc_coa.html", **ctx).encode("utf-8")
+        cache.delete_prefix(f"{sample.id}-", keep=f"{sample.id}-{fingerprint}.")  # stale versions
+        cache.set(key, data)
+    return data
+
+
+def invalidate_coa(*sample_ids):
+    cache = coa_cache()
+    for sid in sample_ids:
+        cache.delete_prefix(f"{sid}-")
+
+
+def invalidate_material_coas(material_id):
+    ids = [sid for (sid,) in db.session.query(QCSample.id).filter(QCSample.material_id == material_id)]
+    invalidate_coa(*ids)
@@ -0,0 +1,101 @@
+# exporter.py
+import csv
+import io
+import tempfile
+from datetime import date, datetime
+
+from sqlalchemy import func, select
+
+from database import db
+from models import (COA, QCSample, RawMaterial, StockMovement, TestResult, WarehouseDispatch,
+                    WarehouseIssue, WarehouseMaterial)
+
+EXPORT_TABLES = {
+    m.__table__.name: m.__table__
+    for m in (RawMaterial, QCSample, TestResult, COA,
+              WarehouseMaterial, WarehouseIssue, WarehouseDispatch, StockMovement)
+}
+
+YIELD_PER = 2000
+CSV_FLUSH_BYTES = 64 * 1024
+XLSX_MAX_ROWS = 1_048_575  # Excel's sheet limit minus the header row
+FILE_CHUNK_BYTES = 256 * 1024
+XLSX_INLINE_MAX_ROWS = 50_000  # larger XLSX exports only run as a background job
+
+
+def iter_rows(table, yield_per=YIELD_PER):
+    """
+    Every row of `table` in primary-key order, fetched `yield_per` at a time
+    (a server-side cursor on PostgreSQL), so memory stays flat however big
+    the table is.
+    """
+    stmt = select(table).order_by(*table.primary_key.columns)
+    yield from db.session.execute(stmt.execution_options(yield_per=yield_per))
+
+
+def row_count(table):
+    return db.session.execute(select(func.count()).select_from(table)).scalar()
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+def csv_chunks(table):
+    """Generator of CSV text chunks: the header first, then roughly 64 KB at a time."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(table.columns.keys())
+    for row in iter_rows(table):
+        writer.writerow([_cell(v) for v in row])
+        if buf.tell() >= CSV_FLUSH_BYTES:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def write_xlsx(table, fileobj):
+    """
+    Write `table` as XLSX with openpyxl's write-only workbook, which streams
+    rows to disk instead of building the sheet in memory. Tables larger than
+    one Excel sheet continue on further sheets.
+    """
+    from openpyxl import Workbook  # only the XLSX export needs it
+
+    wb = Workbook(write_only=True)
+    header = table.columns.keys()
+    ws = None
+    rows_in_sheet = XLSX_MAX_ROWS
+    sheet_no = 0
+    for row in iter_rows(table):
+        if rows_in_sheet >= XLSX_MAX_ROWS:
+            sheet_no += 1
+            ws = wb.create_sheet(table.name if sheet_no == 1 else f"{table.name}_{sheet_no}")
+            ws.append(header)
+            rows_in_sheet = 0
+        ws.append(list(row))
+        rows_in_sheet += 1
+    if ws is None:
+        wb.create_sheet(table.name).append(header)
+    wb.save(fileobj)
+
+
+def xlsx_chunks(table):
+    """
+    Generator of XLSX bytes. A zip container can only be finished once all
+    rows are written, so the workbook is built in a temporary file first and
+    then streamed out in chunks: nothing reaches the client until the whole
+    table has been read. The export route therefore only uses it for tables
+    up to XLSX_INLINE_MAX_ROWS; larger ones go through the export job.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        write_xlsx(table, tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(FILE_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,208 @@
+# genealogy.py
+"""
+Batch genealogy: which warehouse lots went into which production batches,
+and which customers those batches were dispatched to.
+
+The write paths record the graph as they go, in their own transaction:
+an issue links the lot it drew from to the issue and, when it names a
+batch, the issue to that batch; a batch made from intermediate batches
+links each of them to it; a dispatch links its batch to the dispatch.
+Next to the edges, a closure table holds one row per (ancestor,
+descendant) pair with the length of the shortest path between them,
+extended as each edge is added. A trace in either direction is then two
+indexed queries however many stages deep the genealogy goes: the start
+node's closure rows joined to their nodes, and the edges among them.
+"""
+from datetime import datetime
+
+from sqlalchemy import String, cast, delete, exists, func, insert, literal, select, text, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db
+from models import GenealogyClosure, GenealogyEdge, GenealogyNode, WarehouseDispatch, WarehouseIssue, WarehouseMaterial
+
+LOT, ISSUE, BATCH, DISPATCH = "lot", "issue", "batch", "dispatch"
+KINDS = (LOT, ISSUE, BATCH, DISPATCH)
+DIRECTIONS = ("forward", "backward")
+PG_GENEALOGY_LOCK = 0x47454E45  # advisory lock key serialising closure maintenance on PostgreSQL
+
+_node = GenealogyNode.__table__
+_edge = GenealogyEdge.__table__
+_closure = GenealogyClosure.__table__
+
+
+class GenealogyCycle(ValueError):
+    """The link would make a node its own ancestor (e.g. a batch made from itself)."""
+
+
+def _lock():
+    # two transactions adding A -> B and B -> C at once would each miss the
+    # other's closure rows. On SQLite the caller's own write before this
+    # already holds the database write lock.
+    if db.session.get_bind().dialect.name == "postgresql":
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PG_GENEALOGY_LOCK})
+
+
+# ------------------ Graph ------------------
+
+def node(kind, ref, label=None):
+    """Id of the (kind, ref) node, created with its depth-0 closure row when missing."""
+    ref = str(ref)
+    label = label[:200] if label else None
+    node_id = db.session.execute(select(_node.c.id).where(_node.c.kind == kind, _node.c.ref == ref)).scalar()
+    if node_id is None:
+        node_id = db.session.execute(insert(_node).returning(_node.c.id), {
+            "kind": kind, "ref": ref, "label": label, "created_at": datetime.utcnow()}).scalar()
+        db.session.execute(insert(_closure), {"ancestor_id": node_id, "descendant_id": node_id, "depth": 0})
+    elif label:
+        # a batch is often seen first by number only; its dispatch names the product
+        db.session.execute(update(_node).where(_node.c.id == node_id, _node.c.label.is_(None)).values(label=label))
+    return node_id
+
+
+def _merge_paths(paths):
+    """Insert (ancestor_id, descendant_id, depth) rows from `paths`, keeping the shorter depth on a clash."""
+    dialect = db.session.get_bind().dialect.name
+    insert_ = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(dialect)
+    if insert_ is not None:
+        stmt = insert_(_closure).from_select(["ancestor_id", "descendant_id", "depth"], paths)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=["ancestor_id", "descendant_id"],
+            set_={"depth": stmt.excluded.depth},
+            where=stmt.excluded.depth < _closure.c.depth,
+        ))
+        return
+    # generic fallback: one statement per pair
+    for ancestor_id, descendant_id, depth in db.session.execute(paths).all():
+        where = [_closure.c.ancestor_id == ancestor_id, _closure.c.descendant_id == descendant_id]
+        known = db.session.execute(select(_closure.c.depth).where(*where)).scalar()
+        if known is None:
+            db.session.execute(insert(_closure), {"ancestor_id": ancestor_id, "descendant_id": descendant_id,
+                                                  "depth": depth})
+        elif depth < known:
+            db.session.execute(update(_closure).where(*where).values(depth=depth))
+
+
+def link(parent_id, child_id, quantity=None, unit=None, user=None):
+    """
+    Add the edge parent -> child. Every ancestor of the parent (itself
+    included) now reaches every descendant of the child, so the new closure
+    rows are one INSERT ... SELECT over the two sides. Returns False when
+    the edge already exists; raises GenealogyCycle if it would close a loop.
+    """
+    if db.session.execute(select(exists().where(
+            _closure.c.ancestor_id == child_id, _closure.c.descendant_id == parent_id))).scalar():
+        raise GenealogyCycle("That link would make a batch part of its own genealogy.")
+    if db.session.execute(select(exists().where(
+            _edge.c.parent_id == parent_id, _edge.c.child_id == child_id))).scalar():
+        return False
+    db.session.execute(insert(_edge), {"parent_id": parent_id, "child_id": child_id, "quantity": quantity,
+                                       "unit": unit, "created_by": user, "created_at": datetime.utcnow()})
+    up, down = _closure.alias("up"), _closure.alias("down")
+    _merge_paths(select(up.c.ancestor_id, down.c.descendant_id, up.c.depth + down.c.depth + 1)
+                 .select_from(up.join(down, true()))
+                 .where(up.c.descendant_id == parent_id, down.c.ancestor_id == child_id))
+    return True
+
+
+# ------------------ Write paths ------------------
+# Called after the business row is flushed, inside the caller's transaction.
+
+def record_issue(issue, material, user=None):
+    """lot -> issue, and issue -> batch when the issue names one."""
+    _lock()
+    lot = node(LOT, material.id, f"{material.material_code} · {material.material_name} ({material.supplier_name})")
+    issued = node(ISSUE, issue.id, f"{issue.issued_to} ({issue.issued_quantity:g} {issue.unit})")
+    link(lot, issued, issue.issued_quantity, issue.unit, user)
+    if issue.batch_no:
+        link(issued, node(BATCH, issue.batch_no), issue.issued_quantity, issue.unit, user)
+
+
+def record_batch(batch_no, inputs=(), user=None):
+    """A production batch, and input batch -> batch for the intermediates it was made from."""
+    _lock()
+    batch = node(BATCH, batch_no)
+    for input_no in inputs:
+        link(node(BATCH, input_no), batch, user=user)
+
+
+def record_dispatch(dispatch, user=None):
+    """batch -> dispatch."""
+    _lock()
+    link(node(BATCH, dispatch.batch_no, dispatch.product_name),
+         node(DISPATCH, dispatch.id,
+              f"{dispatch.customer_name} ({dispatch.quantity_dispatched:g} {dispatch.unit})"),
+         dispatch.quantity_dispatched, dispatch.unit, user)
+
+
+# ------------------ Traces ------------------
+
+def trace(kind, ref, direction="forward"):
+    """
+    Every node downstream (forward: where it went) or upstream (backward:
+    what it was made from) of the (kind, ref) node, nearest first, and the
+    edges between them. Two queries whatever the depth; None for an
+    unknown node.
+    """
+    near, far = ((_closure.c.ancestor_id, _closure.c.descendant_id) if direction == "forward"
+                 else (_closure.c.descendant_id, _closure.c.ancestor_id))
+    start = _node.alias("start")
+    rows = db.session.execute(
+        select(_node.c.id, _node.c.kind, _node.c.ref, _node.c.label, _closure.c.depth)
+        .select_from(start.join(_closure, near == start.c.id).join(_node, _node.c.id == far))
+        .where(start.c.kind == kind, start.c.ref == str(ref))
+        .order_by(_closure.c.depth, _node.c.kind, _node.c.id)
+    ).all()
+    if not rows:
+        return None
+    nodes = [dict(r._mapping) for r in rows]
+    # forward, every edge leaving a reached node stays inside the set; backward, every edge entering one
+    end = _edge.c.parent_id if direction == "forward" else _edge.c.child_id
+    reached = select(far).where(near == nodes[0]["id"])
+    edges = db.session.execute(
+        select(_edge.c.parent_id, _edge.c.child_id, _edge.c.quantity, _edge.c.unit).where(end.in_(reached))
+    ).all()
+    return {
+        "start": nodes[0],
+        "direction": direction,
+        "nodes": nodes[1:],
+        "edges": [{"parent": e.parent_id, "child": e.child_id, "quantity": e.quantity, "unit": e.unit}
+                  for e in edges],
+    }
+
+
+# ------------------ Maintenance ------------------
+
+def rebuild_genealogy(user=None):
+    """
+    Record the issues and dispatches made before the genealogy existed,
+    then recompute the closure table from the edges with one recursive
+    query. Returns (issues recorded, dispatches recorded, closure rows).
+    """
+    def unrecorded(model, kind):
+        return ~exists().where(_node.c.kind == kind, _node.c.ref == cast(model.id, String))
+
+    issues = db.session.execute(
+        select(WarehouseIssue, WarehouseMaterial).join(WarehouseMaterial, WarehouseMaterial.id == WarehouseIssue.material_id)
+        .where(unrecorded(WarehouseIssue, ISSUE)).order_by(WarehouseIssue.id)).all()
+    for issue, material in issues:
+        record_issue(issue, material, user)
+    dispatches = db.session.execute(
+        select(WarehouseDispatch).where(unrecorded(WarehouseDispatch, DISPATCH)).order_by(WarehouseDispatch.id)
+    ).scalars().all()
+    for dispatch in dispatches:
+        record_dispatch(dispatch, user)
+
+    db.session.execute(delete(_closure))
+    walk = select(_node.c.id.label("ancestor_id"), _node.c.id.label("descendant_id"), literal(0).label("depth")) \
+        .cte("walk", recursive=True)
+    walk = walk.union(
+        select(walk.c.ancestor_id, _edge.c.child_id, walk.c.depth + 1)
+        .join(_edge, _edge.c.parent_id == walk.c.descendant_id))
+    db.session.execute(insert(_closure).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(walk.c.ancestor_id, walk.c.descendant_id, func.min(walk.c.depth))
+        .group_by(walk.c.ancestor_id, walk.c.descendant_id)))
+    closure_rows = db.session.execute(select(func.count()).select_from(_closure)).scalar()
+    db.session.commit()
+    return len(issues), len(dispatches), closure_rows
@@ -0,0 +1,317 @@
+# ingest.py
+"""
+Batch receiving of raw material lots and warehouse materials from the ERP.
+
+A request body is NDJSON (one object per line, streamed) or a JSON array.
+Rows are checked against a schema compiled once from the model's columns
+(types, lengths, required fields), then written INGEST_CHUNK_SIZE at a
+time: one query finds the rows that already exist, one multi-row INSERT
+... RETURNING adds the rest, and the side tables (report rollups, stock
+ledger) are written set-based in the same transaction. The dedupe read
+and the insert run under the write lock (SQLite) or an advisory lock
+(PostgreSQL), so two batches carrying the same row can't both insert it.
+Every input row gets a status: inserted (with its id), duplicate (with
+the existing id) or rejected (with the reasons).
+"""
+import json
+import math
+import time
+from datetime import datetime
+
+from flask import request, session
+from sqlalchemy import func, insert, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import RawMaterial, WarehouseMaterial
+from utils import stock_ledger
+from utils.audit_logger import log_action
+from utils.reports import RollupDelta
+
+INGEST_CHUNK_SIZE = 500
+INGEST_MAX_ROWS = 50000      # per request; rows past it are rejected, not written
+PG_INGEST_LOCK = 0x494E4753  # advisory lock key serialising dedupe + insert on PostgreSQL
+
+
+class IngestError(ValueError):
+    """The body as a whole is unusable (not JSON, not a list of rows)."""
+
+
+# ------------------ Schema ------------------
+
+def _as_str(v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        v = str(v)  # ERP systems like to send numeric codes as numbers
+    if not isinstance(v, str):
+        raise ValueError("must be a string")
+    return v.strip() or None
+
+
+def _as_float(v):
+    if isinstance(v, bool):
+        raise ValueError("must be a number")
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        raise ValueError("must be a number") from None
+    if not math.isfinite(v) or v < 0:
+        raise ValueError("must be a non-negative number")
+    return v
+
+
+def _as_datetime(v):
+    if not isinstance(v, str):
+        raise ValueError("must be an ISO date or datetime string")
+    try:
+        return datetime.fromisoformat(v.strip().replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError("must be an ISO date or datetime string") from None
+
+
+_COERCE = {str: _as_str, float: _as_float, datetime: _as_datetime}
+
+
+class Schema:
+    """
+    A row validator compiled once from `model`'s columns: the coercion for
+    each field's Python type, its length limit and whether it is required.
+    """
+
+    def __init__(self, model, required, optional=()):
+        self.fields = []  # (name, coerce, required, max_length)
+        for name in (*required, *optional):
+            col = model.__table__.c[name]
+            self.fields.append((name, _COERCE[col.type.python_type], name in required,
+                                getattr(col.type, "length", None)))
+        self.allowed = frozenset(f[0] for f in self.fields)
+
+    def validate(self, obj):
+        """Returns (row, None) or (None, {field: reason})."""
+        if not isinstance(obj, dict):
+            return None, {"_": "row must be a JSON object"}
+        errors = {k: "unknown field" for k in obj if k not in self.allowed}
+        row = {}
+        for name, coerce, required, max_length in self.fields:
+            value = obj.get(name)
+            if value is not None:
+                try:
+                    value = coerce(value)
+                except ValueError as e:
+                    errors[name] = str(e)
+                    continue
+            if value is None:
+                if required:
+                    errors[name] = "required"
+                continue
+            if max_length and isinstance(value, str) and len(value) > max_length:
+                errors[name] = f"longer than {max_length} characters"
+                continue
+            row[name] = value
+        return (None, errors) if errors else (row, None)
+
+
+# ------------------ Targets ------------------
+
+class Target:
+    def __init__(self, model, schema, key, defaults, after_insert):
+        self.model = model
+        self.table = model.__table__
+        self.schema = schema
+        self.key = key                    # natural key used to find duplicates
+        # one executemany INSERT takes the same columns from every row: fields a row leaves out are NULL
+        self.blank = {name: None for name, *_ in schema.fields}
+        self.defaults = defaults          # () -> extra column values per row
+        self.after_insert = after_insert  # (conn, [(id, row)], user) -> None
+
+
+def _lots_received(conn, inserted, user):
+    delta = RollupDelta()
+    for _, row in inserted:
+        delta.lot_received(row["received_date"], row["material_code"], row.get("vendor"))
+    delta.apply(conn)
+
+
+def _stock_received(conn, inserted, user):
+    stock_ledger.receive_many(conn, [(mid, row["quantity_received"], row["unit"]) for mid, row in inserted],
+                              user=user)
+
+
+TARGETS = {
+    "raw_materials": Target(
+        RawMaterial,
+        Schema(RawMaterial, required=("material_code", "material_name", "lot_no"),
+               optional=("vendor", "received_qty", "unit", "received_date")),
+        key=("material_code", "lot_no"),  # lot_no last: it is the indexed, selective one
+        defaults=lambda: {"status": "Pending Sampling", "spec_version": 0},
+        after_insert=_lots_received,
+    ),
+    "warehouse_materials": Target(
+        WarehouseMaterial,
+        Schema(WarehouseMaterial, required=("material_code", "material_name", "supplier_name",
+                                            "quantity_received", "unit"),
+               optional=("received_date", "lot_no", "expiry_date")),
+        key=("lot_no", "material_code"),  # one row per lot: a code arrives in many; no lot no is a lot of its own
+        defaults=lambda: {"status": "Received"},
+        after_insert=_stock_received,
+    ),
+}
+
+
+# ------------------ Parsing ------------------
+
+def iter_rows(body, content_type):
+    """
+    Yield (row_no, object or None) from an NDJSON stream or a JSON array
+    (bare or as {"rows": [...]}); None marks an NDJSON line that is not JSON.
+    """
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        row_no = 0
+        for line in body:
+            line = line.strip()
+            if not line:
+                continue
+            row_no += 1
+            try:
+                yield row_no, json.loads(line)
+            except ValueError:
+                yield row_no, None
+        return
+    try:
+        data = json.load(body)
+    except ValueError as e:
+        raise IngestError(f"body is not valid JSON: {e}") from None
+    if isinstance(data, dict):
+        data = data.get("rows")
+    if not isinstance(data, list):
+        raise IngestError('expected a JSON array of rows or {"rows": [...]}')
+    yield from enumerate(data, start=1)
+
+
+# ------------------ Writing ------------------
+
+class IngestReport:
+    def __init__(self, target):
+        self.target = target
+        self.rows = []  # per input row: {"row", "status", ...}
+        self.inserted = self.duplicates = self.rejected = 0
+        self.elapsed = 0.0
+
+    def add(self, row_no, status, **info):
+        self.rows.append({"row": row_no, "status": status, **info})
+        if status == "inserted":
+            self.inserted += 1
+        elif status == "duplicate":
+            self.duplicates += 1
+        else:
+            self.rejected += 1
+
+    def summary(self):
+        return (f"{self.target}: {len(self.rows)} rows, {self.inserted} inserted, "
+                f"{self.duplicates} duplicates, {self.rejected} rejected in {self.elapsed:.2f}s")
+
+    def as_dict(self):
+        return {"target": self.target, "received": len(self.rows), "inserted": self.inserted,
+                "duplicates": self.duplicates, "rejected": self.rejected,
+                "elapsed": round(self.elapsed, 3), "rows": sorted(self.rows, key=lambda r: r["row"])}
+
+
+def _lock(conn):
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": PG_INGEST_LOCK})
+
+
+def _key_column(col):
+    # NULL equals nothing, not even NULL: compare optional key columns as '' so such rows are found again
+    return func.coalesce(col, "") if col.nullable else col
+
+
+def _write_chunk(target, chunk, report, user):
+    """Dedupe and insert one chunk of (row_no, row) in a single transaction."""
+    key_cols = [_key_column(target.table.c[k]) for k in target.key]
+    keyed = {}
+    repeated = []  # (row_no, row_no of the first occurrence in this chunk)
+    for row_no, row in chunk:
+        key = tuple("" if row.get(k) is None else row[k] for k in target.key)
+        if key in keyed:
+            repeated.append((row_no, keyed[key][0]))
+        else:
+            keyed[key] = (row_no, row)
+
+    db.session.rollback()  # nothing of ours may hold a read snapshot across the lock
+    with db.engine.begin() as conn:
+        _lock(conn)
+        # the plain IN on the key's last column is what lets SQLite use an index;
+        # it can't search one with a row-value IN alone
+        existing = {tuple(r[:-1]): r[-1] for r in conn.execute(
+            select(*key_cols, target.table.c.id).where(
+                key_cols[-1].in_({key[-1] for key in keyed}), tuple_(*key_cols).in_(list(keyed))))}
+        fresh = [(row_no, row) for key, (row_no, row) in keyed.items() if key not in existing]
+        now = datetime.utcnow()
+        rows = [{**target.blank, **target.defaults(), "received_date": now, **row} for _, row in fresh]
+        ids = []
+        if rows:
+            # executed as multi-row INSERT ... VALUES (...), (...) RETURNING id
+            ids = conn.execute(insert(target.table).returning(target.table.c.id, sort_by_parameter_order=True),
+                               rows).scalars().all()
+            target.after_insert(conn, list(zip(ids, rows)), user)
+
+    for row_no, first in repeated:
+        report.add(row_no, "duplicate", of_row=first)
+    for key, (row_no, _) in keyed.items():
+        if key in existing:
+            report.add(row_no, "duplicate", id=existing[key])
+    for (row_no, _), new_id in zip(fresh, ids):
+        report.add(row_no, "inserted", id=new_id)
+
+
+def ingest(target_name, rows, user=None, chunk_size=INGEST_CHUNK_SIZE):
+    """Validate and write `rows` ((row_no, object) pairs) into a target; returns an IngestReport."""
+    target = TARGETS[target_name]
+    report = IngestReport(target_name)
+    started = time.perf_counter()
+
+    def flush(chunk):
+        for attempt in range(2):
+            try:
+                _write_chunk(target, chunk, report, user)
+                return
+            except IntegrityError:
+                # only reachable without the lock (other dialects): the dedupe
+                # read was stale, and a second pass sees the winner's rows
+                if attempt:
+                    raise
+
+    chunk = []
+    for row_no, obj in rows:
+        if row_no > INGEST_MAX_ROWS:
+            report.add(row_no, "rejected", errors={"_": f"past the {INGEST_MAX_ROWS}-row limit of one request"})
+            continue
+        if obj is None:
+            report.add(row_no, "rejected", errors={"_": "not valid JSON"})
+            continue
+        row, errors = target.schema.validate(obj)
+        if errors:
+            report.add(row_no, "rejected", errors=errors)
+            continue
+        chunk.append((row_no, row))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def ingest_request(target_name):
+    """The view body of a receiving endpoint: ingest the request body, answer with the report or a 400."""
+    # NDJSON is parsed line by line straight off the request stream
+    try:
+        report = ingest(target_name, iter_rows(request.stream, request.mimetype), user=session.get("user_id"))
+    except IngestError as e:
+        return {"error": str(e)}, 400
+    log_action(session.get("user_id"), f"Batch received {report.summary()}")
+    return report.as_dict()
@@ -0,0 +1,307 @@
+# jobs.py
+"""
+Background jobs for operations too slow for a web request: random data
+generation, purges, exports and COA rendering.
+
+The web app only inserts a row into the job table (enqueue) and answers
+with its id; `flask jobs-worker` claims queued jobs with a conditional
+UPDATE, so several workers never run the same job, and runs them in a
+process pool. A running job reports progress into its row, the worker
+heartbeats every job it holds, and a job whose worker died (stale
+heartbeat) or that raised is queued again with backoff until it runs out
+of attempts. Kinds that are not safe to repeat get a single attempt.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+
+from database import db
+from models import Job, QCSample
+from utils.audit_logger import log_action
+
+JOB_PROCESSES = 2
+JOB_POLL_INTERVAL = 1.0       # seconds between queue polls when idle
+JOB_STALE_AFTER = 60          # seconds without a heartbeat before a running job is requeued
+JOB_RETRY_DELAY = 10          # seconds before the first retry; doubled for each further one
+JOB_PROGRESS_INTERVAL = 0.5   # at most this often is progress written to the job row
+
+_job = Job.__table__
+
+
+class JobKind:
+    def __init__(self, name, handler, permission, max_attempts):
+        self.name = name
+        self.handler = handler          # (ctx, **params) -> JSON-serialisable result
+        self.permission = permission    # needed to queue it and to see its status
+        self.max_attempts = max_attempts
+
+
+JOB_KINDS = {}
+
+
+def job_kind(name, permission, max_attempts=3):
+    def register(handler):
+        JOB_KINDS[name] = JobKind(name, handler, permission, max_attempts)
+        return handler
+    return register
+
+
+# ------------------ Queueing ------------------
+
+def enqueue(kind, params=None, user=None):
+    """Queue a job and return its id. With JOBS_RUN_INLINE (no worker, e.g. in development) it runs right away."""
+    with db.engine.begin() as conn:
+        job_id = conn.execute(insert(_job).returning(_job.c.id), {
+            "kind": kind, "params": json.dumps(params or {}), "status": "queued", "attempts": 0,
+            "max_attempts": JOB_KINDS[kind].max_attempts, "run_after": datetime.utcnow(),
+            "progress_done": 0, "created_by": user, "created_at": datetime.utcnow(),
+        }).scalar()
+    if current_app.config.get("JOBS_RUN_INLINE") and _claim(job_id=job_id):
+        run_job(job_id)
+    return job_id
+
+
+def _claim(worker="inline", job_id=None):
+    """Atomically move one due queued job (or `job_id`) to running; returns its id or None."""
+    now = datetime.utcnow()
+    if job_id is None:
+        job_id = select(_job.c.id).where(_job.c.status == "queued", _job.c.run_after <= now) \
+            .order_by(_job.c.id).limit(1).scalar_subquery()
+    with db.engine.begin() as conn:
+        # the status condition makes this a compare-and-set: of two workers
+        # that picked the same id, only one sees a row updated
+        return conn.execute(
+            update(_job).where(_job.c.id == job_id, _job.c.status == "queued")
+            .values(status="running", attempts=_job.c.attempts + 1, worker=worker,
+                    started_at=now, heartbeat_at=now, finished_at=None)
+            .returning(_job.c.id)
+        ).scalar()
+
+
+def _set(job_id, **values):
+    with db.engine.begin() as conn:
+        conn.execute(update(_job).where(_job.c.id == job_id).values(**values))
+
+
+def _failed(job_id, error):
+    """Queue a failed attempt again with backoff, or fail the job once it is out of attempts."""
+    with db.engine.begin() as conn:
+        attempts, max_attempts = conn.execute(
+            select(_job.c.attempts, _job.c.max_attempts).where(_job.c.id == job_id)).one()
+        now = datetime.utcnow()
+        if attempts < max_attempts:
+            values = dict(status="queued", run_after=now + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (attempts - 1)),
+                          message=f"attempt {attempts} of {max_attempts} failed, retrying")
+        else:
+            values = dict(status="failed", finished_at=now, message=f"failed after {attempts} attempt(s)")
+        conn.execute(update(_job).where(_job.c.id == job_id, _job.c.status == "running"),
+                     dict(values, error=error[-4000:], worker=None))
+
+
+# ------------------ Running ------------------
+
+class JobContext:
+    """Handed to a job handler; `progress()` is cheap to call as often as it likes."""
+
+    def __init__(self, job_id, params, user=None):
+        self.job_id = job_id
+        self.params = params
+        self.user = user  # who queued it, for the audit trail
+        self._last = 0.0
+
+    def progress(self, done, total=None, message=None):
+        now = time.monotonic()
+        if now - self._last < JOB_PROGRESS_INTERVAL and (total is None or done < total):
+            return
+        self._last = now
+        values = {"progress_done": done}
+        if total is not None:
+            values["progress_total"] = total
+        if message:
+            values["message"] = message[:255]
+        _set(self.job_id, **values)
+
+
+def run_job(job_id):
+    """Run one claimed job to completion, recording its result or failure."""
+    kind, params, user = db.session.execute(
+        select(_job.c.kind, _job.c.params, _job.c.created_by).where(_job.c.id == job_id)).one()
+    db.session.rollback()
+    params = json.loads(params)
+    try:
+        result = JOB_KINDS[kind].handler(JobContext(job_id, params, user), **params)
+    except Exception:
+        db.session.rollback()
+        _failed(job_id, traceback.format_exc())
+        return
+    _set(job_id, status="succeeded", result=json.dumps(result), finished_at=datetime.utcnow(),
+         progress_done=func.coalesce(_job.c.progress_total, _job.c.progress_done),
+         message=(result.get("message") if isinstance(result, dict) else None), worker=None)
+
+
+def _requeue_stale(running_here=()):
+    """Jobs left running by a worker that stopped heartbeating count as a failed attempt."""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    stale = [jid for (jid,) in db.session.execute(
+        select(_job.c.id).where(_job.c.status == "running", _job.c.heartbeat_at < cutoff))
+        if jid not in running_here]
+    db.session.rollback()
+    for jid in stale:
+        _failed(jid, "worker stopped responding (no heartbeat)")
+    return len(stale)
+
+
+def _child_init():
+    # a spawned process starts from scratch: build the app and keep its context
+    from app import create_app
+    create_app().app_context().push()
+
+
+def _child_run(job_id):
+    run_job(job_id)
+    db.session.remove()
+
+
+def run_worker(processes=JOB_PROCESSES, poll=JOB_POLL_INTERVAL, once=False, log=print):
+    """
+    Claim and run jobs in a pool of `processes` until interrupted (with
+    `once`, until the queue is empty). Children are spawned, not forked,
+    so none inherits the parent's database connections.
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    ctx = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(processes, mp_context=ctx, initializer=_child_init)
+    running = {}  # future -> job id
+    try:
+        while True:
+            _requeue_stale(set(running.values()))
+            while len(running) < processes:
+                job_id = _claim(worker)
+                if job_id is None:
+                    break
+                log(f"▶ job {job_id} started")
+                running[pool.submit(_child_run, job_id)] = job_id
+            if not running:
+                if once:
+                    return
+                time.sleep(poll)
+                continue
+
+            done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                try:
+                    future.result()
+                except BrokenProcessPool:
+                    # a child died mid-job (killed, out of memory): every job it
+                    # might have held loses this attempt and the pool is rebuilt
+                    for jid in [job_id, *running.values()]:
+                        _failed(jid, "worker process died")
+                    running.clear()
+                    pool.shutdown(cancel_futures=True)
+                    pool = ProcessPoolExecutor(processes, mp_context=ctx, initializer=_child_init)
+                    break
+                status = db.session.execute(select(_job.c.status).where(_job.c.id == job_id)).scalar()
+                db.session.rollback()
+                log(f"■ job {job_id} {status}")
+            if running:
+                _set_heartbeat(list(running.values()))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _set_heartbeat(job_ids):
+    with db.engine.begin() as conn:
+        conn.execute(update(_job).where(_job.c.id.in_(job_ids), _job.c.status == "running"),
+                     {"heartbeat_at": datetime.utcnow()})
+
+
+# ------------------ Status ------------------
+
+def job_status(job):
+    done, total = job.progress_done, job.progress_total
+    return {
+        "id": job.id, "kind": job.kind, "status": job.status,
+        "progress": {"done": done, "total": total,
+                     # a purge's total is counted up front; lots added meanwhile can push past it
+                     "percent": min(round(100.0 * done / total, 1), 100.0) if total else None},
+        "message": job.message, "attempts": job.attempts, "max_attempts": job.max_attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error.strip().splitlines()[-1] if job.error else None,
+        "created_by": job.created_by,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def visible_kinds(can):
+    return [k.name for k in JOB_KINDS.values() if can(k.permission)]
+
+
+def export_dir():
+    path = os.path.join(current_app.instance_path, "exports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# ------------------ Kinds ------------------
+
+@job_kind("generate_random", "add_qc_data", max_attempts=1)  # a retry would add the lots twice
+def _generate_random(ctx, count, seed=None):
+    from utils.random_data_generator import generate_bulk_raw_materials
+    message = generate_bulk_raw_materials(count, seed=seed, progress=ctx.progress)
+    log_action(ctx.user, f"Generated random data (job {ctx.job_id}): {message}")
+    return {"message": message}
+
+
+@job_kind("purge_raw_materials", "delete_qc_data")
+def _purge_raw_materials(ctx, received_before=None, status=None):
+    from utils.purge import purge_raw_materials
+    before = datetime.fromisoformat(received_before) if received_before else None
+    report = purge_raw_materials(received_before=before, status=status, progress=ctx.progress)
+    log_action(ctx.user, f"Purged raw material data (before={received_before or '-'}, status={status or '-'}, "
+                         f"job {ctx.job_id}): {report.summary()}")
+    return {"message": report.summary(), "materials": report.materials, "results": report.results}
+
+
+@job_kind("export", "view_reports")
+def _export(ctx, table, fmt):
+    from utils.exporter import EXPORT_TABLES, csv_chunks, write_xlsx
+    t = EXPORT_TABLES[table]
+    ctx.progress(0, db.session.execute(select(func.count()).select_from(t)).scalar())
+    db.session.rollback()
+    name = f"{table}-{datetime.utcnow():%Y%m%d-%H%M%S}-job{ctx.job_id}.{fmt}"
+    path = os.path.join(export_dir(), name)
+    tmp = path + ".part"  # a retry or a download never sees half a file
+    if fmt == "csv":
+        with open(tmp, "w", newline="", encoding="utf-8") as fh:
+            for chunk in csv_chunks(t):
+                fh.write(chunk)
+    else:
+        with open(tmp, "wb") as fh:
+            write_xlsx(t, fh)
+    os.replace(tmp, path)
+    return {"message": f"{table} exported ({os.path.getsize(path):,} bytes)", "file": name}
+
+
+@job_kind("render_coas", "approve_qc_data")
+def _render_coas(ctx, sample_ids):
+    """Pre-render COA PDFs into the shared cache, so the first download is a cache hit."""
+    from utils.coa import coa_fingerprint, rendered_coa
+    for i, sid in enumerate(sample_ids, start=1):
+        s = db.session.get(QCSample, sid)
+        if s is not None and s.coa is not None:
+            rendered_coa(s, "pdf", coa_fingerprint(s))
+        db.session.rollback()
+        ctx.progress(i, len(sample_ids))
+    return {"message": f"{len(sample_ids)} COA(s) rendered"}
@@ -0,0 +1,241 @@
+# lot_allocation.py
+"""
+First-expiry-first-out (or first-in-first-out) allocation of released
+warehouse lots for material issues.
+
+Each process keeps the released lots with stock in memory: per material
+code a heap per policy, ordered by (expiry, receipt, id) for FEFO or
+(receipt, id) for FIFO, and each lot's last known balance. Before every
+allocation the index reads the stock movements written since it last
+looked (a range scan on the ledger's primary key) and re-reads only the
+lots they touched, so receipts, issues, adjustments and QC releases from
+any worker show up without a rebuild. It reads on a connection of its
+own, so it only ever sees committed stock: the caller's transaction may
+still roll back, and SQLite would hand its movement ids out again. Picking pops lots off the heap
+until the quantity is covered, splitting it across as many as it takes,
+all in one unit: lots of the code kept in another unit are passed over,
+never added to kilograms as if they were grams.
+
+The index only proposes. Every lot of a plan is issued through the stock
+ledger's conditional UPDATE, in the caller's transaction, so two workers
+can never issue the same stock: the loser's UPDATE matches no row, that
+lot is re-read and the rest is planned again. As a safety net against a
+missed movement (PostgreSQL can commit ids out of order) a code's lots
+are re-read before a shortage is reported, and the whole index every
+ALLOCATION_RELOAD_INTERVAL.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from database import db
+from models import StockBalance, StockMovement, WarehouseIssue, WarehouseMaterial
+from utils import genealogy, stock_ledger
+
+FEFO, FIFO = "FEFO", "FIFO"
+POLICIES = (FEFO, FIFO)
+ALLOCATION_RELOAD_INTERVAL = 300  # seconds between full reloads of a process's index
+ALLOCATION_MAX_ROUNDS = 5         # lost races tolerated in one allocation before giving up
+ALLOCATION_LOAD_CHUNK = 500       # lot ids per re-read query
+_EMPTY = 1e-9                     # balances are floats; at or below this a lot is empty
+
+
+class _Lot:
+    __slots__ = ("id", "code", "expiry", "received", "unit", "on_hand")
+
+    def __init__(self, id, code, expiry, received, unit, on_hand):
+        self.id, self.code, self.expiry, self.received, self.unit, self.on_hand = \
+            id, code, expiry, received, unit, on_hand
+
+    def key(self, policy):
+        received = self.received or datetime.min
+        if policy == FEFO:
+            return (self.expiry or datetime.max, received, self.id)  # no expiry date: used last
+        return (received, self.id)
+
+    def usable(self, today):
+        return self.on_hand > _EMPTY and (self.expiry is None or self.expiry.date() >= today)
+
+
+class LotIndex:
+    """Released lots per material code, kept in step with the stock ledger; one per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lots = {}       # warehouse material id -> _Lot, released lots only
+        self._by_code = {}    # material code -> set of lot ids
+        self._heaps = {}      # (material code, policy) -> heap of (key, lot id), built on first use
+        self._dirty = set()   # lots whose last issue lost a race; re-read before the next plan
+        self._watermark = 0   # highest stock_movement id seen
+        self._loaded_at = None
+
+    # ------------------ Loading ------------------
+
+    def _drop_heaps(self, code):
+        for policy in POLICIES:
+            self._heaps.pop((code, policy), None)
+
+    @staticmethod
+    def _committed(stmt):
+        with db.engine.connect() as conn:
+            return conn.execute(stmt).all()
+
+    def _load(self, *where):
+        """(Re-)read the lots matching `where`: absolute values, so reading a lot twice is harmless."""
+        rows = self._committed(
+            select(WarehouseMaterial.id, WarehouseMaterial.material_code, WarehouseMaterial.expiry_date,
+                   WarehouseMaterial.received_date, WarehouseMaterial.unit, WarehouseMaterial.status,
+                   StockBalance.quantity)
+            .outerjoin(StockBalance, StockBalance.material_id == WarehouseMaterial.id).where(*where)
+        )
+        for r in rows:
+            lot = self._lots.get(r.id)
+            if r.status != stock_ledger.RELEASED:
+                if lot is not None:  # its heap entries are dropped when they are reached
+                    del self._lots[r.id]
+                    self._by_code[lot.code].discard(r.id)
+                continue
+            on_hand = r.quantity or 0.0
+            if lot is None:
+                lot = self._lots[r.id] = _Lot(r.id, r.material_code, r.expiry_date, r.received_date, r.unit, on_hand)
+                self._by_code.setdefault(lot.code, set()).add(lot.id)
+                self._drop_heaps(lot.code)
+            else:
+                # a lot is popped off its heaps once it runs empty; back in stock, it has to be pushed again
+                if lot.on_hand <= _EMPTY < on_hand:
+                    self._drop_heaps(lot.code)
+                lot.on_hand = on_hand
+
+    def _load_ids(self, ids):
+        ids = sorted(ids)
+        for i in range(0, len(ids), ALLOCATION_LOAD_CHUNK):
+            self._load(WarehouseMaterial.id.in_(ids[i:i + ALLOCATION_LOAD_CHUNK]))
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > ALLOCATION_RELOAD_INTERVAL:
+            # watermark first: a movement committed while loading is read again next time, which is harmless
+            self._watermark = self._committed(select(func.max(StockMovement.id)))[0][0] or 0
+            self._lots, self._by_code, self._heaps, self._dirty = {}, {}, {}, set()
+            self._load(WarehouseMaterial.status == stock_ledger.RELEASED, StockBalance.quantity > _EMPTY)
+            self._loaded_at = now
+            return
+        touched = self._committed(
+            select(StockMovement.material_id, func.max(StockMovement.id))
+            .where(StockMovement.id > self._watermark).group_by(StockMovement.material_id))
+        if touched:
+            self._watermark = max(last for _, last in touched)
+        ids = {mid for mid, _ in touched if mid is not None} | self._dirty
+        self._dirty = set()
+        if ids:
+            self._load_ids(ids)
+
+    # ------------------ Planning ------------------
+
+    def _pick(self, code, quantity, policy, taken, unit):
+        """
+        ([(lot id, quantity, unit)], quantity covered) from the first usable
+        lots of `code` in `unit`; with no unit, in the first usable lot's.
+        """
+        heap = self._heaps.get((code, policy))
+        if heap is None:
+            heap = self._heaps[(code, policy)] = [(self._lots[i].key(policy), i) for i in self._by_code.get(code, ())]
+            heapq.heapify(heap)
+        today = datetime.utcnow().date()
+        kept, picks, remaining = [], [], quantity
+        while heap and remaining > _EMPTY:
+            entry = heapq.heappop(heap)
+            lot = self._lots.get(entry[1])
+            if lot is None or not lot.usable(today):
+                continue  # unreleased, empty or expired: off the heap until a reload finds it usable again
+            kept.append(entry)
+            unit = unit or lot.unit
+            if lot.unit != unit:
+                continue
+            on_hand = lot.on_hand - taken.get(lot.id, 0.0)
+            if on_hand <= _EMPTY:
+                continue  # drained by the caller's own, uncommitted issues
+            take = min(on_hand, remaining)
+            picks.append((lot.id, take, lot.unit))
+            remaining -= take
+        for entry in kept:
+            heapq.heappush(heap, entry)
+        return picks, quantity - max(remaining, 0.0)
+
+    def plan(self, material_code, quantity, policy=FEFO, taken=None, unit=None):
+        """
+        Lots to issue `quantity` `unit` of `material_code` from, as [(lot id,
+        quantity, unit)], in `policy` order; with no unit, the first lot's
+        unit is the plan's. `taken` is {lot id: quantity} the caller's
+        transaction has already issued, which the committed balances don't
+        show yet.
+        """
+        taken = taken or {}
+        with self._lock:
+            self._refresh()
+            picks, covered = self._pick(material_code, quantity, policy, taken, unit)
+            if quantity - covered > _EMPTY:
+                # before reporting a shortage, make sure no lot of this code was missed
+                self._load(WarehouseMaterial.material_code == material_code)
+                self._drop_heaps(material_code)
+                picks, covered = self._pick(material_code, quantity, policy, taken, unit)
+            if quantity - covered > _EMPTY:
+                unit = unit or (picks[0][2] if picks else None)
+                in_unit = f" {unit}" if unit else ""
+                raise stock_ledger.InsufficientStock(
+                    f"Only {covered:g}{in_unit} of {material_code} is released and in date; "
+                    f"{quantity:g}{in_unit} requested.")
+            return picks
+
+    def forget(self, lot_id):
+        """The index overestimated this lot; re-read it before the next plan."""
+        with self._lock:
+            self._dirty.add(lot_id)
+
+
+lot_index = LotIndex()
+
+
+def issue_allocated(material_code, quantity, issued_to, policy=FEFO, batch_no=None, remarks=None, user=None,
+                    unit=None):
+    """
+    Issue `quantity` `unit` of `material_code` from released, in-date lots
+    in `policy` order, one WarehouseIssue per lot used, inside the caller's
+    transaction. Only lots kept in `unit` are used; with no unit, those in
+    the unit of the first lot in policy order. Raises
+    stock_ledger.InsufficientStock when the stock can't cover it; the
+    caller rolls back.
+    """
+    if not material_code:
+        raise ValueError("A material code is required.")
+    if quantity <= 0:
+        raise ValueError("Issued quantity must be positive.")
+    if policy not in POLICIES:
+        raise ValueError(f"Allocation policy must be one of: {', '.join(POLICIES)}.")
+    issues, remaining, taken = [], quantity, {}
+    for _ in range(ALLOCATION_MAX_ROUNDS):
+        # every pick of a plan is in one unit, so once a lot is picked `unit` holds for the later rounds too
+        for lot_id, take, unit in lot_index.plan(material_code, remaining, policy, taken, unit):
+            issue = WarehouseIssue(material_id=lot_id, issued_quantity=take, unit=unit, issued_to=issued_to,
+                                   remarks=remarks, batch_no=batch_no)
+            db.session.add(issue)
+            db.session.flush()
+            try:
+                stock_ledger.issue(lot_id, take, unit=unit, reference=f"issue:{issue.id}", remarks=issued_to,
+                                   user=user)
+            except stock_ledger.InsufficientStock:
+                # another worker got there first: drop this issue, re-read the lot, plan the rest again
+                db.session.delete(issue)
+                db.session.flush()
+                lot_index.forget(lot_id)
+                break
+            genealogy.record_issue(issue, db.session.get(WarehouseMaterial, lot_id), user=user)
+            issues.append(issue)
+            taken[lot_id] = taken.get(lot_id, 0.0) + take
+            remaining -= take
+        else:
+            return issues
+    raise stock_ledger.InsufficientStock(f"Stock of {material_code} kept changing; please try again.")
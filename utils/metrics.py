@@ -0,0 +1,307 @@
+# metrics.py
+"""
+Request and SQL instrumentation exposed in Prometheus text format.
+
+Every request records its latency, SQL statement count and time spent in
+the database per endpoint; statements slower than SLOW_QUERY_MS are
+logged with their query plan. Each worker keeps its numbers in memory and
+snapshots them to METRICS_DIR/<pid>.json every few seconds, and /metrics
+sums the snapshots of all workers, so any gunicorn worker can answer the
+scrape. The worker answering a scrape takes over the snapshots of exited
+workers, adding their numbers to its own, so counters never go back and
+the directory holds one file per live worker. METRICS_DIR must therefore
+be local to the host: the pids in it are checked with kill(pid, 0).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+SNAPSHOT_INTERVAL = float(os.environ.get("METRICS_SNAPSHOT_SECONDS", 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+HISTOGRAMS = {
+    "pharma_http_request_duration_seconds": ("Request latency by endpoint.", LATENCY_BUCKETS),
+    "pharma_http_request_db_seconds": ("Time spent in SQL per request.", LATENCY_BUCKETS),
+    "pharma_http_request_queries": ("SQL statements per request.", QUERY_COUNT_BUCKETS),
+}
+COUNTERS = {
+    "pharma_http_requests_total": "Requests by endpoint, method and status.",
+    "pharma_db_queries_total": "SQL statements executed (requests and background work).",
+    "pharma_db_query_seconds_total": "Total time spent executing SQL.",
+    "pharma_db_slow_queries_total": f"Statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms).",
+}
+
+
+class Registry:
+    """This worker's counters and histograms, keyed by (name, labels)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            h[bisect_left(buckets, value)] += 1  # non-cumulative; summed up on export
+            h[-1] += value
+
+    def merge(self, snap):
+        """Add a snapshot's numbers (another worker's) to this registry."""
+        with self.lock:
+            for n, labels, v in snap["counters"]:
+                key = (n, tuple(map(tuple, labels)))
+                self.counters[key] = self.counters.get(key, 0) + v
+            for n, labels, h in snap["histograms"]:
+                key = (n, tuple(map(tuple, labels)))
+                acc = self.histograms.get(key)
+                self.histograms[key] = list(h) if acc is None else [a + b for a, b in zip(acc, h)]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in self.counters.items()],
+                "histograms": [[n, list(map(list, l)), list(h)] for (n, l), h in self.histograms.items()],
+            }
+
+
+registry = Registry()
+_query_state = threading.local()  # per-thread stats of the request being served
+
+
+# ------------------ SQL listeners ------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"]
+    registry.inc("pharma_db_queries_total")
+    registry.inc("pharma_db_query_seconds_total", value=elapsed)
+    stats = getattr(_query_state, "stats", None)
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        registry.inc("pharma_db_slow_queries_total")
+        _log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+
+def _log_slow_query(conn, statement, parameters, executemany, elapsed):
+    plan = ""
+    if not executemany and statement.lstrip()[:6].upper() == "SELECT":
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        try:
+            # a raw DB-API cursor, so this does not re-enter the listeners
+            cur = conn.connection.dbapi_connection.cursor()
+            try:
+                cur.execute(prefix + statement, parameters)
+                plan = "\n".join("  " + " ".join(str(c) for c in row) for row in cur.fetchall())
+            finally:
+                cur.close()
+        except Exception as e:  # the plan is best effort, never fail the query
+            plan = f"  (no plan: {e})"
+    endpoint = request.endpoint if getattr(_query_state, "stats", None) is not None else None
+    logger.warning("slow query %.1f ms%s\n%s\n%s", elapsed * 1000,
+                   f" in {endpoint}" if endpoint else "", statement, plan)
+
+
+# ------------------ Request hooks ------------------
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_recorded = False
+    _query_state.stats = [0, 0.0]
+
+
+def _record(status):
+    if getattr(g, "_metrics_recorded", True):
+        return
+    g._metrics_recorded = True
+    elapsed = time.perf_counter() - g._metrics_start
+    queries, db_seconds = _query_state.stats
+    _query_state.stats = None
+    endpoint = request.endpoint or "unmatched"
+    registry.inc("pharma_http_requests_total", (("endpoint", endpoint), ("method", request.method),
+                                                 ("status", str(status))))
+    labels = (("endpoint", endpoint),)
+    registry.observe("pharma_http_request_duration_seconds", labels, elapsed)
+    registry.observe("pharma_http_request_db_seconds", labels, db_seconds)
+    registry.observe("pharma_http_request_queries", labels, queries)
+    _maybe_snapshot()
+
+
+def _after_request(response):
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    if exc is not None:
+        _record(500)
+    _query_state.stats = None
+
+
+# ------------------ Cross-worker aggregation ------------------
+
+class _Snapshots:
+    def __init__(self):
+        self.directory = None
+        self.reset()
+
+    def reset(self):
+        # pid plus a random part, so a recycled pid never overwrites a dead worker's file
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+        self.last_write = 0.0
+
+    def path(self):
+        return os.path.join(self.directory, self.name)
+
+
+_snapshots = _Snapshots()
+
+
+def _after_fork():
+    # gunicorn --preload: a worker starts with the master's numbers, which it did not serve
+    global registry
+    registry = Registry()
+    _snapshots.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _maybe_snapshot(force=False):
+    now = time.monotonic()
+    if _snapshots.directory is None or (not force and now - _snapshots.last_write < SNAPSHOT_INTERVAL):
+        return
+    _snapshots.last_write = now
+    path = _snapshots.path()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(registry.snapshot(), fh)
+    os.replace(tmp, path)  # readers never see half a file
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # someone else's process
+    return True
+
+
+def _take_over_dead():
+    """
+    Claim the snapshot files of exited workers and add their numbers to
+    this worker's registry. Returns the claimed paths, to delete once this
+    worker's own snapshot holds the numbers.
+    """
+    if os.name != "posix":  # os.kill(pid, 0) terminates the process on Windows
+        return []
+    claimed = []
+    for name in os.listdir(_snapshots.directory):
+        pid = name.split("-", 1)[0]
+        if not name.endswith(".json") or name == _snapshots.name or not pid.isdigit() or _alive(int(pid)):
+            continue
+        path = os.path.join(_snapshots.directory, name)
+        mine = f"{path}.{os.getpid()}.taken"
+        try:
+            os.rename(path, mine)  # atomic: of two workers scraping at once, one gets it
+        except OSError:
+            continue
+        try:
+            with open(mine) as fh:
+                registry.merge(json.load(fh))
+        except (OSError, ValueError):
+            pass  # half a file can't be counted; drop it
+        claimed.append(mine)
+    return claimed
+
+
+def _merged():
+    """Every worker's latest snapshot summed, with this worker's live numbers."""
+    total = Registry()
+    total.merge(registry.snapshot())
+    own = _snapshots.name
+    for name in os.listdir(_snapshots.directory):
+        if not name.endswith(".json") or name == own:
+            continue
+        try:
+            with open(os.path.join(_snapshots.directory, name)) as fh:
+                total.merge(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return total.counters, total.histograms
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """The aggregated metrics in Prometheus text exposition format 0.0.4."""
+    claimed = _take_over_dead()
+    _maybe_snapshot(force=True)
+    for path in claimed:
+        os.remove(path)
+    counters, histograms = _merged()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        series = sorted((l, v) for (n, l), v in counters.items() if n == name) or [((), 0)]
+        lines += [f"{name}{_fmt_labels(l)} {v:g}" for l, v in series]
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for labels, h in sorted((l, h) for (n, l), h in histograms.items() if n == name):
+            cumulative = 0
+            for bound, count in zip(buckets, h):
+                cumulative += count
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+            cumulative += h[len(buckets)]
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h[-1]:g}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app, engine, directory=None):
+    """Install the request hooks on `app` and the SQL listeners on `engine`."""
+    from sqlalchemy import event
+
+    _snapshots.directory = directory or os.environ.get(
+        "METRICS_DIR", os.path.join(app.instance_path, "metrics"))
+    os.makedirs(_snapshots.directory, exist_ok=True)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,82 @@
+# pagination.py
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values):
+    """Turn the sort-key values of a row into an opaque URL-safe token."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, columns):
+    """Inverse of encode_cursor. Returns None for a missing or malformed token."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        return None
+    values = []
+    for col, v in zip(columns, payload):
+        if v is not None and col.type.python_type is datetime:
+            try:
+                v = datetime.fromisoformat(v)
+            except (TypeError, ValueError):
+                return None
+        values.append(v)
+    return values
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def keyset_paginate(query, columns, per_page, after=None, before=None, descending=True):
+    """
+    Seek-method pagination over `columns` (the last one must be unique, e.g. the id).
+
+    `after` / `before` are cursors produced by a previous page. Each page costs
+    one index range scan of `per_page + 1` rows no matter how deep it is, unlike
+    OFFSET which has to walk every skipped row.
+    """
+    key = tuple_(*columns)
+    backwards = False
+    cursor = decode_cursor(after, columns)
+    if cursor is not None:
+        query = query.filter(key < tuple_(*cursor) if descending else key > tuple_(*cursor))
+    else:
+        cursor = decode_cursor(before, columns)
+        if cursor is not None:
+            backwards = True
+            query = query.filter(key > tuple_(*cursor) if descending else key < tuple_(*cursor))
+
+    # walking backwards = flip the order, then reverse the page in Python
+    flip = descending != backwards
+    query = query.order_by(*[c.desc() if flip else c.asc() for c in columns])
+    rows = query.limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, c.key) for c in columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = cursor_of(rows[-1])
+        if (has_more and backwards) or (not backwards and cursor is not None):
+            prev_cursor = cursor_of(rows[0])
+    return KeysetPage(rows, next_cursor, prev_cursor)
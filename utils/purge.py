@@ -0,0 +1,125 @@
+# purge.py
+import time
+
+from sqlalchemy import delete, func, select
+
+from database import db
+from models import COA, QCSample, RawMaterial, Specification, TestResult
+from utils.coa import invalidate_coa
+from utils.reports import RollupDelta
+from utils.spc import forget_results
+from utils.spec_engine import spec_index
+
+PURGE_CHUNK_SIZE = 500
+PURGE_PAUSE = 0.05  # seconds between chunks, so waiting writers get the lock
+
+_rm = RawMaterial.__table__
+_sample = QCSample.__table__
+_spec = Specification.__table__
+_result = TestResult.__table__
+_coa = COA.__table__
+
+
+class PurgeReport:
+    def __init__(self, total):
+        self.total = total
+        self.materials = 0
+        self.samples = 0
+        self.specs = 0
+        self.results = 0
+        self.coas = 0
+        self.elapsed = 0.0
+
+    def summary(self):
+        return (f"{self.materials} materials purged with {self.samples} samples, {self.specs} specs, "
+                f"{self.results} results and {self.coas} COAs in {self.elapsed:.1f}s")
+
+
+def _filters(received_before=None, status=None):
+    where = []
+    if received_before is not None:
+        where.append(_rm.c.received_date < received_before)
+    if status:
+        where.append(_rm.c.status == status)
+    return where
+
+
+def _purge_chunk(conn, material_ids, report):
+    """Delete one chunk of lots and everything under them, children first."""
+    sample_ids = [sid for (sid,) in conn.execute(
+        select(_sample.c.id).where(_sample.c.material_id.in_(material_ids)))]
+
+    # take the lots back out of the report rollups
+    delta = RollupDelta()
+    for when, code, vendor in conn.execute(
+            select(_rm.c.received_date, _rm.c.material_code, _rm.c.vendor).where(_rm.c.id.in_(material_ids))):
+        delta.lot_received(when, code, vendor, sign=-1)
+    if sample_ids:
+        purged_results = []
+        for result_id, *row in conn.execute(
+                select(_result.c.id, _result.c.tested_at, _rm.c.material_code, _rm.c.vendor,
+                       _result.c.parameter, _result.c.verdict, _result.c.result_value)
+                .join(_sample, _sample.c.id == _result.c.sample_id)
+                .join(_rm, _rm.c.id == _sample.c.material_id)
+                .where(_result.c.sample_id.in_(sample_ids))):
+            delta.result(*row, sign=-1)
+            purged_results.append((result_id, row[1], row[3], row[5]))
+        # and out of the SPC series
+        forget_results(conn, purged_results)
+        for when, code, vendor, verdict in conn.execute(
+                select(_coa.c.generated_at, _rm.c.material_code, _rm.c.vendor, _coa.c.overall_verdict)
+                .join(_sample, _sample.c.id == _coa.c.sample_id)
+                .join(_rm, _rm.c.id == _sample.c.material_id)
+                .where(_coa.c.sample_id.in_(sample_ids))):
+            delta.coa(when, code, vendor, verdict, sign=-1)
+
+        report.results += conn.execute(delete(_result).where(_result.c.sample_id.in_(sample_ids))).rowcount
+        report.coas += conn.execute(delete(_coa).where(_coa.c.sample_id.in_(sample_ids))).rowcount
+        report.samples += conn.execute(delete(_sample).where(_sample.c.id.in_(sample_ids))).rowcount
+    report.specs += conn.execute(delete(_spec).where(_spec.c.material_id.in_(material_ids))).rowcount
+    report.materials += conn.execute(delete(_rm).where(_rm.c.id.in_(material_ids))).rowcount
+    delta.apply(conn)
+    return sample_ids
+
+
+def purge_raw_materials(received_before=None, status=None, chunk_size=PURGE_CHUNK_SIZE,
+                        pause=PURGE_PAUSE, progress=None):
+    """
+    Delete raw material lots with their samples, specs, results and COAs.
+
+    Optionally only lots received before `received_before` and/or with the
+    given `status`. Lots are taken `chunk_size` at a time in id order; each
+    chunk is deleted set-based (one DELETE per table, children first) in its
+    own short transaction, with the report rollups adjusted in the same
+    transaction, so other requests only ever wait for one chunk.
+    `progress(done, total)` is called after every chunk.
+    """
+    started = time.perf_counter()
+    where = _filters(received_before, status)
+    db.session.rollback()  # nothing of ours may hold the write lock between chunks
+    total = db.session.execute(select(func.count()).select_from(_rm).where(*where)).scalar()
+    db.session.rollback()
+    report = PurgeReport(total)
+
+    last_id = 0
+    while True:
+        with db.engine.begin() as conn:
+            if conn.dialect.name == "sqlite":
+                # take the write lock before reading, so nothing is added under the chunk meanwhile
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            material_ids = [mid for (mid,) in conn.execute(
+                select(_rm.c.id).where(_rm.c.id > last_id, *where).order_by(_rm.c.id).limit(chunk_size))]
+            if not material_ids:
+                break
+            sample_ids = _purge_chunk(conn, material_ids, report)
+        last_id = material_ids[-1]
+        invalidate_coa(*sample_ids)
+        for mid in material_ids:
+            spec_index.invalidate(mid)
+        if progress:
+            progress(report.materials, total)
+        if pause:
+            time.sleep(pause)
+
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -1,12 +1,15 @@
 # random_data_generator.py
 import random
+import time
 from datetime import datetime, timedelta
-from faker import Faker
+from itertools import count as counter
 from database import db
+from utils.ar_allocator import format_ar_no, reserve_ar_block
+from utils.reports import RollupDelta
+from utils.spc import SPCBatch
 from models import RawMaterial, QCSample, Specification, TestResult, COA
-from sqlalchemy.exc import IntegrityError
-
-fake = Faker()
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError, OperationalError
 
 # Predefined QC parameters for random specs
 QC_PARAMETERS = [
@@ -30,104 +33,186 @@ PHARMA_MATERIALS = {
     "RM010": "Metformin"
 }
 
+DEFAULT_BATCH_SIZE = 2000
+MAX_CHUNK_ATTEMPTS = 5
+SEEDED_NOW = datetime(2026, 1, 1)  # dates of seeded runs count back from here, so a seed reproduces them too
+
+# Faker is slow per call, so names are drawn from small pre-built pools
+VENDOR_POOL_SIZE = 200
+PERSON_POOL_SIZE = 100
+
+_TABLES = (RawMaterial.__table__, QCSample.__table__, Specification.__table__,
+           TestResult.__table__, COA.__table__)
 
-def generate_unique_ar_no():
-    """Always return a unique AR number"""
-    while True:
-        candidate = f"AR-{datetime.now().strftime('%Y%m%d')}-{random.randint(1000,9999)}"
-        # Check in DB
-        if not QCSample.query.filter_by(ar_no=candidate).first():
-            return candidate
-
-
-def generate_bulk_raw_materials(n=10):
-    for _ in range(n):
-        # Pick random (code, name) pair
-        material_code, material_name = random.choice(list(PHARMA_MATERIALS.items()))
-
-        rm = RawMaterial(
-            material_code=material_code,
-            material_name=material_name,
-            lot_no=f"LOT{random.randint(10000,99999)}",
-            vendor=fake.company(),
-            received_qty=random.uniform(10, 500),
-            unit="kg",
-            received_date=fake.date_time_between(start_date="-60d", end_date="now"),
-            status="Testing"
-        )
-        db.session.add(rm)
-        db.session.flush()  # ensures rm.id is available
-
-        # Add one sample
-        sample = QCSample(
-            ar_no=generate_unique_ar_no(),
-            sample_date=fake.date_time_between(start_date="-30d", end_date="now"),
-            sampler=fake.name(),
-            remarks="Random generated sample",
-            material_id=rm.id
-        )
-
-        db.session.add(sample)
-        db.session.flush()
 
+def _build_chunk(rng, pools, count, ids, ar_prefix, ar_start, now):
+    """Build plain row dicts for `count` lots, drawing their ids from the `ids` iterators (one per table)."""
+    vendors, people = pools
+    materials = list(PHARMA_MATERIALS.items())
+    rm_ids, sample_ids, spec_ids, result_ids, coa_ids = ids
+    rms, samples, specs, results, coas = [], [], [], [], []
+
+    for i in range(count):
+        rm_id, sample_id, coa_id = next(rm_ids), next(sample_ids), next(coa_ids)
+        material_code, material_name = rng.choice(materials)
+        received = now - timedelta(seconds=rng.uniform(0, 60 * 86400))
+        sampled = received + timedelta(seconds=rng.uniform(0, (now - received).total_seconds()))
+        tester = rng.choice(people)
         overall_verdict = "Pass"
 
-        # Add specifications and results
         for spec_data in QC_PARAMETERS:
-            spec = Specification(
-                material_id=rm.id,
-                parameter=spec_data["parameter"],
-                method=spec_data["method"],
-                unit=spec_data.get("unit"),
-                lower_limit=spec_data.get("limits", (None, None))[0],
-                upper_limit=spec_data.get("limits", (None, None))[1],
-                textual_limit=spec_data.get("textual")
-            )
-            db.session.add(spec)
-
-            # Generate test result
+            lower, upper = spec_data.get("limits", (None, None))
+            specs.append({
+                "id": next(spec_ids), "material_id": rm_id,
+                "parameter": spec_data["parameter"], "method": spec_data["method"],
+                "unit": spec_data.get("unit"), "lower_limit": lower, "upper_limit": upper,
+                "textual_limit": spec_data.get("textual"), "created_at": received,
+            })
+
             if "limits" in spec_data:
-                value = random.uniform(spec.lower_limit - 1, spec.upper_limit + 1)
-                verdict = "Pass" if spec.lower_limit <= value <= spec.upper_limit else "Fail"
-                if verdict == "Fail":
-                    overall_verdict = "Fail"
-                result = TestResult(
-                    sample_id=sample.id,
-                    parameter=spec.parameter,
-                    result_value=value,
-                    unit=spec.unit,
-                    verdict=verdict,
-                    tested_by=fake.name(),
-                )
+                value = rng.uniform(lower - 1, upper + 1)
+                verdict = "Pass" if lower <= value <= upper else "Fail"
+                text = None
             else:
-                text = "Complies" if random.random() > 0.1 else "Does not comply"
+                value = None
+                text = "Complies" if rng.random() > 0.1 else "Does not comply"
                 verdict = "Pass" if text == "Complies" else "Fail"
-                if verdict == "Fail":
-                    overall_verdict = "Fail"
-                result = TestResult(
-                    sample_id=sample.id,
-                    parameter=spec.parameter,
-                    result_text=text,
-                    verdict=verdict,
-                    tested_by=fake.name(),
-                )
-            db.session.add(result)
-
-        # Add COA
-        coa = COA(
-            sample_id=sample.id,
-            overall_verdict=overall_verdict,
-            notes="Randomly generated COA"
-        )
-        db.session.add(coa)
-        #Update raw material status based on COA
-        rm.status = "Pass" if overall_verdict == "Pass" else "Fail"
-
-    try:
-        db.session.commit()
-    except IntegrityError:
-        db.session.rollback()
-        # regenerate with fresh AR numbers
-        return generate_bulk_raw_materials(n)
-
-    print(f"{n} random raw materials with specs & results generated.")
+            if verdict == "Fail":
+                overall_verdict = "Fail"
+            results.append({
+                "id": next(result_ids), "sample_id": sample_id,
+                "parameter": spec_data["parameter"], "result_value": value, "result_text": text,
+                "unit": spec_data.get("unit") if value is not None else None,
+                "verdict": verdict, "tested_by": tester, "tested_at": sampled,
+            })
+
+        rms.append({
+            "id": rm_id, "material_code": material_code, "material_name": material_name,
+            "lot_no": f"LOT{rng.randint(10000, 99999)}", "vendor": rng.choice(vendors),
+            "received_qty": rng.uniform(10, 500), "unit": "kg",
+            "received_date": received, "status": overall_verdict,
+        })
+        samples.append({
+            "id": sample_id, "ar_no": format_ar_no(ar_prefix, ar_start + i),
+            "sample_date": sampled, "sampler": rng.choice(people),
+            "remarks": "Random generated sample", "material_id": rm_id,
+        })
+        coas.append({
+            "id": coa_id, "sample_id": sample_id, "overall_verdict": overall_verdict,
+            "generated_at": sampled, "notes": "Randomly generated COA",
+        })
+
+    return rms, samples, specs, results, coas
+
+
+def _rollup_chunk(rms, samples, specs, results, coas):
+    """Report rollup changes for one generated chunk."""
+    delta = RollupDelta()
+    rm_by_id = {r["id"]: r for r in rms}
+    rm_of_sample = {s["id"]: rm_by_id[s["material_id"]] for s in samples}
+    for r in rms:
+        delta.lot_received(r["received_date"], r["material_code"], r["vendor"])
+    for t in results:
+        rm = rm_of_sample[t["sample_id"]]
+        delta.result(t["tested_at"], rm["material_code"], rm["vendor"], t["parameter"],
+                     t["verdict"], t["result_value"])
+    for c in coas:
+        rm = rm_of_sample[c["sample_id"]]
+        delta.coa(c["generated_at"], rm["material_code"], rm["vendor"], c["overall_verdict"])
+    return delta
+
+
+def _spc_chunk(rms, samples, results):
+    """SPC points for one generated chunk (the ids are pre-allocated)."""
+    spc = SPCBatch()
+    code_of_rm = {r["id"]: r["material_code"] for r in rms}
+    code_of_sample = {s["id"]: code_of_rm[s["material_id"]] for s in samples}
+    for t in results:
+        spc.result(t["id"], t["tested_at"], code_of_sample[t["sample_id"]], t["parameter"],
+                   t["result_value"], t["verdict"])
+    return spc
+
+
+def _allocate_ids(conn, table, count):
+    """
+    `count` primary keys for `table`. On PostgreSQL they come from the
+    table's own sequence, so ORM inserts after the seed don't collide with
+    them; elsewhere they run on from max(id) (under the write lock on SQLite).
+    """
+    if conn.dialect.name == "postgresql":
+        seq = func.nextval(func.pg_get_serial_sequence(table.name, "id"))
+        return iter(conn.execute(select(seq).select_from(func.generate_series(1, count))).scalars().all())
+    start = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+    return counter(start)
+
+
+def _insert_chunk(rng, pools, count, now, ar_block):
+    """Insert one chunk in its own transaction; returns the number of rows written."""
+    # pre-allocate primary keys for the whole chunk up front; ar_block is (prefix, first number)
+    ar_prefix, ar_start = ar_block
+    per_lot = (1, 1, len(QC_PARAMETERS), len(QC_PARAMETERS), 1)  # rows per lot in each of _TABLES
+    with db.engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")  # take the write lock before reading max(id)
+        ids = [_allocate_ids(conn, t, count * k) for t, k in zip(_TABLES, per_lot)]
+        batches = _build_chunk(rng, pools, count, ids, ar_prefix, ar_start, now)
+        for table, rows in zip(_TABLES, batches):
+            conn.execute(insert(table), rows)  # executemany
+        _rollup_chunk(*batches).apply(conn)
+        rms, samples, _, results, _ = batches
+        _spc_chunk(rms, samples, results).apply(conn)
+    return sum(len(rows) for rows in batches)
+
+
+def generate_bulk_raw_materials(n=10, seed=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, now=None):
+    """
+    Seed `n` random lots (material, sample, specs, results, COA) and return a
+    summary message with the achieved insert rate.
+
+    Rows are built as plain dicts and written with Core executemany inserts,
+    one transaction per `batch_size` lots. A chunk that collides with a
+    concurrent writer, or can't get SQLite's write lock in time, is rebuilt
+    with fresh ids and retried on its own;
+    AR numbers come from the shared sequence in blocks of one chunk.
+    Passing the same `seed` reproduces the same data: its dates then count
+    back from SEEDED_NOW rather than the clock, unless `now` is given.
+    `progress(done, total)` is called after every chunk.
+    """
+    from faker import Faker  # slow to import; only generation needs it
+
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    pools = (
+        [fake.company() for _ in range(VENDOR_POOL_SIZE)],
+        [fake.name() for _ in range(PERSON_POOL_SIZE)],
+    )
+
+    started = time.perf_counter()
+    if now is None:
+        now = SEEDED_NOW if seed is not None else datetime.utcnow()
+    rows = 0
+    remaining = n
+    while remaining > 0:
+        count = min(batch_size, remaining)
+        state = rng.getstate()
+        # reserved (and committed) once: a retried chunk reuses its numbers instead of leaving a gap
+        ar_block = reserve_ar_block(count, now)
+        for attempt in range(MAX_CHUNK_ATTEMPTS):
+            try:
+                rows += _insert_chunk(rng, pools, count, now, ar_block)
+                break
+            except (IntegrityError, OperationalError):
+                # OperationalError: SQLite's "database is locked" when another writer held the lock too long
+                if attempt == MAX_CHUNK_ATTEMPTS - 1:
+                    raise
+                rng.setstate(state)  # same data and AR numbers, new ids
+                time.sleep(0.05 * (attempt + 1))
+        remaining -= count
+        if progress:
+            progress(n - remaining, n)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    message = (f"{n} random raw materials with specs & results generated "
+               f"({rows} rows in {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s).")
+    return message
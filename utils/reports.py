@@ -0,0 +1,202 @@
+# reports.py
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db
+from models import COA, QCLotRollup, QCResultRollup, QCSample, RawMaterial, TestResult
+
+RESULT_KEY = ("day", "material_code", "vendor", "parameter")
+RESULT_FIELDS = ("n_results", "n_pass", "n_numeric", "sum_value", "sum_sq_value")
+LOT_KEY = ("day", "material_code", "vendor")
+LOT_FIELDS = ("n_received", "n_coa", "n_coa_pass")
+
+
+def _day(when):
+    if when is None:
+        return datetime.utcnow().date()
+    return when.date() if isinstance(when, datetime) else when
+
+
+class RollupDelta:
+    """
+    Signed changes to the rollup counters, accumulated in memory.
+
+    Write paths describe what they did (a result saved, a verdict changed,
+    a COA issued, a lot received) and apply() folds everything into one
+    upsert per rollup table, inside the caller's transaction.
+    """
+
+    def __init__(self):
+        self.results = defaultdict(lambda: [0, 0, 0, 0.0, 0.0])
+        self.lots = defaultdict(lambda: [0, 0, 0])
+
+    def result(self, when, material_code, vendor, parameter, verdict, value, sign=1):
+        c = self.results[(_day(when), material_code, vendor or "", parameter)]
+        c[0] += sign
+        if verdict == "Pass":
+            c[1] += sign
+        if value is not None:
+            c[2] += sign
+            c[3] += sign * value
+            c[4] += sign * value * value
+
+    def verdict_change(self, when, material_code, vendor, parameter, old, new):
+        c = self.results[(_day(when), material_code, vendor or "", parameter)]
+        c[1] += (new == "Pass") - (old == "Pass")
+
+    def lot_received(self, when, material_code, vendor, sign=1):
+        self.lots[(_day(when), material_code, vendor or "")][0] += sign
+
+    def coa(self, when, material_code, vendor, verdict, sign=1):
+        c = self.lots[(_day(when), material_code, vendor or "")]
+        c[1] += sign
+        if verdict == "Pass":
+            c[2] += sign
+
+    def apply(self, conn=None):
+        conn = conn if conn is not None else db.session
+        _upsert(conn, QCResultRollup.__table__, RESULT_KEY, RESULT_FIELDS, self.results)
+        _upsert(conn, QCLotRollup.__table__, LOT_KEY, LOT_FIELDS, self.lots)
+        self.results.clear()
+        self.lots.clear()
+
+
+def _upsert(conn, table, key_cols, fields, counters):
+    rows = [
+        {**dict(zip(key_cols, key)), **dict(zip(fields, values))}
+        for key, values in counters.items() if any(values)
+    ]
+    if not rows:
+        return
+    dialect = conn.get_bind().dialect.name if hasattr(conn, "get_bind") else conn.dialect.name
+    insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(dialect)
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_cols),
+            set_={f: table.c[f] + stmt.excluded[f] for f in fields},
+        )
+        conn.execute(stmt, rows)
+        return
+    # generic fallback: update, insert when the bucket does not exist yet
+    for row in rows:
+        where = [table.c[k] == row[k] for k in key_cols]
+        bumped = conn.execute(update(table).where(*where).values({f: table.c[f] + row[f] for f in fields}))
+        if bumped.rowcount == 0:
+            conn.execute(table.insert().values(row))
+
+
+def rebuild_rollups(yield_per=5000):
+    """
+    Recompute both rollup tables from the base tables in one streaming pass.
+    Only needed once after the migration (or after manual data surgery);
+    day-to-day the write paths keep the rollups current.
+    """
+    delta = RollupDelta()
+    db.session.execute(delete(QCResultRollup.__table__))
+    db.session.execute(delete(QCLotRollup.__table__))
+
+    results = select(TestResult.tested_at, RawMaterial.material_code, RawMaterial.vendor,
+                     TestResult.parameter, TestResult.verdict, TestResult.result_value) \
+        .join(QCSample, QCSample.id == TestResult.sample_id) \
+        .join(RawMaterial, RawMaterial.id == QCSample.material_id)
+    for row in db.session.execute(results.execution_options(yield_per=yield_per)):
+        delta.result(*row)
+
+    lots = select(RawMaterial.received_date, RawMaterial.material_code, RawMaterial.vendor)
+    for row in db.session.execute(lots.execution_options(yield_per=yield_per)):
+        delta.lot_received(*row)
+
+    coas = select(COA.generated_at, RawMaterial.material_code, RawMaterial.vendor, COA.overall_verdict) \
+        .join(QCSample, QCSample.id == COA.sample_id) \
+        .join(RawMaterial, RawMaterial.id == QCSample.material_id)
+    for row in db.session.execute(coas.execution_options(yield_per=yield_per)):
+        delta.coa(*row)
+
+    delta.apply()
+    db.session.commit()
+
+
+# ------------------ Report queries (read rollups only) ------------------
+
+def _frame(stmt, date_from=None, date_to=None, material_code=None, table=None):
+    import pandas as pd  # heavy; only the report endpoints need it
+
+    if date_from:
+        stmt = stmt.where(table.c.day >= date_from)
+    if date_to:
+        stmt = stmt.where(table.c.day <= date_to)
+    if material_code:
+        stmt = stmt.where(table.c.material_code == material_code)
+    rows = db.session.execute(stmt).all()
+    return pd.DataFrame(rows, columns=list(stmt.selected_columns.keys()))
+
+
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def pass_rate_by_vendor(**filters):
+    t = QCLotRollup.__table__
+    df = _frame(select(t.c.vendor, t.c.n_coa, t.c.n_coa_pass), table=t, **filters)
+    if df.empty:
+        return []
+    g = df.groupby("vendor", as_index=False)[["n_coa", "n_coa_pass"]].sum()
+    g = g[g.n_coa > 0]
+    g["pass_rate"] = (g.n_coa_pass / g.n_coa).round(4)
+    return _records(g.sort_values(["pass_rate", "n_coa"], ascending=[True, False]))
+
+
+def failure_rate_by_parameter(**filters):
+    t = QCResultRollup.__table__
+    df = _frame(select(t.c.material_code, t.c.parameter, *[t.c[f] for f in RESULT_FIELDS]),
+                table=t, **filters)
+    if df.empty:
+        return []
+    g = df.groupby(["material_code", "parameter"], as_index=False)[list(RESULT_FIELDS)].sum()
+    g = g[g.n_results > 0]
+    g["n_fail"] = g.n_results - g.n_pass
+    g["failure_rate"] = (g.n_fail / g.n_results).round(4)
+    n = g.n_numeric.where(g.n_numeric > 0)
+    g["mean"] = (g.sum_value / n).round(4)
+    var = (g.sum_sq_value - g.sum_value ** 2 / n) / (n - 1).where(n > 1)
+    g["std"] = var.clip(lower=0).pow(0.5).round(4)
+    cols = ["material_code", "parameter", "n_results", "n_fail", "failure_rate", "n_numeric", "mean", "std"]
+    return _records(g[cols].sort_values("failure_rate", ascending=False))
+
+
+def lots_per_month(**filters):
+    import pandas as pd
+
+    t = QCLotRollup.__table__
+    df = _frame(select(t.c.day, *[t.c[f] for f in LOT_FIELDS]), table=t, **filters)
+    if df.empty:
+        return []
+    df["month"] = pd.to_datetime(df.day).dt.strftime("%Y-%m")
+    g = df.groupby("month", as_index=False)[list(LOT_FIELDS)].sum()
+    return _records(g.sort_values("month"))
+
+
+REPORTS = {
+    "pass_rate_by_vendor": pass_rate_by_vendor,
+    "failure_rate_by_parameter": failure_rate_by_parameter,
+    "lots_per_month": lots_per_month,
+}
+
+
+def parse_filters(args):
+    """Report filters from a request's query string; bad dates are ignored."""
+    def _date(name):
+        try:
+            return date.fromisoformat(args.get(name, ""))
+        except ValueError:
+            return None
+
+    return {
+        "date_from": _date("date_from"),
+        "date_to": _date("date_to"),
+        "material_code": args.get("material_code", "").strip() or None,
+    }
@@ -0,0 +1,132 @@
+# response_cache.py
+"""
+Whole-page cache for the department dashboards.
+
+Every table a cached page reads has a row in cache_version. An engine
+listener notes which of those tables a transaction wrote to and bumps
+their versions in the same transaction, right before it commits, so
+every write path (ORM, Core, bulk utilities) invalidates the right pages
+without having to remember to. A page is cached under its endpoint,
+arguments, user and the current versions of its tables; the same digest
+is its ETag, so an unchanged page costs one small query and a 304.
+Entries live in instance/cache/pages, shared by all workers on the host.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from sqlalchemy import event, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db
+from models import CacheVersion
+from utils.cache import FileCache
+
+_versions = CacheVersion.__table__
+WATCHED_TABLES = set()  # filled in by @cached_response
+
+_cache = None
+
+
+def page_cache():
+    global _cache
+    if _cache is None:
+        _cache = FileCache(os.path.join(current_app.instance_path, "cache", "pages"))
+    return _cache
+
+
+# ------------------ Write tracking ------------------
+
+def _after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+    if getattr(clauseelement, "is_dml", False):
+        name = clauseelement.table.name
+        if name in WATCHED_TABLES:
+            conn.info.setdefault("written_tables", set()).add(name)
+
+
+def _bump_on_commit(conn):
+    tables = conn.info.pop("written_tables", None)
+    if tables:
+        bump_versions(conn, tables)
+
+
+def _forget_on_rollback(conn):
+    conn.info.pop("written_tables", None)
+
+
+def bump_versions(conn, tables):
+    """Increment the versions of `tables` on `conn` (sorted, so concurrent bumps lock in one order)."""
+    rows = [{"table_name": t, "version": 1} for t in sorted(tables)]
+    insert = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(conn.dialect.name)
+    if insert is not None:
+        stmt = insert(_versions)
+        conn.execute(stmt.on_conflict_do_update(index_elements=["table_name"],
+                                                set_={"version": _versions.c.version + 1}), rows)
+        return
+    for row in rows:
+        bumped = conn.execute(update(_versions).where(_versions.c.table_name == row["table_name"])
+                              .values(version=_versions.c.version + 1))
+        if bumped.rowcount == 0:
+            conn.execute(_versions.insert().values(row))
+
+
+def track_writes(engine):
+    event.listen(engine, "after_execute", _after_execute)
+    event.listen(engine, "commit", _bump_on_commit)
+    event.listen(engine, "rollback", _forget_on_rollback)
+
+
+# ------------------ Cached views ------------------
+
+def current_versions(tables):
+    found = dict(db.session.execute(
+        select(_versions.c.table_name, _versions.c.version).where(_versions.c.table_name.in_(tables))
+    ).all())
+    return tuple(found.get(t, 0) for t in tables)
+
+
+def _digest(*parts):
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def cached_response(*models):
+    """
+    Cache a GET view's HTML until one of `models`' tables is written to.
+    Put it under @requires so the permission check still runs first.
+    """
+    tables = tuple(sorted(m.__table__.name for m in models))
+    WATCHED_TABLES.update(tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+
+            # versions first: a write committed while rendering only makes the entry stale-on-arrival
+            versions = current_versions(tables)
+            # the pages greet the user by name, so each user gets their own entry
+            base = _digest(request.endpoint, sorted(kwargs.items()), sorted(request.args.items(multi=True)),
+                           session.get("user_id"), session.get("designation"), session.get("position"))
+            etag = _digest(base, versions)
+
+            if request.if_none_match.contains(etag):
+                resp = current_app.response_class(status=304)
+            else:
+                cache = page_cache()
+                key = f"{base}-{etag}"
+                body = cache.get(key)
+                if body is not None:
+                    resp = current_app.response_class(body, mimetype="text/html")
+                else:
+                    resp = make_response(view(*args, **kwargs))
+                    if resp.status_code != 200:
+                        return resp
+                    cache.delete_prefix(f"{base}-", keep=key)  # older versions of this page
+                    cache.set(key, resp.get_data())
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapped
+    return decorator
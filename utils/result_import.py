@@ -0,0 +1,181 @@
+# result_import.py
+import csv
+import io
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from database import db
+from models import QCSample, RawMaterial, TestResult
+from utils.spec_engine import spec_index
+from utils.coa import invalidate_coa
+from utils.reports import RollupDelta
+from utils.spc import SPCBatch
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_REJECTS = 500  # keep the report small for huge files
+
+REQUIRED_COLUMNS = ("ar_no", "parameter")
+
+
+class ImportReport:
+    def __init__(self, filename):
+        self.filename = filename
+        self.rows_read = 0
+        self.inserted = 0
+        self.rejected_count = 0
+        self.rejected = []  # (line_no, reason), capped at MAX_REPORTED_REJECTS
+        self.alerts = 0     # SPC out-of-trend alerts raised by the imported results
+        self.elapsed = 0.0
+
+    def reject(self, line_no, reason):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTS:
+            self.rejected.append((line_no, reason))
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.filename}: {self.rows_read} rows read, {self.inserted} inserted, "
+                f"{self.rejected_count} rejected, {self.alerts} SPC alerts in {self.elapsed:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s)")
+
+
+def _parse_row(row):
+    """Normalise one CSV row; returns (values, None) or (None, reason)."""
+    ar_no = (row.get("ar_no") or "").strip()
+    parameter = (row.get("parameter") or "").strip()
+    if not ar_no:
+        return None, "missing ar_no"
+    if not parameter:
+        return None, "missing parameter"
+    raw_value = (row.get("result_value") or "").strip()
+    text = (row.get("result_text") or "").strip()
+    if not raw_value and not text:
+        return None, "no result_value or result_text"
+    try:
+        value = float(raw_value) if raw_value else None
+    except ValueError:
+        return None, f"result_value {raw_value!r} is not a number"
+    return {
+        "ar_no": ar_no,
+        "parameter": parameter,
+        "result_value": value,
+        "result_text": text,
+        "unit": (row.get("unit") or "").strip() or None,
+        "tested_by": (row.get("tested_by") or "").strip() or None,
+    }, None
+
+
+def _flush(chunk, report, tested_by):
+    """Resolve, judge and insert one chunk of parsed rows in a single transaction."""
+    ar_nos = {r["ar_no"] for _, r in chunk}
+    samples = {}
+    materials = {}
+    for ar, sid, mid, version, code, vendor in db.session.execute(
+        select(QCSample.ar_no, QCSample.id, QCSample.material_id, RawMaterial.spec_version,
+               RawMaterial.material_code, RawMaterial.vendor)
+        .join(RawMaterial, RawMaterial.id == QCSample.material_id)
+        .where(QCSample.ar_no.in_(ar_nos))
+    ):
+        samples[ar] = (sid, mid, version)
+        materials[mid] = (code, vendor)
+
+    by_material = {}
+    for line_no, r in chunk:
+        sample = samples.get(r["ar_no"])
+        if sample is None:
+            report.reject(line_no, f"unknown AR number {r['ar_no']}")
+            continue
+        by_material.setdefault(sample[1:], []).append((sample[0], r))
+
+    now = datetime.utcnow()
+    rows = []
+    codes = []  # material_code of each row, for the SPC series
+    delta = RollupDelta()
+    for (material_id, version), items in by_material.items():
+        code, vendor = materials[material_id]
+        verdicts = spec_index.get(material_id, version).judge_batch(
+            [r["parameter"] for _, r in items],
+            [r["result_value"] for _, r in items],
+            [r["result_text"] for _, r in items],
+        )
+        for (sample_id, r), verdict in zip(items, verdicts):
+            rows.append({
+                "sample_id": sample_id,
+                "parameter": r["parameter"],
+                "result_value": r["result_value"],
+                "result_text": r["result_text"] or None,
+                "unit": r["unit"],
+                "verdict": verdict,
+                "tested_by": r["tested_by"] or tested_by,
+                "tested_at": now,
+            })
+            codes.append(code)
+            delta.result(now, code, vendor, r["parameter"], verdict, r["result_value"])
+    db.session.rollback()  # end the read transaction before writing
+
+    if rows:
+        with db.engine.begin() as conn:
+            ids = conn.execute(insert(TestResult.__table__).returning(
+                TestResult.__table__.c.id, sort_by_parameter_order=True), rows).scalars().all()
+            spc = SPCBatch()
+            for result_id, code, row in zip(ids, codes, rows):
+                spc.result(result_id, now, code, row["parameter"], row["result_value"], row["verdict"])
+            report.alerts += len(spc.apply(conn))
+            conn.execute(
+                update(RawMaterial.__table__)
+                .where(RawMaterial.__table__.c.id.in_([mid for mid, _ in by_material]))
+                .values(status="Testing")
+            )
+            delta.apply(conn)
+        invalidate_coa(*{row["sample_id"] for row in rows})
+        report.inserted += len(rows)
+
+
+def import_results_csv(stream, tested_by, filename="upload.csv", chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Stream an instrument CSV export into TestResult rows.
+
+    The file is read row by row and processed in chunks of `chunk_size`:
+    AR numbers of a chunk are resolved with one query, results are judged
+    per material with the batch verdict engine and inserted with one
+    executemany in their own transaction. Bad rows are reported, not fatal.
+
+    Expected columns: ar_no, parameter and at least one of result_value /
+    result_text; unit and tested_by are optional.
+    """
+    report = ImportReport(filename)
+    started = time.perf_counter()
+
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(stream)
+    header = [h.strip() for h in (reader.fieldnames or [])]
+    missing = [c for c in REQUIRED_COLUMNS if c not in header]
+    if missing:
+        report.reject(1, f"missing column(s): {', '.join(missing)}")
+        report.elapsed = time.perf_counter() - started
+        return report
+    reader.fieldnames = header
+
+    chunk = []
+    for line_no, row in enumerate(reader, start=2):
+        report.rows_read += 1
+        values, reason = _parse_row(row)
+        if reason:
+            report.reject(line_no, reason)
+            continue
+        chunk.append((line_no, values))
+        if len(chunk) >= chunk_size:
+            _flush(chunk, report, tested_by)
+            chunk = []
+    if chunk:
+        _flush(chunk, report, tested_by)
+
+    report.rejected.sort()
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,147 @@
+# search.py
+"""
+Global search over lots, AR numbers, warehouse materials and dispatches.
+
+SQLite: one FTS5 table, search_index, filled by triggers on the source
+tables (so Core bulk inserts are indexed too). A row's rowid encodes its
+source as id * 8 + kind. PostgreSQL: GIN indexes on the same to_tsvector
+expressions as below, queried per table. Anything else: prefix LIKE.
+Hits are ranked in the database and hydrated with one query per kind.
+"""
+import re
+from collections import defaultdict
+
+from sqlalchemy import func, literal, literal_column, or_, select, text, union_all
+
+from database import db
+from models import QCSample, RawMaterial, WarehouseDispatch, WarehouseMaterial
+
+SEARCH_LIMIT = 25
+MIN_TOKEN_LENGTH = 2  # a one-letter prefix matches most of the index
+RANK_WINDOW = 2000  # SQLite: only the newest matches of a broad query are ranked
+
+# kind -> (model, title columns, body columns, permission needed to see it)
+KINDS = {
+    1: (RawMaterial, ("material_code", "material_name"), ("lot_no", "vendor"), "view_qc"),
+    2: (QCSample, ("ar_no",), ("remarks", "sampler"), "view_qc"),
+    3: (WarehouseMaterial, ("material_code", "material_name"), ("supplier_name",), "view_warehouse"),
+    4: (WarehouseDispatch, ("batch_no", "product_name"), ("customer_name", "remarks"), "view_warehouse"),
+}
+KIND_NAMES = {1: "material", 2: "sample", 3: "warehouse_material", 4: "dispatch"}
+KIND_BITS = 8  # rowid = id * KIND_BITS + kind
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchHit:
+    def __init__(self, kind, obj, score, snippet=None):
+        _, title_cols, body_cols, _ = KINDS[kind]
+        self.kind = KIND_NAMES[kind]
+        self.obj = obj
+        self.id = obj.id
+        self.score = score
+        self.title = " · ".join(str(getattr(obj, c)) for c in title_cols if getattr(obj, c))
+        self.detail = snippet or " · ".join(str(getattr(obj, c)) for c in body_cols if getattr(obj, c))
+
+    def as_dict(self):
+        return {"kind": self.kind, "id": self.id, "title": self.title, "detail": self.detail,
+                "score": round(self.score, 4)}
+
+
+def tokens(q):
+    return [t for t in _TOKEN.findall(q or "") if len(t) >= MIN_TOKEN_LENGTH][:8]
+
+
+# ------------------ Backends ------------------
+
+def _fts5_match(words):
+    # every word as a quoted prefix term; quotes keep FTS5 operators out of user input
+    return " AND ".join(f'"{w}"*' for w in words)
+
+
+def _search_sqlite(words, kinds, limit):
+    kind_filter = " AND (rowid % :bits) IN ({})".format(",".join(str(k) for k in kinds))
+    params = {"q": _fts5_match(words), "bits": KIND_BITS, "limit": limit, "window": RANK_WINDOW - 1}
+    # bm25 scores every match, so a broad prefix ("AR") would rank the whole
+    # table; walking the doclist newest-first is cheap, so rank only the
+    # newest RANK_WINDOW matches
+    floor = db.session.execute(text(
+        "SELECT rowid FROM search_index WHERE search_index MATCH :q" + kind_filter +
+        " ORDER BY rowid DESC LIMIT 1 OFFSET :window"
+    ), params).scalar() or 0
+    rows = db.session.execute(text(
+        "SELECT rowid, bm25(search_index, 10.0, 1.0) AS score,"
+        " snippet(search_index, 1, '[', ']', '…', 8) AS snip"
+        " FROM search_index WHERE search_index MATCH :q AND rowid >= :floor" + kind_filter +
+        " ORDER BY score LIMIT :limit"
+    ), dict(params, floor=floor)).all()
+    # bm25 is "lower is better"; flip it so every backend returns higher = better
+    return [(rowid % KIND_BITS, rowid // KIND_BITS, -score, snip) for rowid, score, snip in rows]
+
+
+def _pg_vector(model, cols):
+    return "to_tsvector('simple', {})".format(
+        " || ' ' || ".join(f"coalesce({model.__table__.name}.{c}, '')" for c in cols))
+
+
+def _search_postgresql(words, kinds, limit):
+    tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{w}:*" for w in words))
+    parts = []
+    for kind in kinds:
+        model, title, body, _ = KINDS[kind]
+        vec = literal_column(_pg_vector(model, title + body))  # must match the GIN index expression
+        parts.append(
+            select(literal(kind).label("kind"), model.__table__.c.id.label("id"),
+                   func.ts_rank(vec, tsquery).label("score"))
+            .where(vec.op("@@")(tsquery))
+        )
+    hits = union_all(*parts).subquery()
+    rows = db.session.execute(select(hits).order_by(hits.c.score.desc()).limit(limit)).all()
+    return [(kind, id_, score, None) for kind, id_, score in rows]
+
+
+def _search_like(words, kinds, limit):
+    hits = []
+    for kind in kinds:
+        model, title, body, _ = KINDS[kind]
+        cols = [getattr(model, c) for c in title + body]
+        conds = [or_(*[c.ilike(f"{w}%") for c in cols]) for w in words]
+        for (id_,) in db.session.execute(select(model.id).where(*conds).order_by(model.id.desc()).limit(limit)):
+            hits.append((kind, id_, 0.0, None))
+    return hits[:limit]
+
+
+_BACKENDS = {"sqlite": _search_sqlite, "postgresql": _search_postgresql}
+_fts_available = None
+
+
+def _backend():
+    global _fts_available
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite" and _fts_available is None:
+        # a database built with create_all() instead of the migrations has no FTS table
+        _fts_available = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first() is not None
+    if dialect == "sqlite" and not _fts_available:
+        return _search_like
+    return _BACKENDS.get(dialect, _search_like)
+
+
+def search(q, kinds=None, limit=SEARCH_LIMIT):
+    """Ranked hits for the words of `q` (each matched as a prefix), limited to `kinds`."""
+    words = tokens(q)
+    kinds = sorted(KINDS if kinds is None else kinds)
+    if not words or not kinds:
+        return []
+    ranked = _backend()(words, kinds, limit)
+
+    by_kind = defaultdict(list)
+    for kind, id_, _, _ in ranked:
+        by_kind[kind].append(id_)
+    objects = {}
+    for kind, ids in by_kind.items():
+        model = KINDS[kind][0]
+        for obj in model.query.filter(model.id.in_(ids)):
+            objects[(kind, obj.id)] = obj
+    return [SearchHit(kind, objects[(kind, id_)], score, snip)
+            for kind, id_, score, snip in ranked if (kind, id_) in objects]
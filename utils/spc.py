@@ -0,0 +1,348 @@
+# spc.py
+"""
+Statistical process control per material_code x parameter.
+
+Each series is one spc_series row that the result write paths fold new
+numeric results into, in result id order: Welford count/mean/M2 (exact
+mean and sigma without rescanning history), an EWMA, a two-sided tabular
+CUSUM and a ring of the last SPC_WINDOW points with their z-scores, which
+the Western Electric rules look back over and the charts are drawn from.
+A point is judged against the limits as they stood before it arrived, so
+an outlier cannot widen its own limits; nothing is judged until a series
+has SPC_MIN_POINTS results.
+
+Folding happens in the transaction that inserts the results, after the
+insert. Rows are written with a version check and re-read on conflict,
+which keeps concurrent writers correct on PostgreSQL; on SQLite the
+insert already holds the write lock, so the read is current anyway.
+"""
+import json
+import math
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, exists, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import db
+from models import QCSample, RawMaterial, SPCAlert, SPCSeries, TestResult
+
+SPC_MIN_POINTS = 10   # baseline results before any rule is evaluated
+SPC_WINDOW = 50       # points kept per series for the rules and the charts
+EWMA_LAMBDA = 0.2
+EWMA_L = 3.0          # EWMA limits, in (asymptotic) EWMA sigmas
+CUSUM_K = 0.5         # CUSUM allowance, in sigmas
+CUSUM_H = 5.0         # CUSUM decision interval, in sigmas
+MAX_ATTEMPTS = 10     # version conflicts tolerated per batch before giving up
+
+RULES = {
+    "WE1": "1 point beyond 3σ",
+    "WE2": "2 of 3 points beyond 2σ on one side",
+    "WE3": "4 of 5 points beyond 1σ on one side",
+    "WE4": "8 points in a row on one side of the mean",
+    "EWMA": "EWMA outside its control limits",
+    "CUSUM+": "CUSUM: sustained upward shift",
+    "CUSUM-": "CUSUM: sustained downward shift",
+}
+
+_series = SPCSeries.__table__
+_alerts = SPCAlert.__table__
+
+
+class SPCConflict(RuntimeError):
+    """A series kept changing under us for MAX_ATTEMPTS rounds."""
+
+
+def western_electric(z, previous):
+    """Rules 1-4 for the newest z-score `z`; `previous` are the ones before it, oldest first."""
+    fired = ["WE1"] if abs(z) > 3 else []
+    side = (z > 0) - (z < 0)
+    if side:
+        def beyond(window, k):
+            return sum(1 for v in window if v is not None and v * side > k)
+        if z * side > 2 and beyond(previous[-2:], 2) >= 1:
+            fired.append("WE2")
+        if z * side > 1 and beyond(previous[-4:], 1) >= 3:
+            fired.append("WE3")
+        if len(previous) >= 7 and beyond(previous[-7:], 0) == 7:
+            fired.append("WE4")
+    return fired
+
+
+class SeriesState:
+    """One series' statistics in memory; fold() advances it by one result."""
+
+    def __init__(self, row=None):
+        row = row or {}
+        self.id = row.get("id")
+        self.version = row.get("version", 0)
+        self.n = row.get("n", 0)
+        self.mean = row.get("mean", 0.0)
+        self.m2 = row.get("m2", 0.0)
+        self.ewma = row.get("ewma")
+        self.cusum_hi = row.get("cusum_hi", 0.0)
+        self.cusum_lo = row.get("cusum_lo", 0.0)
+        # [result_id, tested_at, value, z, ewma, rules], oldest first
+        self.recent = json.loads(row.get("recent") or "[]")
+
+    @property
+    def sigma(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def limits(self):
+        """(centre, sigma) once the baseline is complete, else None."""
+        sigma = self.sigma
+        if self.n < SPC_MIN_POINTS or sigma <= 0:
+            return None
+        return self.mean, sigma
+
+    def fold(self, result_id, when, value):
+        """Add one numeric result; returns the rules it newly set off."""
+        fired = []
+        z = None
+        limits = self.limits()
+        if limits:
+            centre, sigma = limits
+            z = (value - centre) / sigma
+            self.ewma = EWMA_LAMBDA * value + (1 - EWMA_LAMBDA) * self.ewma
+            if abs(self.ewma - centre) > EWMA_L * sigma * math.sqrt(EWMA_LAMBDA / (2 - EWMA_LAMBDA)):
+                fired.append("EWMA")
+            self.cusum_hi = max(0.0, self.cusum_hi + z - CUSUM_K)
+            self.cusum_lo = max(0.0, self.cusum_lo - z - CUSUM_K)
+            if self.cusum_hi > CUSUM_H:
+                fired.append("CUSUM+")
+                self.cusum_hi = 0.0
+            if self.cusum_lo > CUSUM_H:
+                fired.append("CUSUM-")
+                self.cusum_lo = 0.0
+            fired += western_electric(z, [p[3] for p in self.recent[-7:]])
+
+        self.n += 1
+        d = value - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (value - self.mean)
+        if limits is None:
+            self.ewma = self.mean  # the EWMA starts out from the baseline mean
+
+        # a rule that keeps holding (EWMA outside, a long run) alerts once, when it starts
+        ongoing = set(self.recent[-1][5]) if self.recent else set()
+        self.recent.append([result_id, when.isoformat(timespec="seconds") if when else None,
+                            value, z, self.ewma, fired])
+        del self.recent[:-SPC_WINDOW]
+        return [r for r in fired if r not in ongoing]
+
+    def forget(self, result_ids, values):
+        """Take results back out of the Welford statistics and the ring (EWMA/CUSUM stay as they are)."""
+        for value in values:
+            if self.n <= 1:
+                self.n, self.mean, self.m2 = 0, 0.0, 0.0
+                continue
+            mean = (self.n * self.mean - value) / (self.n - 1)
+            self.m2 = max(0.0, self.m2 - (value - mean) * (value - self.mean))
+            self.mean = mean
+            self.n -= 1
+        gone = set(result_ids)
+        self.recent = [p for p in self.recent if p[0] not in gone]
+
+    def values(self):
+        return {
+            "n": self.n, "mean": self.mean, "m2": self.m2, "ewma": self.ewma,
+            "cusum_hi": self.cusum_hi, "cusum_lo": self.cusum_lo,
+            "recent": json.dumps(self.recent, separators=(",", ":")),
+            "updated_at": datetime.utcnow(),
+        }
+
+
+# ------------------ Storage ------------------
+
+def _dialect(conn):
+    return conn.get_bind().dialect.name if hasattr(conn, "get_bind") else conn.dialect.name
+
+
+def _load(conn, keys):
+    rows = conn.execute(select(_series).where(
+        tuple_(_series.c.material_code, _series.c.parameter).in_(list(keys)))).mappings()
+    return {(r["material_code"], r["parameter"]): SeriesState(r) for r in rows}
+
+
+def _load_or_create(conn, keys):
+    states = _load(conn, keys)
+    missing = [k for k in sorted(keys) if k not in states]
+    if missing:
+        rows = [{"material_code": code, "parameter": parameter, "version": 0, **SeriesState().values()}
+                for code, parameter in missing]
+        insert_ = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(_dialect(conn))
+        if insert_ is not None:
+            # a concurrent writer may be creating the same series
+            conn.execute(insert_(_series).on_conflict_do_nothing(
+                index_elements=["material_code", "parameter"]), rows)
+        else:
+            conn.execute(insert(_series), rows)
+        states.update(_load(conn, missing))
+    return states
+
+
+def _save(conn, state):
+    """Write `state` back unless someone else did first; True on success."""
+    saved = conn.execute(
+        update(_series).where(_series.c.id == state.id, _series.c.version == state.version)
+        .values(version=state.version + 1, **state.values())
+    )
+    return saved.rowcount == 1
+
+
+class SPCBatch:
+    """
+    Numeric results to fold into their series, collected by a write path
+    and applied inside its transaction once the results are inserted
+    (they need their ids), much like RollupDelta.
+    """
+
+    def __init__(self):
+        self.points = defaultdict(list)  # (material_code, parameter) -> [(result_id, when, value, verdict)]
+
+    def result(self, result_id, when, material_code, parameter, value, verdict):
+        if value is not None and math.isfinite(value):
+            self.points[(material_code, parameter)].append((result_id, when, value, verdict))
+
+    def apply(self, conn=None):
+        """Fold everything in; returns the alerts raised, as row dicts."""
+        conn = conn if conn is not None else db.session
+        pending, self.points = self.points, defaultdict(list)
+        now = datetime.utcnow()
+        alerts = []
+        for _ in range(MAX_ATTEMPTS):
+            if not pending:
+                break
+            states = _load_or_create(conn, pending)
+            conflicts = {}
+            for key in sorted(pending):  # one lock order for every writer
+                state = states[key]
+                raised = []
+                for result_id, when, value, verdict in sorted(pending[key], key=lambda p: p[0]):
+                    for rule in state.fold(result_id, when, value):
+                        raised.append({
+                            "result_id": result_id, "material_code": key[0], "parameter": key[1],
+                            "rule": rule, "value": value, "z": state.recent[-1][3],
+                            "verdict": verdict, "created_at": now,
+                        })
+                if _save(conn, state):
+                    alerts += [dict(a, series_id=state.id) for a in raised]
+                else:
+                    conflicts[key] = pending[key]
+            pending = conflicts
+        if pending:
+            raise SPCConflict(f"SPC series kept changing: {sorted(pending)}")
+        if alerts:
+            conn.execute(insert(_alerts), alerts)
+        return alerts
+
+
+def forget_results(conn, rows):
+    """Take deleted results, given as (id, material_code, parameter, value), back out of their series."""
+    ids = [r[0] for r in rows]
+    if not ids:
+        return
+    conn.execute(delete(_alerts).where(_alerts.c.result_id.in_(ids)))
+    pending = defaultdict(list)
+    for result_id, code, parameter, value in rows:
+        if value is not None and math.isfinite(value):
+            pending[(code, parameter)].append((result_id, value))
+    for _ in range(MAX_ATTEMPTS):
+        if not pending:
+            return
+        states = _load(conn, pending)
+        conflicts = {}
+        for key in sorted(pending):
+            state = states.get(key)
+            if state is None:
+                continue
+            state.forget([p[0] for p in pending[key]], [p[1] for p in pending[key]])
+            if state.n == 0:
+                conn.execute(delete(_alerts).where(_alerts.c.series_id == state.id))
+                gone = conn.execute(delete(_series).where(_series.c.id == state.id,
+                                                          _series.c.version == state.version)).rowcount
+            else:
+                gone = _save(conn, state)
+            if not gone:
+                conflicts[key] = pending[key]
+        pending = conflicts
+    if pending:
+        raise SPCConflict(f"SPC series kept changing: {sorted(pending)}")
+
+
+def rebuild_spc(yield_per=5000):
+    """
+    Recompute every series from the stored results in one streaming pass,
+    in id order. Only needed once after the migration (or after manual
+    data surgery). Alerts are not raised again; those whose result is gone
+    are dropped.
+    """
+    states = defaultdict(SeriesState)
+    results = select(TestResult.id, TestResult.tested_at, RawMaterial.material_code,
+                     TestResult.parameter, TestResult.result_value) \
+        .join(QCSample, QCSample.id == TestResult.sample_id) \
+        .join(RawMaterial, RawMaterial.id == QCSample.material_id) \
+        .where(TestResult.result_value.isnot(None)) \
+        .order_by(TestResult.id)
+    for result_id, when, code, parameter, value in db.session.execute(
+            results.execution_options(yield_per=yield_per)):
+        if math.isfinite(value):
+            states[(code, parameter)].fold(result_id, when, value)
+
+    db.session.execute(delete(_alerts).where(
+        ~exists().where(TestResult.__table__.c.id == _alerts.c.result_id)))
+    existing = {(code, parameter): sid for sid, code, parameter in db.session.execute(
+        select(_series.c.id, _series.c.material_code, _series.c.parameter))}
+    stale = [sid for key, sid in existing.items() if key not in states]
+    if stale:
+        db.session.execute(delete(_alerts).where(_alerts.c.series_id.in_(stale)))
+        db.session.execute(delete(_series).where(_series.c.id.in_(stale)))
+    for key, state in states.items():
+        if key in existing:
+            db.session.execute(update(_series).where(_series.c.id == existing[key])
+                               .values(version=_series.c.version + 1, **state.values()))
+        else:
+            db.session.execute(insert(_series).values(
+                material_code=key[0], parameter=key[1], version=0, **state.values()))
+    db.session.commit()
+    return len(states)
+
+
+# ------------------ Charts ------------------
+
+def series_keys(material_code=None):
+    """(material_code, parameter, n) of every series, for pickers."""
+    stmt = select(_series.c.material_code, _series.c.parameter, _series.c.n) \
+        .order_by(_series.c.material_code, _series.c.parameter)
+    if material_code:
+        stmt = stmt.where(_series.c.material_code == material_code)
+    return db.session.execute(stmt).all()
+
+
+def chart(material_code, parameter):
+    """Control chart data for one series, straight from its stored state; None if unknown."""
+    row = db.session.execute(select(_series).where(
+        _series.c.material_code == material_code, _series.c.parameter == parameter)).mappings().first()
+    if row is None:
+        return None
+    state = SeriesState(row)
+    limits = state.limits()
+    centre, sigma = limits if limits else (state.mean if state.n else None, None)
+    ewma_width = EWMA_L * sigma * math.sqrt(EWMA_LAMBDA / (2 - EWMA_LAMBDA)) if sigma else None
+    return {
+        "material_code": material_code,
+        "parameter": parameter,
+        "n": state.n,
+        "mean": centre,
+        "sigma": sigma,
+        "ucl": centre + 3 * sigma if sigma else None,
+        "lcl": centre - 3 * sigma if sigma else None,
+        "ewma_ucl": centre + ewma_width if sigma else None,
+        "ewma_lcl": centre - ewma_width if sigma else None,
+        "baseline_complete": limits is not None,
+        "points": [
+            {"result_id": rid, "tested_at": when, "value": value, "z": z, "ewma": ewma, "rules": rules}
+            for rid, when, value, z, ewma, rules in state.recent
+        ],
+    }
@@ -0,0 +1,191 @@
+# spec_engine.py
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, select, update
+
+from database import db
+from models import QCSample, RawMaterial, Specification, TestResult
+from utils.reports import RollupDelta
+from utils.response_cache import WATCHED_TABLES, current_versions
+
+PASS, FAIL = "Pass", "Fail"
+EPOCH_CHECK_INTERVAL = 1.0  # seconds between looks at the specification table version
+
+# every write to specification bumps its cache_version row (see response_cache)
+WATCHED_TABLES.add(Specification.__table__.name)
+
+
+def _norm(text):
+    return text.strip().lower() if text else ""
+
+
+class CompiledSpecs:
+    """
+    The specification rows of one material, compiled into per-parameter
+    rules. Only the first row of a parameter counts, as it always has:
+      - textual rule: used when both the limit and the result text are non-empty
+        (case-insensitive exact match);
+      - otherwise numeric interval [lower_limit, upper_limit], open ends allowed.
+    A parameter without any spec row is judged Fail.
+    """
+
+    def __init__(self, specs):
+        self.rules = {}  # parameter -> (lower, upper, normalised textual limit)
+        for s in specs:
+            if s.parameter not in self.rules:
+                lo = s.lower_limit if s.lower_limit is not None else -math.inf
+                hi = s.upper_limit if s.upper_limit is not None else math.inf
+                self.rules[s.parameter] = (lo, hi, _norm(s.textual_limit))
+
+    def judge(self, parameter, value_num, value_text):
+        rule = self.rules.get(parameter)
+        if rule is None:
+            return FAIL
+        lo, hi, textual = rule
+        text = _norm(value_text)
+        if textual and text:
+            return PASS if text == textual else FAIL
+        if value_num is None:
+            return FAIL
+        return PASS if lo <= value_num <= hi else FAIL
+
+    def judge_batch(self, parameters, values_num, values_text):
+        """Vectorised judge() over parallel sequences; returns a list of verdicts."""
+        n = len(parameters)
+        if n == 0:
+            return []
+        import numpy as np  # only batch re-evaluation needs it; keeps it off the app's import path
+
+        params = np.asarray(parameters, dtype=object)
+        uniq, inv = np.unique(params.astype(str), return_inverse=True)
+
+        rules = [self.rules.get(p) for p in uniq]
+        has_rule = np.array([r is not None for r in rules])[inv]
+        lo = np.array([r[0] if r else np.nan for r in rules], dtype=float)[inv]
+        hi = np.array([r[1] if r else np.nan for r in rules], dtype=float)[inv]
+        textual = np.array([r[2] if r else "" for r in rules], dtype=object)[inv]
+
+        nums = np.array([np.nan if v is None else v for v in values_num], dtype=float)
+        texts = np.array([_norm(t) for t in values_text], dtype=object)
+
+        text_mode = (textual != "") & (texts != "")
+        text_pass = texts == textual
+        with np.errstate(invalid="ignore"):
+            num_pass = (lo <= nums) & (nums <= hi)  # NaN (no value) compares False
+        passed = has_rule & np.where(text_mode, text_pass, num_pass)
+        return np.where(passed, PASS, FAIL).tolist()
+
+
+class SpecIndex:
+    """
+    Per-process LRU of CompiledSpecs keyed by material id.
+
+    Entries are tagged with RawMaterial.spec_version, which qc_add_spec bumps,
+    so a spec change made through any worker is picked up by every other
+    worker on its next lookup without a shared cache.
+
+    Purged material ids can be handed out again (SQLite reuses the highest
+    rowid), and a new lot starts at spec_version 0 like the old one did, so
+    the index is also dropped whenever the specification table's version
+    moves, checked at most every EPOCH_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # material_id -> (spec_version, CompiledSpecs)
+        self._epoch = None
+        self._epoch_checked = 0.0
+
+    def _check_epoch(self):
+        now = time.monotonic()
+        if now - self._epoch_checked < EPOCH_CHECK_INTERVAL:
+            return
+        (epoch,) = current_versions((Specification.__table__.name,))
+        with self._lock:
+            self._epoch_checked = now
+            if epoch != self._epoch:
+                self._entries.clear()
+                self._epoch = epoch
+
+    def get(self, material_id, spec_version):
+        self._check_epoch()
+        with self._lock:
+            entry = self._entries.get(material_id)
+            if entry is not None and entry[0] == spec_version:
+                self._entries.move_to_end(material_id)
+                return entry[1]
+        specs = Specification.query.filter_by(material_id=material_id) \
+                                   .order_by(Specification.id).all()
+        compiled = CompiledSpecs(specs)
+        with self._lock:
+            self._entries[material_id] = (spec_version, compiled)
+            self._entries.move_to_end(material_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def for_material(self, material):
+        return self.get(material.id, material.spec_version)
+
+    def invalidate(self, material_id=None):
+        with self._lock:
+            if material_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(material_id, None)
+
+
+spec_index = SpecIndex()
+
+
+def reevaluate_materials(material_ids):
+    """
+    Re-judge every stored result of the given materials against their current
+    specs and rewrite the verdicts that changed, using one query for the specs
+    and one for the results however many materials are passed.
+    Returns (results_checked, {material_id: verdicts_changed}). The caller commits.
+    """
+    material_ids = list(material_ids)
+    specs = {}
+    for s in Specification.query.filter(Specification.material_id.in_(material_ids)) \
+                                .order_by(Specification.id):
+        specs.setdefault(s.material_id, []).append(s)
+
+    groups = {}
+    for row in db.session.execute(
+        select(TestResult.id, TestResult.parameter, TestResult.result_value,
+               TestResult.result_text, TestResult.verdict, TestResult.tested_at,
+               QCSample.material_id, RawMaterial.material_code, RawMaterial.vendor)
+        .join(QCSample, QCSample.id == TestResult.sample_id)
+        .join(RawMaterial, RawMaterial.id == QCSample.material_id)
+        .where(QCSample.material_id.in_(material_ids))
+    ):
+        groups.setdefault(row.material_id, []).append(row)
+
+    checked = 0
+    changed = []
+    changed_by_material = {}
+    delta = RollupDelta()
+    for material_id, rows in groups.items():
+        checked += len(rows)
+        verdicts = CompiledSpecs(specs.get(material_id, [])).judge_batch(
+            [r.parameter for r in rows], [r.result_value for r in rows], [r.result_text for r in rows])
+        for row, new in zip(rows, verdicts):
+            if row.verdict != new:
+                changed.append({"rid": row.id, "v": new})
+                changed_by_material[material_id] = changed_by_material.get(material_id, 0) + 1
+                delta.verdict_change(row.tested_at, row.material_code, row.vendor, row.parameter,
+                                     row.verdict, new)
+    if changed:
+        delta.apply()
+        db.session.execute(
+            update(TestResult.__table__)
+            .where(TestResult.__table__.c.id == bindparam("rid"))
+            .values(verdict=bindparam("v")),
+            changed,
+        )
+    return checked, changed_by_material
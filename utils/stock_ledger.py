@@ -0,0 +1,113 @@
+# stock_ledger.py
+from datetime import datetime
+
+from sqlalchemy import event, insert, update
+
+from database import db
+from models import StockBalance, StockMovement
+
+RECEIPT, ISSUE, DISPATCH, ADJUSTMENT = "Receipt", "Issue", "Dispatch", "Adjustment"
+RELEASE, REJECT = "Release", "Reject"
+RELEASED, REJECTED = "Released", "Rejected"
+
+_balance = StockBalance.__table__
+_movement = StockMovement.__table__
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+@event.listens_for(StockMovement, "before_update")
+@event.listens_for(StockMovement, "before_delete")
+def _ledger_is_append_only(mapper, connection, target):
+    raise RuntimeError("stock_movement is append-only; record a correcting Adjustment instead")
+
+
+def _move(material_id, delta):
+    """
+    Apply `delta` to a material's balance with one conditional UPDATE.
+
+    For withdrawals the WHERE clause refuses to go below zero, so two workers
+    issuing from the same material at once can never both succeed on stock
+    that only covers one of them. No row updated means not enough stock.
+    """
+    stmt = update(_balance).where(_balance.c.material_id == material_id) \
+                           .values(quantity=_balance.c.quantity + delta, updated_at=datetime.utcnow())
+    if delta < 0:
+        stmt = stmt.where(_balance.c.quantity >= -delta)
+    if db.session.execute(stmt).rowcount != 1:
+        raise InsufficientStock(f"Not enough stock on material {material_id} for {-delta:g}.")
+
+
+def _record(material_id, movement_type, quantity, unit=None, reference=None, remarks=None, user=None):
+    movement = StockMovement(material_id=material_id, movement_type=movement_type, quantity=quantity,
+                             unit=unit, reference=reference, remarks=remarks, created_by=user)
+    db.session.add(movement)
+    return movement
+
+
+# All helpers below work inside the caller's transaction: the ledger row, the
+# balance change and the business record commit (or roll back) together.
+
+def receive(material, user=None):
+    """Open the ledger for a newly received WarehouseMaterial (must already be flushed)."""
+    db.session.add(StockBalance(material_id=material.id, quantity=material.quantity_received))
+    return _record(material.id, RECEIPT, material.quantity_received, material.unit,
+                   reference=f"receipt:{material.id}", user=user)
+
+
+def receive_many(conn, materials, user=None):
+    """
+    receive() for a batch of inserted materials, as two executemany inserts
+    on a Core connection. `materials` are (id, quantity_received, unit).
+    """
+    if not materials:
+        return
+    now = datetime.utcnow()
+    conn.execute(insert(_balance), [
+        {"material_id": mid, "quantity": qty, "updated_at": now} for mid, qty, _ in materials])
+    conn.execute(insert(_movement), [
+        {"material_id": mid, "movement_type": RECEIPT, "quantity": qty, "unit": unit,
+         "reference": f"receipt:{mid}", "created_by": user, "created_at": now}
+        for mid, qty, unit in materials])
+
+
+def issue(material_id, quantity, unit=None, reference=None, remarks=None, user=None):
+    if quantity <= 0:
+        raise ValueError("Issued quantity must be positive.")
+    _move(material_id, -quantity)
+    return _record(material_id, ISSUE, -quantity, unit, reference, remarks, user)
+
+
+def adjust(material_id, delta, unit=None, remarks=None, user=None):
+    if delta == 0:
+        raise ValueError("Adjustment must be non-zero.")
+    _move(material_id, delta)
+    return _record(material_id, ADJUSTMENT, delta, unit, remarks=remarks, user=user)
+
+
+def dispatch(dispatch_record, user=None):
+    """Finished goods are not stocked per material yet, so a dispatch only writes a ledger row."""
+    return _record(None, DISPATCH, -dispatch_record.quantity_dispatched, dispatch_record.unit,
+                   reference=f"dispatch:{dispatch_record.id}", remarks=dispatch_record.batch_no, user=user)
+
+
+def dispose(material, released, remarks=None, user=None):
+    """
+    QC/QA release or rejection of a received lot. Writes a zero-quantity
+    ledger row, so readers that follow the ledger (the lot allocator) see
+    the status change like any stock change. None when it is unchanged.
+    """
+    status = RELEASED if released else REJECTED
+    if material.status == status:
+        return None
+    material.status = status
+    return _record(material.id, RELEASE if released else REJECT, 0.0, material.unit,
+                   reference=f"release:{material.id}", remarks=remarks, user=user)
+
+
+def on_hand(material_id):
+    """Current stock: a primary-key read of the materialised balance."""
+    balance = db.session.get(StockBalance, material_id)
+    return balance.quantity if balance else 0.0
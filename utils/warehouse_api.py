@@ -0,0 +1,209 @@
+# warehouse_api.py
+"""
+Read-only JSON listings of warehouse materials, issues and dispatches
+for scanners and the ERP integration (served under /api/v1/warehouse).
+
+Each resource declares the fields a client may select, its filters and
+its sort orders. Pages are walked with keyset pagination, and every
+equality filter is the leading column of an index that ends in
+(date, id), so a filtered page in date order is one index range scan
+however deep the client pages. Only the requested fields are selected,
+and a joined table is only joined when one of its fields is asked for.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from database import db
+from models import StockBalance, WarehouseDispatch, WarehouseIssue, WarehouseMaterial
+from utils.pagination import keyset_paginate
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+
+class APIError(ValueError):
+    """A bad request parameter; the message goes back to the client with a 400."""
+
+
+def _prefix(column):
+    # a range instead of LIKE 'x%', so the (column, date, id) index still applies
+    return lambda v: (column >= v) & (column < v + "\U0010ffff")
+
+
+def _material_ids(condition):
+    return lambda v: WarehouseIssue.material_id.in_(select(WarehouseMaterial.id).where(condition(v)))
+
+
+def _int(column):
+    def build(v):
+        try:
+            return column == int(v)
+        except ValueError:
+            raise APIError(f"{column.key} must be an integer") from None
+    return build
+
+
+class Resource:
+    def __init__(self, model, fields, date_column, filters, joins=()):
+        self.model = model
+        self.fields = fields            # name -> column
+        self.date_column = date_column
+        self.filters = filters          # query parameter -> value -> WHERE clause
+        self.joins = dict(joins)        # joined table -> ON clause
+        self.sorts = {"date": [date_column, model.id], "id": [model.id]}
+
+
+RESOURCES = {
+    "materials": Resource(
+        WarehouseMaterial,
+        {
+            "id": WarehouseMaterial.id,
+            "material_code": WarehouseMaterial.material_code,
+            "material_name": WarehouseMaterial.material_name,
+            "supplier_name": WarehouseMaterial.supplier_name,
+            "quantity_received": WarehouseMaterial.quantity_received,
+            "on_hand": StockBalance.quantity,
+            "unit": WarehouseMaterial.unit,
+            "received_date": WarehouseMaterial.received_date,
+            "status": WarehouseMaterial.status,
+            "lot_no": WarehouseMaterial.lot_no,
+            "expiry_date": WarehouseMaterial.expiry_date,
+        },
+        WarehouseMaterial.received_date,
+        {
+            "material_code": lambda v: WarehouseMaterial.material_code == v,
+            "supplier": _prefix(WarehouseMaterial.supplier_name),
+            "status": lambda v: WarehouseMaterial.status == v,
+        },
+        joins=[(StockBalance.__table__, StockBalance.material_id == WarehouseMaterial.id)],
+    ),
+    "issues": Resource(
+        WarehouseIssue,
+        {
+            "id": WarehouseIssue.id,
+            "material_id": WarehouseIssue.material_id,
+            "material_code": WarehouseMaterial.material_code,
+            "issued_quantity": WarehouseIssue.issued_quantity,
+            "unit": WarehouseIssue.unit,
+            "issued_to": WarehouseIssue.issued_to,
+            "issued_date": WarehouseIssue.issued_date,
+            "batch_no": WarehouseIssue.batch_no,
+            "remarks": WarehouseIssue.remarks,
+        },
+        WarehouseIssue.issued_date,
+        {
+            "material_id": _int(WarehouseIssue.material_id),
+            "material_code": _material_ids(lambda v: WarehouseMaterial.material_code == v),
+            "supplier": _material_ids(_prefix(WarehouseMaterial.supplier_name)),
+            "issued_to": lambda v: WarehouseIssue.issued_to == v,
+            "batch_no": lambda v: WarehouseIssue.batch_no == v,
+        },
+        joins=[(WarehouseMaterial.__table__, WarehouseMaterial.id == WarehouseIssue.material_id)],
+    ),
+    "dispatches": Resource(
+        WarehouseDispatch,
+        {
+            "id": WarehouseDispatch.id,
+            "product_name": WarehouseDispatch.product_name,
+            "batch_no": WarehouseDispatch.batch_no,
+            "quantity_dispatched": WarehouseDispatch.quantity_dispatched,
+            "unit": WarehouseDispatch.unit,
+            "customer_name": WarehouseDispatch.customer_name,
+            "dispatch_date": WarehouseDispatch.dispatch_date,
+            "remarks": WarehouseDispatch.remarks,
+        },
+        WarehouseDispatch.dispatch_date,
+        {
+            "batch_no": lambda v: WarehouseDispatch.batch_no == v,
+            "customer": _prefix(WarehouseDispatch.customer_name),
+            "product_name": lambda v: WarehouseDispatch.product_name == v,
+        },
+    ),
+}
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _date(args, name):
+    raw = args.get(name, "").strip()
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        raise APIError(f"{name} must be an ISO date or datetime") from None
+
+
+def _selected(resource, args):
+    raw = args.get("fields", "").strip()
+    if not raw:
+        return list(resource.fields)
+    names = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in names if f not in resource.fields]
+    if unknown:
+        raise APIError(f"unknown field(s): {', '.join(unknown)}")
+    return names
+
+
+def _query(resource, names, extra=()):
+    """A query over just `names` (plus `extra` columns), joining only what they need."""
+    columns = [resource.fields[n].label(n) for n in names]
+    columns += [c for c in extra if c.key not in names]
+    q = db.session.query(*columns).select_from(resource.model)
+    for table, on in resource.joins.items():
+        if any(resource.fields[n].table is table for n in names):
+            q = q.outerjoin(table, on)
+    return q
+
+
+def list_rows(name, args):
+    """One page of resource `name` for the query string `args`; raises APIError on bad input."""
+    resource = RESOURCES[name]
+    names = _selected(resource, args)
+
+    sort = args.get("sort", "date")
+    if sort not in resource.sorts:
+        raise APIError(f"sort must be one of: {', '.join(resource.sorts)}")
+    order = args.get("order", "desc")
+    if order not in ("asc", "desc"):
+        raise APIError("order must be asc or desc")
+    try:
+        limit = int(args.get("limit", API_PAGE_SIZE))
+    except ValueError:
+        raise APIError("limit must be an integer") from None
+    limit = min(max(limit, 1), API_MAX_PAGE_SIZE)
+
+    sort_columns = resource.sorts[sort]
+    q = _query(resource, names, extra=sort_columns)
+    for param, build in resource.filters.items():
+        value = args.get(param, "").strip()
+        if value:
+            q = q.filter(build(value))
+    date_from, date_to = _date(args, "date_from"), _date(args, "date_to")
+    if date_from:
+        q = q.filter(resource.date_column >= date_from)
+    if date_to:
+        if len(args["date_to"].strip()) == 10:  # a bare date includes that whole day
+            date_to += timedelta(days=1)
+            q = q.filter(resource.date_column < date_to)
+        else:
+            q = q.filter(resource.date_column <= date_to)
+
+    page = keyset_paginate(q, sort_columns, limit, after=args.get("after"), before=args.get("before"),
+                           descending=order == "desc")
+    return {
+        "data": [{n: _jsonable(getattr(row, n)) for n in names} for row in page.items],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    }
+
+
+def get_row(name, row_id, args):
+    """One row by id with the same field selection, or None."""
+    resource = RESOURCES[name]
+    names = _selected(resource, args)
+    row = _query(resource, names).filter(resource.model.id == row_id).first()
+    return {n: _jsonable(getattr(row, n)) for n in names} if row else None